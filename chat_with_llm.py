@@ -1,9 +1,11 @@
 import os
-from langchain_openai import ChatOpenAI, AzureChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.chat_models import ChatOllama
+import asyncio
+import threading
+
+from llm_cache import LLMResponseCache, response_cache_key
 
 # Python libraries to be installed: langchain, langchain-openai, langchain-google-genai, langchain-community
+# Each provider's SDK is imported when that provider is first used, keeping this module cheap to import.
 
 """
 LLM Chat Interface with Multi-Provider Support
@@ -13,7 +15,7 @@ including Google Gemini, Azure OpenAI, OpenAI, and Ollama.
 
 SETUP:
 Users are expected to set appropriate environment variables for their chosen LLM provider
-before calling the get_llm_response function.
+before calling the get_llm_response (or stream_llm_response) function.
 
 Environment Variables:
 LLM_PROVIDER (default: "gemini")
@@ -42,6 +44,10 @@ For Ollama:
     OLLAMA_BASE_URL (default: "http://localhost:11434"): Ollama server URL
     OLLAMA_MODEL (default: "llama3"): Model name
 
+Response cache (see llm_cache.py):
+    LLM_CACHE_ENABLED, LLM_CACHE_PATH, LLM_CACHE_TTL_HOURS, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MB
+    Pass use_cache=False to skip the lookup; the fresh response still replaces the cached one.
+
 Usage:
     # Set your environment variables first, then use the function
     messages = [
@@ -49,29 +55,63 @@ Usage:
     ]
     response = get_llm_response(messages)
     print(response)
+
+    # From async code, without blocking the event loop
+    response = await aget_llm_response(messages)
+
+    # Or print the response as it streams in
+    for text in stream_llm_response(messages):
+        print(text, end="", flush=True)
 """
 
-def get_llm_response(messages, provider=None):
+PROVIDER_LABELS = {
+    "gemini": "Gemini",
+    "azure": "Azure OpenAI",
+    "openai": "OpenAI",
+    "ollama": "Ollama"
+}
+
+# Settings that identify one client configuration per provider
+PROVIDER_SETTINGS = {
+    "gemini": ("GOOGLE_API_KEY", "GOOGLE_APPLICATION_CREDENTIALS", "GEMINI_MODEL"),
+    "azure": ("AZURE_OPENAI_KEY", "AZURE_OPENAI_BASE", "AZURE_API_VERSION", "AZURE_DEPLOYMENT_NAME"),
+    "openai": ("OPENAI_API_KEY", "OPENAI_API_BASE", "OPENAI_MODEL"),
+    "ollama": ("OLLAMA_BASE_URL", "OLLAMA_MODEL")
+}
+
+# Model setting and default per provider, part of the response cache key
+PROVIDER_MODELS = {
+    "gemini": ("GEMINI_MODEL", "gemini-2.5-flash"),
+    "azure": ("AZURE_DEPLOYMENT_NAME", "gpt-4o"),
+    "openai": ("OPENAI_MODEL", "gpt-4o"),
+    "ollama": ("OLLAMA_MODEL", "llama3")
+}
+
+LLM_TEMPERATURE = 0.7
+
+# Provider registry: one client per configuration, so HTTP connections and auth are reused
+_clients = {}
+_clients_lock = threading.Lock()
+_response_cache = None
+
+def create_llm(provider=None):
     """
-    Get response from LLM using the specified provider.
+    Build the LangChain chat model for a provider.
     
     Args:
-        messages (list): List of message dictionaries with 'role' and 'content' keys
         provider (str, optional): LLM provider to use. Defaults to LLM_PROVIDER env var or "gemini"
     
     Returns:
-        str: Response from the LLM
+        tuple: (chat model, provider name)
     
     Raises:
-        ValueError: If required environment variables are not set
-        RuntimeError: If LLM call fails
+        ValueError: If required environment variables are not set or the provider is unknown
     """
-    if not messages:
-        raise ValueError("Messages cannot be empty")
-    
     provider = provider or os.getenv("LLM_PROVIDER", "gemini").lower()
     
     if provider == "gemini":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
         api_key = os.getenv("GOOGLE_API_KEY")
         credentials_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
         model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
@@ -84,7 +124,7 @@ def get_llm_response(messages, provider=None):
             llm = ChatGoogleGenerativeAI(
                 model=model_name,
                 google_api_key=api_key,
-                temperature=0.7
+                temperature=LLM_TEMPERATURE
             )
         else:
             # For service account credentials, we need to set the environment variable
@@ -92,16 +132,12 @@ def get_llm_response(messages, provider=None):
             os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials_path
             llm = ChatGoogleGenerativeAI(
                 model=model_name,
-                temperature=0.7
+                temperature=LLM_TEMPERATURE
             )
-        
-        try:
-            response = llm.invoke(messages)
-            return response.content
-        except Exception as e:
-            raise RuntimeError(f"Gemini call failed: {e}")
     
     elif provider == "azure":
+        from langchain_openai import AzureChatOpenAI
+
         api_key = os.getenv("AZURE_OPENAI_KEY")
         api_base = os.getenv("AZURE_OPENAI_BASE")
         api_version = os.getenv("AZURE_API_VERSION")
@@ -115,16 +151,12 @@ def get_llm_response(messages, provider=None):
             openai_api_version=api_version,
             azure_endpoint=api_base,
             api_key=api_key,
-            temperature=0.7
+            temperature=LLM_TEMPERATURE
         )
-        
-        try:
-            response = llm.invoke(messages)
-            return response.content
-        except Exception as e:
-            raise RuntimeError(f"Azure OpenAI call failed: {e}")
     
     elif provider == "openai":
+        from langchain_openai import ChatOpenAI
+
         api_key = os.getenv("OPENAI_API_KEY")
         api_base = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
         model_name = os.getenv("OPENAI_MODEL", "gpt-4o")
@@ -136,33 +168,213 @@ def get_llm_response(messages, provider=None):
             model=model_name,
             api_key=api_key,
             base_url=api_base,
-            temperature=0.7
+            temperature=LLM_TEMPERATURE
         )
-        
-        try:
-            response = llm.invoke(messages)
-            return response.content
-        except Exception as e:
-            raise RuntimeError(f"OpenAI call failed: {e}")
     
     elif provider == "ollama":
+        from langchain_community.chat_models import ChatOllama
+
         base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
         model_name = os.getenv("OLLAMA_MODEL", "llama3")
         
         llm = ChatOllama(
             model=model_name,
             base_url=base_url,
-            temperature=0.7
+            temperature=LLM_TEMPERATURE
         )
-        
-        try:
-            response = llm.invoke(messages)
-            return response.content
-        except Exception as e:
-            raise RuntimeError(f"Ollama call failed: {e}")
     
     else:
         raise ValueError(f"Unsupported LLM_PROVIDER: {provider}")
+    
+    return llm, provider
+
+def get_llm(provider=None):
+    """
+    Cached chat model for a provider, built on first use and rebuilt only
+    when that provider's settings change.
+    
+    Returns:
+        tuple: (chat model, provider name)
+    """
+    provider = provider or os.getenv("LLM_PROVIDER", "gemini").lower()
+    key = (provider,) + tuple(os.getenv(name) for name in PROVIDER_SETTINGS.get(provider, ()))
+    with _clients_lock:
+        llm = _clients.get(key)
+        if llm is None:
+            llm, provider = create_llm(provider)
+            _clients[key] = llm
+    return llm, provider
+
+def get_response_cache():
+    """Shared persistent response cache, or None when LLM_CACHE_ENABLED is false"""
+    global _response_cache
+    if os.getenv("LLM_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    with _clients_lock:
+        if _response_cache is None:
+            _response_cache = LLMResponseCache(
+                path=os.getenv("LLM_CACHE_PATH", "./llm_cache.db"),
+                ttl_seconds=float(os.getenv("LLM_CACHE_TTL_HOURS", "168")) * 3600,
+                max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000")),
+                max_bytes=int(os.getenv("LLM_CACHE_MB", "64")) * 1024 * 1024
+            )
+    return _response_cache
+
+def _cached_response(messages, provider, use_cache):
+    """
+    Look a request up in the response cache.
+    
+    Returns:
+        tuple: (cache or None, key, model, cached response or None)
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return None, None, None, None
+    setting, default = PROVIDER_MODELS.get(provider, (None, ""))
+    model = os.getenv(setting, default) if setting else default
+    key = response_cache_key(provider, model, LLM_TEMPERATURE, messages)
+    return cache, key, model, cache.get(key) if use_cache else None
+
+def get_llm_response(messages, provider=None, use_cache=True):
+    """
+    Get response from LLM using the specified provider.
+    
+    Args:
+        messages (list): List of message dictionaries with 'role' and 'content' keys
+        provider (str, optional): LLM provider to use. Defaults to LLM_PROVIDER env var or "gemini"
+        use_cache (bool): Serve an identical earlier request from the response cache
+    
+    Returns:
+        str: Response from the LLM
+    
+    Raises:
+        ValueError: If required environment variables are not set
+        RuntimeError: If LLM call fails
+    """
+    if not messages:
+        raise ValueError("Messages cannot be empty")
+    
+    provider = provider or os.getenv("LLM_PROVIDER", "gemini").lower()
+    cache, key, model, cached = _cached_response(messages, provider, use_cache)
+    if cached is not None:
+        return cached
+    
+    llm, provider = get_llm(provider)
+    try:
+        response = llm.invoke(messages)
+    except Exception as e:
+        raise RuntimeError(f"{PROVIDER_LABELS[provider]} call failed: {e}")
+    if cache is not None and isinstance(response.content, str):
+        cache.put(key, response.content, provider, model)
+    return response.content
+
+async def aget_llm_response(messages, provider=None, use_cache=True):
+    """
+    Async variant of get_llm_response: awaits the provider's ainvoke, so
+    the event loop keeps serving other requests during the completion.
+    Response cache reads and writes (SQLite) run in a worker thread.
+    
+    Raises:
+        ValueError: If required environment variables are not set
+        RuntimeError: If LLM call fails
+    """
+    if not messages:
+        raise ValueError("Messages cannot be empty")
+    
+    provider = provider or os.getenv("LLM_PROVIDER", "gemini").lower()
+    cache, key, model, cached = await asyncio.to_thread(_cached_response, messages, provider, use_cache)
+    if cached is not None:
+        return cached
+    
+    llm, provider = get_llm(provider)
+    try:
+        response = await llm.ainvoke(messages)
+    except Exception as e:
+        raise RuntimeError(f"{PROVIDER_LABELS[provider]} call failed: {e}")
+    if cache is not None and isinstance(response.content, str):
+        await asyncio.to_thread(cache.put, key, response.content, provider, model)
+    return response.content
+
+def _chunk_text(chunk):
+    """Text of a streamed message chunk (content may be a string or a list of parts)"""
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        part.get("text", "") if isinstance(part, dict) else str(part)
+        for part in content or []
+    )
+
+def stream_llm_response(messages, provider=None, use_cache=True):
+    """
+    Stream the response from the LLM as it is generated. A cached response
+    is yielded whole; a completed stream is added to the cache.
+    
+    Args:
+        messages (list): List of message dictionaries with 'role' and 'content' keys
+        provider (str, optional): LLM provider to use. Defaults to LLM_PROVIDER env var or "gemini"
+        use_cache (bool): Serve an identical earlier request from the response cache
+    
+    Yields:
+        str: Successive pieces of the response text
+    
+    Raises:
+        ValueError: If required environment variables are not set
+        RuntimeError: If LLM call fails
+    """
+    if not messages:
+        raise ValueError("Messages cannot be empty")
+    
+    provider = provider or os.getenv("LLM_PROVIDER", "gemini").lower()
+    cache, key, model, cached = _cached_response(messages, provider, use_cache)
+    if cached is not None:
+        yield cached
+        return
+    
+    llm, provider = get_llm(provider)
+    pieces = []
+    try:
+        for chunk in llm.stream(messages):
+            text = _chunk_text(chunk)
+            if text:
+                pieces.append(text)
+                yield text
+    except Exception as e:
+        raise RuntimeError(f"{PROVIDER_LABELS[provider]} call failed: {e}")
+    if cache is not None:
+        cache.put(key, "".join(pieces), provider, model)
+
+async def astream_llm_response(messages, provider=None, use_cache=True):
+    """
+    Async variant of stream_llm_response: iterates the provider's astream on
+    the event loop, with response cache reads and writes (SQLite) in a
+    worker thread.
+    
+    Raises:
+        ValueError: If required environment variables are not set
+        RuntimeError: If LLM call fails
+    """
+    if not messages:
+        raise ValueError("Messages cannot be empty")
+    
+    provider = provider or os.getenv("LLM_PROVIDER", "gemini").lower()
+    cache, key, model, cached = await asyncio.to_thread(_cached_response, messages, provider, use_cache)
+    if cached is not None:
+        yield cached
+        return
+    
+    llm, provider = get_llm(provider)
+    pieces = []
+    try:
+        async for chunk in llm.astream(messages):
+            text = _chunk_text(chunk)
+            if text:
+                pieces.append(text)
+                yield text
+    except Exception as e:
+        raise RuntimeError(f"{PROVIDER_LABELS[provider]} call failed: {e}")
+    if cache is not None:
+        await asyncio.to_thread(cache.put, key, "".join(pieces), provider, model)
 
 def test_llm_providers():
     """Test all available LLM providers."""
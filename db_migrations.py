@@ -0,0 +1,56 @@
+"""
+Lightweight in-place schema upgrades for existing databases
+
+`Base.metadata.create_all` only creates missing tables; it never alters
+tables that already exist. These helpers add the columns introduced since
+a database was first created so older `finale_documents.db` files keep
+working without a manual migration step.
+"""
+
+from typing import Dict
+
+from sqlalchemy import inspect, text
+
+
+def add_missing_columns(engine, table_name: str, columns: Dict[str, str]) -> int:
+    """
+    Add any of `columns` ({name: SQL type}) that the table does not have yet.
+
+    Returns the number of columns added. Missing tables are skipped since
+    create_all builds them with the full schema.
+    """
+    inspector = inspect(engine)
+    if table_name not in inspector.get_table_names():
+        return 0
+    existing = {column["name"] for column in inspector.get_columns(table_name)}
+
+    added = 0
+    with engine.begin() as conn:
+        for name, column_type in columns.items():
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {name} {column_type}"))
+                print(f"✅ Added {table_name}.{name} column")
+                added += 1
+    return added
+
+
+def create_missing_indexes(engine, metadata) -> int:
+    """
+    Create indexes declared on the models that existing tables lack.
+
+    create_all only builds indexes together with new tables, so indexes added
+    to a model later are created here. Returns the number created.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = 0
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+                print(f"✅ Created index {index.name}")
+                created += 1
+    return created
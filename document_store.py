@@ -0,0 +1,451 @@
+"""
+Persistence for documents and their sections
+
+All reads and writes of the `documents` and `document_sections` tables go
+through `DocumentStore`, so API handlers and the ingestion pipeline never
+hold an ORM session themselves. Each method runs in its own short session
+and returns detached rows (or plain tuples), which keeps sessions off the
+event loop's long awaits (parsing, embedding, LLM calls) and keeps the
+backend-specific SQL (cursor comparison on SQLite, full-text search on
+SQLite or PostgreSQL) in one place.
+
+Ingestion writes take the job's `ingestion.Lease` and confirm it inside the
+same transaction, so a worker whose lease expired cannot overwrite the
+result of the job's new owner.
+
+Every transaction that completes or deletes a document also bumps a
+counter in the `library_changes` table. `generation` reads that counter
+(at most once per LIBRARY_GENERATION_TTL seconds), so result caches keyed
+on it are invalidated by changes made on any API node sharing the database.
+
+Search filters are the dict produced by main.search_filters():
+document_ids, uploaded_after, uploaded_before, page_from, page_to.
+
+Environment Variables:
+LIBRARY_GENERATION_TTL (default: 1.0)
+    - Seconds a read of the change counter is reused; bounds how long another
+      node's change can go unnoticed
+"""
+
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import String, and_, insert, or_, text, type_coerce
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import defer
+
+from keyword_index import keyword_search
+
+IN_CLAUSE_CHUNK = 1000
+
+
+class DocumentStore:
+    """Document/DocumentSection queries and transactions"""
+
+    def __init__(self, session_factory: Callable, document_model, section_model, generation_ttl: Optional[float] = None):
+        self.session_factory = session_factory
+        self.Document = document_model
+        self.Section = section_model
+        self.generation_ttl = (
+            float(os.getenv("LIBRARY_GENERATION_TTL", "1.0")) if generation_ttl is None else generation_ttl
+        )
+        self._generation = 0
+        self._generation_checked_at: Optional[float] = None
+
+    def prepare(self):
+        """Create the change counter table and its single row"""
+        db = self.session_factory()
+        try:
+            db.execute(text(
+                "CREATE TABLE IF NOT EXISTS library_changes (id INTEGER PRIMARY KEY, generation BIGINT NOT NULL)"
+            ))
+            db.execute(text(
+                "INSERT INTO library_changes (id, generation) SELECT 1, 0 "
+                "WHERE NOT EXISTS (SELECT 1 FROM library_changes WHERE id = 1)"
+            ))
+            db.commit()
+        except IntegrityError:
+            db.rollback()  # Another node inserted the row first
+        finally:
+            db.close()
+
+    @property
+    def generation(self) -> int:
+        """Monotonic count of document completions and deletions (used as a cache key)"""
+        now = time.monotonic()
+        if self._generation_checked_at is None or now - self._generation_checked_at >= self.generation_ttl:
+            db = self.session_factory()
+            try:
+                self._generation = db.execute(
+                    text("SELECT generation FROM library_changes WHERE id = 1")
+                ).scalar() or 0
+            finally:
+                db.close()
+            self._generation_checked_at = now
+        return self._generation
+
+    def _bump_generation(self, db):
+        """Count a change inside the caller's transaction"""
+        db.execute(text("UPDATE library_changes SET generation = generation + 1 WHERE id = 1"))
+
+    def _changed(self):
+        self._generation_checked_at = None
+
+    def _detach(self, db, rows):
+        for row in rows:
+            db.refresh(row)
+            db.expunge(row)
+
+    # Documents ---------------------------------------------------------
+
+    def get(self, document_id: str):
+        """The document, or None"""
+        db = self.session_factory()
+        try:
+            return db.query(self.Document).filter(self.Document.id == document_id).first()
+        finally:
+            db.close()
+
+    def add(self, **fields):
+        """Insert a document row"""
+        db = self.session_factory()
+        try:
+            db.add(self.Document(**fields))
+            db.commit()
+        finally:
+            db.close()
+
+    def remove(self, document_id: str) -> Optional[Tuple[int, str, bool]]:
+        """
+        Delete a document and its sections in one transaction. Returns
+        (sections_removed, file_path, file_shared), where file_shared says
+        whether another document still points at the same file.
+        """
+        Document, Section = self.Document, self.Section
+        db = self.session_factory()
+        try:
+            document = db.query(Document).filter(Document.id == document_id).first()
+            if document is None:
+                return None
+            file_path = document.file_path
+            removed = db.query(Section).filter(Section.document_id == document_id).delete()
+            db.delete(document)
+            self._bump_generation(db)
+            db.commit()
+            self._changed()
+            file_shared = db.query(Document.id).filter(Document.file_path == file_path).first() is not None
+            return removed, file_path, file_shared
+        finally:
+            db.close()
+
+    def list_documents(self, limit: Optional[int] = None, after: Optional[Tuple[str, str]] = None, include_outline: bool = True):
+        """
+        Documents newest first. `after` is the (upload_time, id) keyset of
+        the last document of the previous page.
+        """
+        Document = self.Document
+        db = self.session_factory()
+        try:
+            query = db.query(Document)
+            if not include_outline:
+                query = query.options(defer(Document.outline))
+            if after:
+                # SQLite compares the stored text form of the timestamp
+                cursor_time, cursor_id = after
+                if db.get_bind().dialect.name == "sqlite":
+                    stored_time = type_coerce(Document.upload_time, String)
+                else:
+                    stored_time = Document.upload_time
+                    cursor_time = datetime.fromisoformat(cursor_time)
+                query = query.filter(or_(
+                    stored_time < cursor_time,
+                    and_(stored_time == cursor_time, Document.id < cursor_id)
+                ))
+            query = query.order_by(Document.upload_time.desc(), Document.id.desc())
+            if limit:
+                query = query.limit(limit)
+            return query.all()
+        finally:
+            db.close()
+
+    def find_by_content_hash(self, content_hash: str):
+        """Oldest document with these bytes that has not failed, or None"""
+        Document = self.Document
+        db = self.session_factory()
+        try:
+            return db.query(Document).filter(
+                Document.content_hash == content_hash,
+                Document.processing_status != "failed"
+            ).order_by(Document.upload_time).first()
+        finally:
+            db.close()
+
+    def find_processed_duplicate(self, document):
+        """A completed document with the same content hash, or None"""
+        if not document or not document.content_hash:
+            return None
+        Document = self.Document
+        db = self.session_factory()
+        try:
+            return db.query(Document).filter(
+                Document.content_hash == document.content_hash,
+                Document.id != document.id,
+                Document.processing_status == "completed"
+            ).order_by(Document.upload_time).first()
+        finally:
+            db.close()
+
+    def set_status(self, document_id: str, status: str, lease=None):
+        """Update processing_status; returns the updated document or None"""
+        db = self.session_factory()
+        try:
+            document = db.query(self.Document).filter(self.Document.id == document_id).first()
+            if document is None:
+                return None
+            if lease is not None:
+                lease.confirm(db)
+            document.processing_status = status
+            db.commit()
+            self._detach(db, [document])
+            return document
+        finally:
+            db.close()
+
+    def unfinished(self) -> List[Tuple[str, str]]:
+        """(id, file_path) of documents left pending or processing"""
+        Document = self.Document
+        db = self.session_factory()
+        try:
+            return [tuple(row) for row in db.query(Document.id, Document.file_path).filter(
+                Document.processing_status.in_(["pending", "processing"])
+            ).all()]
+        finally:
+            db.close()
+
+    def without_content_hash(self) -> List[Tuple[str, str]]:
+        """(id, file_path) of documents stored before deduplication existed"""
+        Document = self.Document
+        db = self.session_factory()
+        try:
+            return [tuple(row) for row in db.query(Document.id, Document.file_path).filter(
+                Document.content_hash.is_(None)
+            ).all()]
+        finally:
+            db.close()
+
+    def set_content_hashes(self, hashes: Dict[str, str]):
+        """Record {document_id: sha256} in one transaction"""
+        if not hashes:
+            return
+        Document = self.Document
+        db = self.session_factory()
+        try:
+            for document in db.query(Document).filter(Document.id.in_(list(hashes))).all():
+                document.content_hash = hashes[document.id]
+            db.commit()
+        finally:
+            db.close()
+
+    # Ingestion ---------------------------------------------------------
+
+    def save_processed(
+        self, document_id: str, title: str, outline: str, section_rows: Sequence[Dict[str, Any]], lease=None
+    ):
+        """
+        Store a parsed document: replace its sections (including any left by
+        an interrupted earlier attempt) and mark it completed, atomically
+        """
+        Section = self.Section
+        db = self.session_factory()
+        try:
+            document = db.query(self.Document).filter(self.Document.id == document_id).first()
+            if document is None:
+                return
+            if lease is not None:
+                lease.confirm(db)
+            db.query(Section).filter(Section.document_id == document_id).delete()
+            if section_rows:
+                db.execute(insert(Section), list(section_rows))
+            document.title = title
+            document.outline = outline
+            document.total_sections = len(section_rows)
+            document.processing_status = "completed"
+            self._bump_generation(db)
+            db.commit()
+            self._changed()
+        finally:
+            db.close()
+
+    def clone_processed(self, source_id: str, document_id: str, new_id: Callable[[], str], lease=None) -> List[tuple]:
+        """
+        Copy title, outline and sections (with their embeddings) from an
+        identical, already processed document and mark the copy completed.
+        Returns (section_id, embedding_blob, embedding_dtype) of the copied
+        sections that have an embedding.
+        """
+        Document, Section = self.Document, self.Section
+        db = self.session_factory()
+        try:
+            source = db.query(Document).filter(Document.id == source_id).first()
+            document = db.query(Document).filter(Document.id == document_id).first()
+            if source is None or document is None:
+                return []
+            if lease is not None:
+                lease.confirm(db)
+            document.title = source.title
+            document.outline = source.outline
+            document.total_sections = source.total_sections
+
+            source_sections = db.query(Section).filter(
+                Section.document_id == source_id
+            ).order_by(Section.section_number).all()
+            db.query(Section).filter(Section.document_id == document_id).delete()
+            section_rows, embedded = [], []
+            for section in source_sections:
+                section_id = new_id()
+                section_rows.append({
+                    "id": section_id,
+                    "document_id": document_id,
+                    "section_title": section.section_title,
+                    "section_content": section.section_content,
+                    "section_number": section.section_number,
+                    "page_number": section.page_number,
+                    "embedding_blob": section.embedding_blob,
+                    "embedding_dtype": section.embedding_dtype,
+                    "snippet": section.snippet
+                })
+                if section.embedding_blob is not None:
+                    embedded.append((section_id, section.embedding_blob, section.embedding_dtype))
+            if section_rows:
+                db.execute(insert(Section), section_rows)
+            document.processing_status = "completed"
+            self._bump_generation(db)
+            db.commit()
+            self._changed()
+            return embedded
+        finally:
+            db.close()
+
+    # Sections ----------------------------------------------------------
+
+    def sections(self, document_id: str):
+        """A document's sections in reading order"""
+        Section = self.Section
+        db = self.session_factory()
+        try:
+            return db.query(Section).filter(
+                Section.document_id == document_id
+            ).order_by(Section.section_number).all()
+        finally:
+            db.close()
+
+    def _filter_conditions(self, filters: Dict[str, Any]) -> list:
+        Document, Section = self.Document, self.Section
+        conditions = []
+        if "document_ids" in filters:
+            conditions.append(Section.document_id.in_(filters["document_ids"]))
+        if "uploaded_after" in filters:
+            conditions.append(Document.upload_time >= filters["uploaded_after"])
+        if "uploaded_before" in filters:
+            conditions.append(Document.upload_time <= filters["uploaded_before"])
+        if "page_from" in filters:
+            conditions.append(Section.page_number >= filters["page_from"])
+        if "page_to" in filters:
+            conditions.append(Section.page_number <= filters["page_to"])
+        return conditions
+
+    def _completed_sections(self, db, *columns):
+        Document, Section = self.Document, self.Section
+        return db.query(*columns).join(
+            Document, Section.document_id == Document.id
+        ).filter(Document.processing_status == "completed")
+
+    def indexed_sections(self, filters: Optional[Dict[str, Any]] = None) -> List[Tuple[str, str]]:
+        """(section_id, document_id) of embedded sections of completed documents that pass `filters`"""
+        Section = self.Section
+        db = self.session_factory()
+        try:
+            return [tuple(row) for row in self._completed_sections(db, Section.id, Section.document_id).filter(
+                Section.embedding_blob.isnot(None),
+                *self._filter_conditions(filters or {})
+            ).all()]
+        finally:
+            db.close()
+
+    def section_embeddings(self, section_ids: Optional[Iterable[str]] = None) -> List[tuple]:
+        """
+        (section_id, document_id, embedding_blob, embedding_dtype) of the
+        given sections, or of every indexed section when `section_ids` is None
+        """
+        Section = self.Section
+        columns = (Section.id, Section.document_id, Section.embedding_blob, Section.embedding_dtype)
+        db = self.session_factory()
+        try:
+            if section_ids is None:
+                return [tuple(row) for row in self._completed_sections(db, *columns).filter(
+                    Section.embedding_blob.isnot(None)
+                ).all()]
+            section_ids = list(section_ids)
+            rows = []
+            for start in range(0, len(section_ids), IN_CLAUSE_CHUNK):
+                rows.extend(tuple(row) for row in db.query(*columns).filter(
+                    Section.id.in_(section_ids[start:start + IN_CLAUSE_CHUNK])
+                ).all())
+            return rows
+        finally:
+            db.close()
+
+    def sections_with_documents(self, section_ids: Sequence[str], completed_only: bool = True) -> List[tuple]:
+        """(section, document) pairs for the given section IDs, in no particular order"""
+        Document, Section = self.Document, self.Section
+        section_ids = list(section_ids)
+        if not section_ids:
+            return []
+        db = self.session_factory()
+        try:
+            query = db.query(Section, Document).join(
+                Document, Section.document_id == Document.id
+            ).filter(Section.id.in_(section_ids))
+            if completed_only:
+                query = query.filter(Document.processing_status == "completed")
+            return [tuple(row) for row in query.all()]
+        finally:
+            db.close()
+
+    def filtered_sections(self, filters: Dict[str, Any], embedded: Optional[bool] = None) -> List[tuple]:
+        """
+        (section, document) pairs of completed documents that pass `filters`;
+        `embedded` keeps only sections with (True) or without (False) an embedding
+        """
+        Document, Section = self.Document, self.Section
+        db = self.session_factory()
+        try:
+            query = self._completed_sections(db, Section, Document).filter(*self._filter_conditions(filters))
+            if embedded is True:
+                query = query.filter(Section.embedding_blob.isnot(None))
+            elif embedded is False:
+                query = query.filter(Section.embedding_blob.is_(None))
+            return [tuple(row) for row in query.all()]
+        finally:
+            db.close()
+
+    def section_texts(self, filters: Dict[str, Any]) -> List[Tuple[str, str, str]]:
+        """(section_id, title, content) of completed documents that pass `filters`"""
+        Section = self.Section
+        db = self.session_factory()
+        try:
+            return [tuple(row) for row in self._completed_sections(
+                db, Section.id, Section.section_title, Section.section_content
+            ).filter(*self._filter_conditions(filters)).all()]
+        finally:
+            db.close()
+
+    def keyword_search(self, query: str, limit: int, **kwargs) -> List[Tuple[str, float]]:
+        """BM25 search over section text, see keyword_index.keyword_search"""
+        db = self.session_factory()
+        try:
+            return keyword_search(db, query, limit=limit, **kwargs)
+        finally:
+            db.close()
@@ -0,0 +1,163 @@
+"""
+Microbatching of query embeddings for /connect-dots
+
+Concurrent requests would otherwise each run a batch-of-one forward pass.
+Requests are queued instead; the first one in an empty queue opens a
+batch that closes after EMBEDDING_MICROBATCH_WAIT_MS (measured from that
+first request) or as soon as EMBEDDING_MICROBATCH_SIZE texts are waiting.
+The batch runs as one encode on a dedicated thread, off the event loop,
+and every caller's future is resolved with its own vector.
+
+Queue wait (enqueue to encode start) and batch size are recorded as
+histograms and reported by /health.
+
+Environment Variables:
+EMBEDDING_MICROBATCH_SIZE (default: 32)
+    - Maximum texts per encode
+EMBEDDING_MICROBATCH_WAIT_MS (default: 5)
+    - Longest a request waits for others to join its batch
+"""
+
+import asyncio
+import bisect
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+QUEUE_WAIT_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class Histogram:
+    """Fixed-bucket histogram; quantiles are reported as bucket upper bounds"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def stats(self) -> Dict[str, Any]:
+        labels = [f"le_{bound:g}" for bound in self.buckets] + ["le_inf"]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else None,
+            "max": round(self.max, 3),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+
+class EmbeddingMicrobatcher:
+    """Coalesces concurrent embedding requests into batched encode calls"""
+
+    def __init__(self, encode: Callable[[List[str]], List[Any]], max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self._encode = encode
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-embed")
+        self._queue: Optional[asyncio.Queue] = None
+        self._batch_full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_BUCKETS_MS)
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+        self.requests = 0
+        self.batches = 0
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._batch_full = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+
+    async def embed(self, text: str) -> Any:
+        """Embedding of one text, encoded together with concurrent requests"""
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((text, future, time.perf_counter()))
+        self.requests += 1
+        if self._queue.qsize() >= self.max_batch_size:
+            self._batch_full.set()
+        return await future
+
+    async def _run(self):
+        while True:
+            first = await self._queue.get()
+            # The window is measured from the first request, so time spent queued behind
+            # a running encode counts toward it
+            remaining = self.max_wait - (time.perf_counter() - first[2])
+            if remaining > 0 and self._queue.qsize() + 1 < self.max_batch_size:
+                self._batch_full.clear()
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            batch = [first]
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._run_batch(batch)
+
+    async def _run_batch(self, batch: List[tuple]):
+        started = time.perf_counter()
+        for _, _, enqueued_at in batch:
+            self.queue_wait_ms.observe((started - enqueued_at) * 1000)
+        self.batch_size.observe(len(batch))
+        self.batches += 1
+
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        try:
+            vectors = await asyncio.get_running_loop().run_in_executor(self._executor, self._encode, texts)
+            by_text = dict(zip(texts, vectors))
+            for text, future, _ in batch:
+                if not future.done():
+                    future.set_result(by_text.get(text))
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "requests": self.requests,
+            "batches": self.batches,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_wait_ms": self.queue_wait_ms.stats(),
+            "batch_size": self.batch_size.stats()
+        }
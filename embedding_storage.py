@@ -0,0 +1,151 @@
+"""
+Compact binary storage for section embeddings
+
+Embeddings are stored as raw bytes in `document_sections.embedding_blob`
+instead of JSON text, with the element format recorded next to them in
+`document_sections.embedding_dtype`. Readers decode with `np.frombuffer`,
+so float32 and float16 rows are never re-parsed.
+
+Environment Variables:
+EMBEDDING_STORAGE_DTYPE (default: "float32")
+    - "float32": Raw float32 vector (4 bytes per dimension)
+    - "float16": Half precision (2 bytes per dimension)
+    - "int8": Symmetric int8 quantization with a per-vector float32 scale
+      stored as a 4-byte header (1 byte per dimension)
+
+Migration:
+    # Convert legacy JSON embeddings in ./finale_documents.db in place
+    python embedding_storage.py [--database sqlite:///./finale_documents.db] [--dtype float16] [--vacuum]
+"""
+
+import os
+import json
+from typing import Optional, Sequence
+
+import numpy as np
+from sqlalchemy import text
+
+from db_migrations import add_missing_columns
+
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+INT8_HEADER_BYTES = 4  # float32 dequantization scale
+
+
+def get_storage_dtype() -> str:
+    """Storage format for newly written embeddings"""
+    dtype = os.getenv("EMBEDDING_STORAGE_DTYPE", "float32").lower()
+    if dtype not in SUPPORTED_DTYPES:
+        print(f"⚠️ Unsupported EMBEDDING_STORAGE_DTYPE '{dtype}', using float32")
+        return "float32"
+    return dtype
+
+
+def encode_embedding(vector: Sequence[float], dtype: Optional[str] = None) -> bytes:
+    """Serialize one embedding vector to bytes in the given storage format"""
+    dtype = dtype or get_storage_dtype()
+    vector = np.asarray(vector, dtype=np.float32)
+
+    if dtype == "float32":
+        return vector.tobytes()
+    if dtype == "float16":
+        return vector.astype(np.float16).tobytes()
+    if dtype == "int8":
+        max_abs = float(np.max(np.abs(vector))) if vector.size else 0.0
+        scale = max_abs / 127.0 if max_abs > 0 else 1.0
+        quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        return np.float32(scale).tobytes() + quantized.tobytes()
+    raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
+
+def decode_embedding(blob: bytes, dtype: Optional[str] = "float32") -> np.ndarray:
+    """
+    Deserialize an embedding blob.
+
+    float32 rows come back as a zero-copy read-only view over the blob; float16
+    and int8 rows are viewed with np.frombuffer and widened to float32.
+    """
+    dtype = dtype or "float32"
+    if dtype == "float32":
+        return np.frombuffer(blob, dtype=np.float32)
+    if dtype == "float16":
+        return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+    if dtype == "int8":
+        scale = np.frombuffer(blob, dtype=np.float32, count=1)[0]
+        return np.frombuffer(blob, dtype=np.int8, offset=INT8_HEADER_BYTES).astype(np.float32) * scale
+    raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
+
+def ensure_embedding_columns(engine):
+    """Add the binary embedding columns to an existing document_sections table"""
+    add_missing_columns(engine, "document_sections", {
+        "embedding_blob": "BYTEA" if engine.dialect.name == "postgresql" else "BLOB",
+        "embedding_dtype": "VARCHAR"
+    })
+
+
+def migrate_json_embeddings(engine, dtype: Optional[str] = None, batch_size: int = 500) -> int:
+    """
+    Convert legacy JSON-text embeddings to binary blobs in place.
+
+    Each converted row gets its blob and dtype set and its JSON `embedding`
+    cleared, so the migration is resumable and idempotent.
+    """
+    dtype = dtype or get_storage_dtype()
+    ensure_embedding_columns(engine)
+
+    converted = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT id, embedding FROM document_sections "
+                    "WHERE embedding IS NOT NULL AND embedding_blob IS NULL LIMIT :limit"
+                ),
+                {"limit": batch_size}
+            ).fetchall()
+            if not rows:
+                break
+
+            updates = []
+            for section_id, embedding_json in rows:
+                try:
+                    vector = json.loads(embedding_json)
+                except (TypeError, ValueError):
+                    vector = None
+                updates.append({
+                    "id": section_id,
+                    "blob": encode_embedding(vector, dtype) if vector else None,
+                    "dtype": dtype if vector else None
+                })
+
+            conn.execute(
+                text(
+                    "UPDATE document_sections SET embedding_blob = :blob, "
+                    "embedding_dtype = :dtype, embedding = NULL WHERE id = :id"
+                ),
+                updates
+            )
+            converted += len(updates)
+
+    if converted:
+        print(f"✅ Migrated {converted} JSON embeddings to {dtype} blobs")
+    return converted
+
+
+if __name__ == "__main__":
+    import argparse
+    from sqlalchemy import create_engine
+
+    parser = argparse.ArgumentParser(description="Convert JSON embeddings to binary blobs")
+    parser.add_argument("--database", default="sqlite:///./finale_documents.db")
+    parser.add_argument("--dtype", choices=SUPPORTED_DTYPES, default=None)
+    parser.add_argument("--vacuum", action="store_true", help="Reclaim freed space after migrating")
+    args = parser.parse_args()
+
+    migration_engine = create_engine(args.database)
+    migrate_json_embeddings(migration_engine, dtype=args.dtype)
+
+    if args.vacuum and migration_engine.dialect.name == "sqlite":
+        with migration_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+        print("✅ Database vacuumed")
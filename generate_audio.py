@@ -2,7 +2,6 @@ import os
 import subprocess
 import requests
 from pathlib import Path
-from google.cloud import texttospeech
 
 """
 Unified Text-to-Speech Interface with Multi-Provider Support
@@ -280,7 +279,9 @@ def _generate_gcp_tts(text, output_file, voice=None):
                 f.write(audio_content)
             
         else:
-            # Use service account credentials
+            # Use service account credentials (SDK imported only on this path)
+            from google.cloud import texttospeech
+
             os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials_path
             client = texttospeech.TextToSpeechClient()
             
@@ -0,0 +1,504 @@
+"""
+Durable, bounded ingestion scheduler for uploaded PDFs
+
+Every upload becomes a row in the `ingestion_jobs` table before any work
+starts. A fixed number of worker coroutines claim jobs from that table
+under a time-limited lease, renew the lease while they work, and push the
+blocking stages off the event loop: PyMuPDF parsing runs in a process pool
+and SentenceTransformer encoding runs in a thread pool, so search and
+`/health` stay responsive while large batches are ingested.
+
+Because the queue lives in the database, a restart (or a crashed replica)
+loses nothing: jobs left `running` are picked up again once their lease
+expires, and failed attempts are retried up to INGEST_MAX_ATTEMPTS times.
+Every claim gets a fresh lease token, and renewals and results are only
+recorded while the worker still holds that token, so a worker whose lease
+was taken over cannot overwrite the new owner's job. The handler receives
+the claim as a `Lease` and confirms it inside the transactions that write
+the document, so its writes are fenced the same way.
+
+A failed attempt leaves the document's status alone while the job has
+attempts left; the document is marked failed together with the job once
+they are exhausted.
+
+Job states: queued -> running -> completed | failed
+
+Environment Variables:
+INGEST_CONCURRENCY (default: 2)
+    - Number of documents processed at the same time
+INGEST_QUEUE_SIZE (default: 100)
+    - Maximum number of queued or running jobs before uploads wait
+INGEST_ENQUEUE_TIMEOUT (default: 30)
+    - Seconds an upload waits for queue space before it is rejected
+INGEST_PARSE_WORKERS (default: 2)
+    - Processes used for PDF parsing; 0 parses in a thread instead
+INGEST_EMBED_WORKERS (default: 1)
+    - Threads used for embedding generation
+INGEST_LEASE_SECONDS (default: 300)
+    - How long a claimed job stays reserved without a lease renewal
+INGEST_MAX_ATTEMPTS (default: 3)
+    - Attempts per job before it is marked failed
+INGEST_POLL_INTERVAL (default: 2)
+    - Seconds idle workers wait before polling the job table again
+"""
+
+import os
+import asyncio
+import time
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select, update
+
+
+class IngestionQueueFull(Exception):
+    """Raised when a document cannot be queued within the enqueue timeout"""
+
+
+class LeaseLost(Exception):
+    """Raised when a worker's lease on its job has been taken over"""
+
+
+class JobQueue:
+    """Lease-based job queue on top of the `ingestion_jobs` table"""
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        job_model,
+        lease_seconds: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        document_model=None
+    ):
+        self.session_factory = session_factory
+        self.Job = job_model
+        self.Document = document_model  # Marked failed when its job's final lease expires
+        self.lease_seconds = lease_seconds or float(os.getenv("INGEST_LEASE_SECONDS", "300"))
+        self.max_attempts = max_attempts or int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+
+    def enqueue(self, document_id: str, file_path: str) -> str:
+        """Persist a new queued job and return its ID"""
+        db = self.session_factory()
+        try:
+            job = self.Job(
+                id=str(uuid.uuid4()),
+                document_id=document_id,
+                file_path=file_path,
+                state="queued",
+                attempts=0,
+                created_at=time.time()
+            )
+            db.add(job)
+            db.commit()
+            return job.id
+        finally:
+            db.close()
+
+    def claim(self) -> Optional[Tuple[str, str, str, str]]:
+        """
+        Atomically reserve the oldest runnable job.
+
+        Runnable means queued, or running with an expired lease (its worker
+        died or the process restarted). Returns (job_id, document_id,
+        file_path, lease_token); the token must be passed to renew, complete
+        and fail.
+        """
+        Job = self.Job
+        now = time.time()
+        token = uuid.uuid4().hex
+        db = self.session_factory()
+        try:
+            # Jobs whose lease ran out on their final attempt are not retried
+            exhausted = and_(
+                Job.state == "running",
+                Job.lease_expires_at < now,
+                Job.attempts >= self.max_attempts
+            )
+            if self.Document is not None:
+                # Their documents fail in the same transaction, so startup recovery does not requeue them
+                db.execute(
+                    update(self.Document).where(
+                        self.Document.id.in_(select(Job.document_id).where(exhausted)),
+                        self.Document.processing_status.in_(["pending", "processing"])
+                    ).values(processing_status="failed").execution_options(synchronize_session=False)
+                )
+            db.execute(
+                update(Job).where(exhausted).values(
+                    state="failed",
+                    finished_at=now,
+                    lease_owner=None,
+                    last_error="Lease expired on final attempt"
+                )
+            )
+
+            candidate = select(Job.id).where(
+                or_(
+                    Job.state == "queued",
+                    and_(Job.state == "running", Job.lease_expires_at < now)
+                )
+            ).order_by(Job.created_at).limit(1).with_for_update(skip_locked=True).scalar_subquery()
+            # SKIP LOCKED lets workers on other API nodes claim different jobs (ignored on SQLite)
+
+            claimed = db.execute(
+                update(Job).where(
+                    Job.id == candidate,
+                    or_(
+                        Job.state == "queued",
+                        and_(Job.state == "running", Job.lease_expires_at < now)
+                    )
+                ).values(
+                    state="running",
+                    lease_owner=token,
+                    lease_expires_at=now + self.lease_seconds,
+                    attempts=Job.attempts + 1,
+                    started_at=now
+                )
+            ).rowcount
+            db.commit()
+            if not claimed:
+                return None
+
+            job = db.query(Job).filter(Job.lease_owner == token).first()
+            return (job.id, job.document_id, job.file_path, token) if job else None
+        finally:
+            db.close()
+
+    def _owned(self, job_id: str, token: str):
+        return and_(self.Job.id == job_id, self.Job.state == "running", self.Job.lease_owner == token)
+
+    def renew(self, job_id: str, token: str) -> bool:
+        """Extend the lease of a job that is still being worked on; False once the lease was lost"""
+        db = self.session_factory()
+        try:
+            renewed = db.execute(
+                update(self.Job).where(self._owned(job_id, token)).values(
+                    lease_expires_at=time.time() + self.lease_seconds
+                )
+            ).rowcount
+            db.commit()
+            return bool(renewed)
+        finally:
+            db.close()
+
+    def complete(self, job_id: str, token: str) -> bool:
+        """Mark the job completed; False (and no change) if the lease was lost"""
+        db = self.session_factory()
+        try:
+            completed = db.execute(
+                update(self.Job).where(self._owned(job_id, token)).values(
+                    state="completed",
+                    finished_at=time.time(),
+                    lease_owner=None,
+                    lease_expires_at=None,
+                    last_error=None
+                )
+            ).rowcount
+            db.commit()
+            return bool(completed)
+        finally:
+            db.close()
+
+    def fail(self, job_id: str, token: str, error: str) -> Optional[str]:
+        """
+        Record a failed attempt; requeue unless attempts are exhausted, in
+        which case the document is marked failed in the same transaction.
+        Returns the new state, or None (and no change) if the lease was lost.
+        """
+        db = self.session_factory()
+        try:
+            job = db.query(self.Job).filter(self._owned(job_id, token)).with_for_update().first()
+            if not job:
+                return None
+            job.state = "queued" if (job.attempts or 0) < self.max_attempts else "failed"
+            job.last_error = error[:2000]
+            job.lease_owner = None
+            job.lease_expires_at = None
+            if job.state == "failed":
+                job.finished_at = time.time()
+                if self.Document is not None:
+                    # Only now does the document stop being a pending/processing one
+                    db.execute(
+                        update(self.Document).where(
+                            self.Document.id == job.document_id,
+                            self.Document.processing_status.in_(["pending", "processing"])
+                        ).values(processing_status="failed").execution_options(synchronize_session=False)
+                    )
+            db.commit()
+            return job.state
+        finally:
+            db.close()
+
+    def backlog(self) -> int:
+        """Number of jobs that are queued or running"""
+        db = self.session_factory()
+        try:
+            return db.query(self.Job).filter(self.Job.state.in_(["queued", "running"])).count()
+        finally:
+            db.close()
+
+    def has_open_job(self, document_id: str) -> bool:
+        db = self.session_factory()
+        try:
+            return db.query(self.Job.id).filter(
+                self.Job.document_id == document_id,
+                self.Job.state.in_(["queued", "running"])
+            ).first() is not None
+        finally:
+            db.close()
+
+    def stats(self, window_seconds: float = 300) -> Dict[str, Any]:
+        """Backlog and throughput figures from the job table"""
+        Job = self.Job
+        now = time.time()
+        db = self.session_factory()
+        try:
+            counts = dict(db.query(Job.state, func.count(Job.id)).group_by(Job.state).all())
+
+            recent = db.query(
+                func.count(Job.id),
+                func.avg(Job.finished_at - Job.started_at)
+            ).filter(
+                Job.state == "completed",
+                Job.finished_at >= now - window_seconds
+            ).first()
+            completed_recently, avg_duration = recent or (0, None)
+
+            oldest_queued = db.query(func.min(Job.created_at)).filter(Job.state == "queued").scalar()
+
+            return {
+                "states": {state: counts.get(state, 0) for state in ("queued", "running", "completed", "failed")},
+                "backlog": counts.get("queued", 0) + counts.get("running", 0),
+                "throughput_per_minute": round(completed_recently * 60.0 / window_seconds, 2),
+                "avg_job_seconds": round(avg_duration, 3) if avg_duration is not None else None,
+                "oldest_queued_age_seconds": round(now - oldest_queued, 1) if oldest_queued else None,
+                "window_seconds": window_seconds
+            }
+        finally:
+            db.close()
+
+    def recent(self, limit: int = 50, state: Optional[str] = None) -> List[Dict[str, Any]]:
+        db = self.session_factory()
+        try:
+            query = db.query(self.Job)
+            if state:
+                query = query.filter(self.Job.state == state)
+            jobs = query.order_by(self.Job.created_at.desc()).limit(limit).all()
+            return [
+                {
+                    "id": job.id,
+                    "document_id": job.document_id,
+                    "state": job.state,
+                    "attempts": job.attempts,
+                    "last_error": job.last_error,
+                    "created_at": job.created_at,
+                    "started_at": job.started_at,
+                    "finished_at": job.finished_at
+                }
+                for job in jobs
+            ]
+        finally:
+            db.close()
+
+
+class Lease:
+    """A worker's claim on one job, handed to the job handler to fence its document writes"""
+
+    def __init__(self, job_queue: JobQueue, job_id: str, token: str):
+        self.job_queue = job_queue
+        self.job_id = job_id
+        self.token = token
+
+    def confirm(self, db):
+        """
+        Check and extend the lease inside the caller's transaction.
+
+        The UPDATE holds the job row (or, on SQLite, the write lock) until the
+        caller commits, so the lease cannot be taken over in between. Raises
+        LeaseLost once another worker owns the job.
+        """
+        confirmed = db.execute(
+            update(self.job_queue.Job).where(self.job_queue._owned(self.job_id, self.token)).values(
+                lease_expires_at=time.time() + self.job_queue.lease_seconds
+            )
+        ).rowcount
+        if not confirmed:
+            raise LeaseLost(f"Lease on ingestion job {self.job_id} was lost")
+
+
+class IngestionScheduler:
+    """Workers that drain the durable job queue through bounded executor pools"""
+
+    def __init__(
+        self,
+        handler: Callable[..., Awaitable[Any]],
+        job_queue: JobQueue,
+        concurrency: Optional[int] = None,
+        max_queue_size: Optional[int] = None,
+        enqueue_timeout: Optional[float] = None,
+        parse_workers: Optional[int] = None,
+        embed_workers: Optional[int] = None,
+        poll_interval: Optional[float] = None
+    ):
+        self.handler = handler
+        self.job_queue = job_queue
+        self.concurrency = max(1, concurrency or int(os.getenv("INGEST_CONCURRENCY", "2")))
+        self.max_queue_size = max_queue_size or int(os.getenv("INGEST_QUEUE_SIZE", "100"))
+        self.enqueue_timeout = enqueue_timeout or float(os.getenv("INGEST_ENQUEUE_TIMEOUT", "30"))
+        self.parse_workers = parse_workers if parse_workers is not None else int(os.getenv("INGEST_PARSE_WORKERS", "2"))
+        self.embed_workers = max(1, embed_workers or int(os.getenv("INGEST_EMBED_WORKERS", "1")))
+        self.poll_interval = poll_interval or float(os.getenv("INGEST_POLL_INTERVAL", "2"))
+
+        self._wakeup: Optional[asyncio.Event] = None
+        self._workers: List[asyncio.Task] = []
+        self._parse_executor: Optional[Executor] = None
+        self._embed_executor: Optional[Executor] = None
+
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.parse_pool_restarts = 0
+        self.started_at: Optional[float] = None
+
+    async def start(self):
+        """Create the executors and worker coroutines; unfinished jobs resume automatically"""
+        if self._workers:
+            return
+        self._wakeup = asyncio.Event()
+        if self.parse_workers > 0:
+            self._parse_executor = ProcessPoolExecutor(max_workers=self.parse_workers)
+        else:
+            self._parse_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-parse")
+        self._embed_executor = ThreadPoolExecutor(max_workers=self.embed_workers, thread_name_prefix="ingest-embed")
+        self._workers = [
+            asyncio.create_task(self._worker(i))
+            for i in range(self.concurrency)
+        ]
+        self.started_at = time.time()
+        print(f"✅ Ingestion scheduler started ({self.concurrency} workers, "
+              f"{self.parse_workers} parse processes, {self.embed_workers} embed threads, "
+              f"{self.job_queue.backlog()} jobs in backlog)")
+
+    async def stop(self):
+        """Cancel workers and shut the executors down; running jobs resume after their lease expires"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._parse_executor:
+            self._parse_executor.shutdown(wait=False, cancel_futures=True)
+            self._parse_executor = None
+        if self._embed_executor:
+            self._embed_executor.shutdown(wait=False, cancel_futures=True)
+            self._embed_executor = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self.job_queue.backlog()
+
+    async def submit(self, document_id: str, file_path: str) -> str:
+        """Persist a job for one document, waiting up to enqueue_timeout for backlog space"""
+        deadline = time.time() + self.enqueue_timeout
+        while self.job_queue.backlog() >= self.max_queue_size:
+            if time.time() >= deadline:
+                self.rejected += 1
+                raise IngestionQueueFull(
+                    f"Ingestion queue is full ({self.max_queue_size} documents waiting), please retry later"
+                )
+            await asyncio.sleep(0.5)
+
+        job_id = self.job_queue.enqueue(document_id, file_path)
+        if self._wakeup:
+            self._wakeup.set()
+        return job_id
+
+    async def run_parse(self, func: Callable, *args):
+        """
+        Run a CPU-bound parsing function in the parse pool.
+
+        A parse process that dies (segfault, OOM kill) breaks the whole pool
+        and fails every job in flight on it. The pool is then replaced, and
+        each affected job is rerun alone in a one-off process, so only the
+        job that actually crashes its process fails.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._parse_executor
+        try:
+            return await loop.run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            self._replace_parse_executor(executor)
+
+        isolated = ProcessPoolExecutor(max_workers=1)
+        try:
+            return await loop.run_in_executor(isolated, func, *args)
+        except BrokenProcessPool as e:
+            raise RuntimeError("PDF parsing process crashed") from e
+        finally:
+            isolated.shutdown(wait=False)
+
+    def _replace_parse_executor(self, broken: Executor):
+        """Swap a broken parse pool for a fresh one (once, however many jobs saw it break)"""
+        if self._parse_executor is not broken:
+            return
+        broken.shutdown(wait=False, cancel_futures=True)
+        self._parse_executor = ProcessPoolExecutor(max_workers=self.parse_workers)
+        self.parse_pool_restarts += 1
+        print(f"⚠️ Parse process pool broke; restarted it ({self.parse_pool_restarts} restarts)")
+
+    async def run_embed(self, func: Callable, *args):
+        """Run an embedding function in the embedding thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._embed_executor, func, *args)
+
+    async def _renew_lease(self, job_id: str, token: str):
+        while True:
+            await asyncio.sleep(self.job_queue.lease_seconds / 3)
+            if not self.job_queue.renew(job_id, token):
+                print(f"⚠️ Lost the lease on ingestion job {job_id}; its result will not be recorded")
+                return
+
+    async def _worker(self, worker_id: int):
+        while True:
+            self._wakeup.clear()
+            job = self.job_queue.claim()
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job_id, document_id, file_path, token = job
+            self.in_flight += 1
+            heartbeat = asyncio.create_task(self._renew_lease(job_id, token))
+            try:
+                await self.handler(document_id, file_path, Lease(self.job_queue, job_id, token))
+                if self.job_queue.complete(job_id, token):
+                    self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                state = self.job_queue.fail(job_id, token, f"{type(e).__name__}: {e}")
+                print(f"❌ Ingestion worker {worker_id} failed job {job_id} ({state or 'lease lost'}): {e}")
+            finally:
+                heartbeat.cancel()
+                self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and throughput counters for monitoring"""
+        return {
+            "running": bool(self._workers),
+            "queue_depth": self.queue_depth,
+            "max_queue_size": self.max_queue_size,
+            "in_flight": self.in_flight,
+            "concurrency": self.concurrency,
+            "parse_workers": self.parse_workers,
+            "parse_pool_restarts": self.parse_pool_restarts,
+            "embed_workers": self.embed_workers,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected
+        }
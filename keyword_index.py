@@ -0,0 +1,219 @@
+"""
+BM25 keyword search over document sections with SQLite FTS5
+
+`section_fts` is an external-content FTS5 table over `document_sections`
+(section_title, section_content). Triggers keep it in step with every
+insert, update and delete of a section, so it is built once per section at
+ingestion time and persisted in the database. Queries are ranked with
+FTS5's built-in bm25(), with title matches weighted above body matches.
+
+FTS rows are keyed on `document_sections.search_rowid`, an explicit integer
+column the insert trigger fills with the next free number. The table's
+primary key is a string, so its implicit rowid is not stable: VACUUM may
+renumber it, which would silently point keyword hits at other sections.
+Databases indexed on the implicit rowid are migrated and rebuilt once.
+
+On PostgreSQL the same search runs on a GIN-indexed tsvector expression
+and is ranked with ts_rank_cd (title weighted above body).
+
+Databases without either report the index as unavailable and callers fall
+back to per-row keyword matching.
+"""
+
+import re
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import DateTime, bindparam, inspect, text
+
+FTS_TABLE = "section_fts"
+FTS_ROWID = "search_rowid"
+TITLE_WEIGHT = 2.0
+CONTENT_WEIGHT = 1.0
+MAX_QUERY_TERMS = 64
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# The GIN index and the query must use the same expression for the index to apply
+PG_DOCUMENT_VECTOR = (
+    "to_tsvector('simple', coalesce({prefix}section_title, '') || ' ' || coalesce({prefix}section_content, ''))"
+)
+PG_WEIGHTED_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(s.section_title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(s.section_content, '')), 'B')"
+)
+
+TRIGGERS = {
+    "section_fts_ai": f"""
+        CREATE TRIGGER IF NOT EXISTS section_fts_ai AFTER INSERT ON document_sections BEGIN
+            UPDATE document_sections
+            SET {FTS_ROWID} = (SELECT coalesce(max({FTS_ROWID}), 0) + 1 FROM document_sections)
+            WHERE rowid = new.rowid AND {FTS_ROWID} IS NULL;
+            INSERT INTO {FTS_TABLE}(rowid, section_title, section_content)
+            SELECT {FTS_ROWID}, section_title, section_content FROM document_sections WHERE rowid = new.rowid;
+        END
+    """,
+    "section_fts_ad": f"""
+        CREATE TRIGGER IF NOT EXISTS section_fts_ad AFTER DELETE ON document_sections BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, section_title, section_content)
+            VALUES ('delete', old.{FTS_ROWID}, old.section_title, old.section_content);
+        END
+    """,
+    "section_fts_au": f"""
+        CREATE TRIGGER IF NOT EXISTS section_fts_au AFTER UPDATE OF section_title, section_content
+        ON document_sections BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, section_title, section_content)
+            VALUES ('delete', old.{FTS_ROWID}, old.section_title, old.section_content);
+            INSERT INTO {FTS_TABLE}(rowid, section_title, section_content)
+            VALUES (new.{FTS_ROWID}, new.section_title, new.section_content);
+        END
+    """
+}
+
+
+def drop_implicit_rowid_index(conn) -> bool:
+    """Drop an FTS table (and its triggers) keyed on the implicit rowid; returns whether it existed"""
+    fts_sql = conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"
+    ), {"name": FTS_TABLE}).scalar()
+    if fts_sql is None or f"content_rowid='{FTS_ROWID}'" in fts_sql:
+        return False
+    for trigger_name in TRIGGERS:
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger_name}"))
+    conn.execute(text(f"DROP TABLE {FTS_TABLE}"))
+    return True
+
+
+def ensure_keyword_index(engine) -> bool:
+    """Create the FTS5 table and its triggers, backfilling existing sections; returns availability"""
+    if engine.dialect.name == "postgresql":
+        return ensure_postgres_keyword_index(engine)
+    if engine.dialect.name != "sqlite":
+        return False
+    try:
+        created = FTS_TABLE not in inspect(engine).get_table_names()
+        with engine.begin() as conn:
+            if drop_implicit_rowid_index(conn):
+                print("♻️ Re-keying BM25 keyword index on document_sections.search_rowid")
+                created = True
+            # Sections stored before the column existed; offset past any assigned number
+            conn.execute(text(
+                f"UPDATE document_sections SET {FTS_ROWID} = rowid + "
+                f"(SELECT coalesce(max({FTS_ROWID}), 0) FROM document_sections) WHERE {FTS_ROWID} IS NULL"
+            ))
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "section_title, section_content, "
+                f"content='document_sections', content_rowid='{FTS_ROWID}', "
+                "tokenize='unicode61 remove_diacritics 2')"
+            ))
+            for trigger_sql in TRIGGERS.values():
+                conn.execute(text(trigger_sql))
+            if created:
+                conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        if created:
+            print("✅ Built BM25 keyword index over document sections")
+        return True
+    except Exception as e:
+        print(f"⚠️ FTS5 keyword index unavailable, using per-section keyword matching: {e}")
+        return False
+
+
+def ensure_postgres_keyword_index(engine) -> bool:
+    """GIN index over the sections' tsvector expression used by keyword_search"""
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_document_sections_tsv ON document_sections USING gin ("
+                + PG_DOCUMENT_VECTOR.format(prefix="") + ")"
+            ))
+        return True
+    except Exception as e:
+        print(f"⚠️ PostgreSQL keyword index unavailable, using per-section keyword matching: {e}")
+        return False
+
+
+def query_terms(query: str) -> List[str]:
+    return list(dict.fromkeys(TOKEN_RE.findall(query.lower())))[:MAX_QUERY_TERMS]
+
+
+def build_match_query(query: str) -> str:
+    """FTS5 MATCH expression: any of the query's terms, each quoted so punctuation is inert"""
+    return " OR ".join(f'"{term}"' for term in query_terms(query))
+
+
+def bm25_to_similarity(rank: float) -> float:
+    """Map FTS5 bm25() or negated ts_rank_cd (lower is better, <= 0) onto a 0-1 similarity"""
+    score = max(-rank, 0.0)
+    return score / (score + 1.0)
+
+
+def keyword_search(
+    db,
+    query: str,
+    limit: int,
+    unembedded_only: bool = False,
+    document_ids: Optional[Sequence[str]] = None,
+    uploaded_after: Optional[datetime] = None,
+    uploaded_before: Optional[datetime] = None,
+    page_from: Optional[int] = None,
+    page_to: Optional[int] = None
+) -> List[Tuple[str, float]]:
+    """
+    Top `limit` sections of completed documents for `query` by BM25.
+
+    Returns (section_id, similarity) pairs, best first. With
+    `unembedded_only`, sections that have an embedding are skipped; the
+    remaining arguments restrict documents, upload times and pages.
+    """
+    postgres = db.get_bind().dialect.name == "postgresql"
+    terms = query_terms(query)
+    if not terms or limit <= 0 or (document_ids is not None and not document_ids):
+        return []
+
+    if postgres:
+        # \w+ terms contain no tsquery operators
+        params = {"match": " | ".join(terms), "limit": limit}
+        conditions = [f"{PG_DOCUMENT_VECTOR.format(prefix='s.')} @@ to_tsquery('simple', :match)"]
+        rank = f"-ts_rank_cd({PG_WEIGHTED_VECTOR}, to_tsquery('simple', :match))"
+        source = "document_sections s"
+    else:
+        params = {
+            "match": build_match_query(query), "limit": limit,
+            "title_weight": TITLE_WEIGHT, "content_weight": CONTENT_WEIGHT
+        }
+        conditions = [f"{FTS_TABLE} MATCH :match"]
+        rank = f"bm25({FTS_TABLE}, :title_weight, :content_weight)"
+        source = f"{FTS_TABLE} JOIN document_sections s ON s.{FTS_ROWID} = {FTS_TABLE}.rowid"
+    conditions.append("d.processing_status = 'completed'")
+    bind_params = []
+    if unembedded_only:
+        conditions.append("s.embedding_blob IS NULL")
+    if document_ids is not None:
+        conditions.append("s.document_id IN :document_ids")
+        params["document_ids"] = list(document_ids)
+        bind_params.append(bindparam("document_ids", expanding=True))
+    if uploaded_after is not None:
+        conditions.append("d.upload_time >= :uploaded_after")
+        params["uploaded_after"] = uploaded_after
+        bind_params.append(bindparam("uploaded_after", type_=DateTime))
+    if uploaded_before is not None:
+        conditions.append("d.upload_time <= :uploaded_before")
+        params["uploaded_before"] = uploaded_before
+        bind_params.append(bindparam("uploaded_before", type_=DateTime))
+    if page_from is not None:
+        conditions.append("s.page_number >= :page_from")
+        params["page_from"] = page_from
+    if page_to is not None:
+        conditions.append("s.page_number <= :page_to")
+        params["page_to"] = page_to
+
+    statement = text(
+        f"SELECT s.id, {rank} AS rank "
+        f"FROM {source} "
+        "JOIN documents d ON d.id = s.document_id "
+        f"WHERE {' AND '.join(conditions)} "
+        "ORDER BY rank LIMIT :limit"
+    ).bindparams(*bind_params)
+    rows = db.execute(statement, params).fetchall()
+    return [(section_id, bm25_to_similarity(rank)) for section_id, rank in rows]
@@ -12,12 +12,17 @@ Core Features:
 API Endpoints:
 - POST /upload - Upload single or multiple PDFs
 - POST /batch-upload - Bulk upload multiple PDFs
-- GET /documents - List all documents in library
+- GET /documents - List documents in library (cursor pagination via ?limit=&cursor=)
 - GET /documents/{id} - Get specific document details
+- DELETE /documents/{id} - Remove a document and its sections from the library
 - GET /documents/{id}/pdf - Serve PDF file for Adobe Embed API
 - POST /connect-dots - Core feature: find relevant snippets across ALL docs
+- POST /connect-dots/batch - Run many connect-dots queries in one pass
 - POST /insights - Generate LLM-powered insights (Step 2)
+- POST /insights/stream - Same insights streamed token by token as Server-Sent Events
 - POST /audio-overview - Generate audio podcast/overview (Step 3)
+- GET /jobs - Ingestion job backlog and throughput
+- GET /health, GET /health/ready - Liveness, and readiness once the model and vector index have loaded
 """
 
 import os
@@ -25,36 +30,47 @@ import json
 import uuid
 import asyncio
 import time
-from typing import List, Optional, Dict, Any, Union
+import hashlib
+import heapq
+import base64
+import importlib.util
+import aiofiles
+from datetime import datetime, timezone
+from typing import List, Optional, Dict, Any, Union, Literal
 from pathlib import Path
 
 # FastAPI imports
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Query
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 
 # Database imports
-from sqlalchemy import create_engine, Column, String, Text, DateTime, Float, Integer
+from sqlalchemy import Column, String, Text, DateTime, Float, Integer, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.sql import func
 
 # ML imports for semantic search
+# sentence-transformers (and torch) are only imported by the background model loader
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
 try:
-    from sentence_transformers import SentenceTransformer
-    from sklearn.metrics.pairwise import cosine_similarity
     import numpy as np
-    ML_AVAILABLE = True
+    from storage import create_section_index
+    ML_AVAILABLE = importlib.util.find_spec("sentence_transformers") is not None or (
+        EMBEDDING_BACKEND == "onnx" and importlib.util.find_spec("onnxruntime") is not None
+    )
 except ImportError:
     ML_AVAILABLE = False
+if not ML_AVAILABLE:
     print("⚠️ ML libraries not available. Using fallback text matching.")
 
-# Import Adobe LLM/TTS modules
+# Import Adobe LLM/TTS modules (provider SDKs are imported on first use)
 try:
-    from chat_with_llm import get_llm_response
-    LLM_AVAILABLE = True
+    from chat_with_llm import aget_llm_response, astream_llm_response, get_response_cache
+    LLM_AVAILABLE = importlib.util.find_spec("langchain_core") is not None
 except ImportError:
     LLM_AVAILABLE = False
     print("⚠️ LLM module not available.")
@@ -68,6 +84,19 @@ except ImportError:
 
 # Import Challenge 1A processing
 from process_pdfs import process_single_pdf
+from db_engine import create_database_engine
+from db_migrations import add_missing_columns, create_missing_indexes
+from query_cache import LRUCache, embedding_cache_key, normalize_query_text
+from model_loader import BackgroundModel
+from embedding_batcher import EmbeddingMicrobatcher
+from keyword_index import ensure_keyword_index
+from document_store import DocumentStore
+from multipart_stream import MultipartError, MultipartStream, RequestBodyTooLarge
+from ingestion import IngestionScheduler, IngestionQueueFull, JobQueue
+from embedding_storage import (
+    encode_embedding, decode_embedding, get_storage_dtype,
+    ensure_embedding_columns, migrate_json_embeddings
+)
 
 def clean_script_for_tts(script: str) -> str:
     """
@@ -130,6 +159,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Mount static files for frontend
@@ -144,19 +174,68 @@ async def serve_frontend():
     return FileResponse("static/index.html")
 
 # Database setup
-DATABASE_URL = "sqlite:///./finale_documents.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# SQLite by default; set DATABASE_URL=postgresql+psycopg2://... to share one database across API nodes
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./finale_documents.db")
+engine = create_database_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-# Initialize semantic search model
-semantic_model = None
-if ML_AVAILABLE:
-    try:
-        semantic_model = SentenceTransformer('all-MiniLM-L6-v2')
-        print("✅ Semantic search model loaded successfully")
-    except Exception as e:
-        print(f"⚠️ Semantic search model loading failed: {e}")
+# Semantic search model, loaded in the background so the server starts serving immediately
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "true").lower() in ("1", "true", "yes")
+MODEL_LOAD_TIMEOUT = float(os.getenv("MODEL_LOAD_TIMEOUT", "300"))
+
+def load_semantic_model():
+    if EMBEDDING_BACKEND == "onnx":
+        try:
+            from onnx_embedder import load_onnx_embedder
+            model = load_onnx_embedder(EMBEDDING_MODEL)
+            model.encode(["warm up"])
+            print(f"✅ Using quantized ONNX embeddings ({model.model_dir}, threads={model.threads or 'all'})")
+            return model
+        except Exception as e:
+            print(f"⚠️ ONNX embedding backend unavailable, using sentence-transformers: {e}")
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(EMBEDDING_MODEL)
+    model.encode(["warm up"])  # First forward pass initializes kernels
+    return model
+
+semantic_model = BackgroundModel("Semantic search", load_semantic_model) if ML_AVAILABLE else None
+
+# Upload streaming and size limits
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_UPLOAD_FILE_BYTES = int(os.getenv("MAX_UPLOAD_FILE_MB", "100")) * 1024 * 1024
+MAX_UPLOAD_REQUEST_BYTES = int(os.getenv("MAX_UPLOAD_REQUEST_MB", "1024")) * 1024 * 1024
+
+# Number of texts per model forward pass during ingestion
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
+# Hybrid ranking: BM25 shortlist size and reciprocal-rank-fusion constant
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "200"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+
+# Maximum queries per /connect-dots/batch request
+CONNECT_DOTS_MAX_BATCH = int(os.getenv("CONNECT_DOTS_MAX_BATCH", "500"))
+
+# Concurrent /connect-dots query encodes are coalesced into batches of up to this size
+EMBEDDING_MICROBATCH_SIZE = int(os.getenv("EMBEDDING_MICROBATCH_SIZE", "32"))
+EMBEDDING_MICROBATCH_WAIT_MS = float(os.getenv("EMBEDDING_MICROBATCH_WAIT_MS", "5"))
+
+# Query embedding and ranked result caches for /connect-dots
+embedding_cache = LRUCache(
+    "query_embeddings",
+    max_entries=int(os.getenv("QUERY_CACHE_ENTRIES", "2048")),
+    max_bytes=int(os.getenv("QUERY_CACHE_MB", "16")) * 1024 * 1024
+)
+result_cache = LRUCache(
+    "connect_dots_results",
+    max_entries=int(os.getenv("RESULT_CACHE_ENTRIES", "1024")),
+    max_bytes=int(os.getenv("RESULT_CACHE_MB", "32")) * 1024 * 1024
+)
+library_generation = 0  # Bumped whenever documents finish processing or are removed
+
+# Vector index file for the in-process (SQLite) backend, see storage.py
+VECTOR_INDEX_PATH = Path(os.getenv("VECTOR_INDEX_PATH", "./finale_documents.index.npz"))
 
 # Database Models
 class Document(Base):
@@ -166,28 +245,60 @@ class Document(Base):
     filename = Column(String, nullable=False)
     original_filename = Column(String, nullable=False)
     file_path = Column(String, nullable=False)
-    upload_time = Column(DateTime, default=func.now())
+    upload_time = Column(DateTime, default=func.now(), index=True)
     title = Column(String)
     outline = Column(Text)  # JSON string of outline structure
     total_sections = Column(Integer, default=0)
     file_size = Column(Integer)
-    processing_status = Column(String, default="pending")  # pending, processing, completed, failed
+    processing_status = Column(String, default="pending", index=True)  # pending, processing, completed, failed
+    content_hash = Column(String, index=True)  # SHA-256 of the PDF bytes, used for deduplication
 
 class DocumentSection(Base):
     __tablename__ = "document_sections"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    document_id = Column(String, nullable=False)
+    document_id = Column(String, nullable=False, index=True)
     section_title = Column(String, nullable=False)
     section_content = Column(Text, nullable=False)
     section_number = Column(Integer)
     page_number = Column(Integer)
-    embedding = Column(Text)  # JSON string of vector embedding
+    embedding = Column(Text)  # Legacy JSON string of vector embedding (migrated to embedding_blob)
+    embedding_blob = Column(LargeBinary)  # Binary vector embedding, see embedding_storage.py
+    embedding_dtype = Column(String)  # float32, float16 or int8
     snippet = Column(Text)  # 2-4 sentence extract
+    search_rowid = Column(Integer, index=True, unique=True)  # Stable FTS5 rowid, see keyword_index.py
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    document_id = Column(String, nullable=False, index=True)
+    file_path = Column(String, nullable=False)
+    state = Column(String, default="queued", index=True)  # queued, running, completed, failed
+    attempts = Column(Integer, default=0)
+    lease_owner = Column(String)  # Claim token of the worker holding the job
+    lease_expires_at = Column(Float)  # Unix timestamps below
+    last_error = Column(Text)
+    created_at = Column(Float)
+    started_at = Column(Float)
+    finished_at = Column(Float)
     
 # Create tables
 Base.metadata.create_all(bind=engine)
 
+# Upgrade existing databases to binary embedding storage
+ensure_embedding_columns(engine)
+migrate_json_embeddings(engine)
+add_missing_columns(engine, "documents", {"content_hash": "VARCHAR"})
+add_missing_columns(engine, "document_sections", {"search_rowid": "INTEGER"})
+create_missing_indexes(engine, Base.metadata)
+KEYWORD_INDEX_AVAILABLE = ensure_keyword_index(engine)
+document_store = DocumentStore(SessionLocal, Document, DocumentSection)
+document_store.prepare()
+
+# Section vector index for /connect-dots: pgvector on PostgreSQL, resident (VECTOR_INDEX_MODE) otherwise
+section_index = create_section_index(engine) if ML_AVAILABLE else None
+
 # Pydantic models for API
 class DocumentInfo(BaseModel):
     id: str
@@ -214,22 +325,43 @@ class ConnectDotsRequest(BaseModel):
     selected_text: str
     context: Optional[str] = None  # Additional context around selection
     max_results: int = Field(default=5, le=10)
+    exact: bool = False  # Bypass the ANN index, e.g. to validate its recall
+    mode: Literal["semantic", "hybrid"] = "semantic"  # hybrid: BM25 shortlist re-ranked with embeddings
+    fusion: Literal["rrf", "weighted"] = "rrf"  # How hybrid mode combines the two rankings
+    semantic_weight: float = Field(default=0.5, ge=0.0, le=1.0)  # Weighted fusion only
+    # Restrict the search before scoring
+    document_ids: Optional[List[str]] = None
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+    page_from: Optional[int] = None
+    page_to: Optional[int] = None
 
 class ConnectDotsResponse(BaseModel):
     query: str
     results: List[SectionSnippet]
     processing_time: float
 
+class BatchConnectDotsRequest(BaseModel):
+    queries: List[ConnectDotsRequest] = Field(min_length=1, max_length=CONNECT_DOTS_MAX_BATCH)
+
+class BatchConnectDotsResponse(BaseModel):
+    results: List[ConnectDotsResponse]  # Same order as the request; processing_time is per query
+    encode_time: float  # Shared query embedding call
+    search_time: float  # Shared vector index search
+    processing_time: float
+
 class InsightRequest(BaseModel):
     selected_text: str
     related_sections: List[str]  # Section IDs from connect-dots results
     insight_type: str = "comprehensive"  # comprehensive, contradictions, examples, takeaways
+    bypass_cache: bool = False  # Regenerate instead of reusing a cached LLM response
 
 class AudioRequest(BaseModel):
     text_content: str
     related_sections: List[str]
     audio_type: str = "overview"  # overview, podcast
     voice: Optional[str] = None
+    bypass_cache: bool = False  # Regenerate the script instead of reusing a cached LLM response
 
 # Helper functions
 def get_db():
@@ -239,26 +371,98 @@ def get_db():
     finally:
         db.close()
 
-def create_embedding(text: str) -> Optional[List[float]]:
-    """Create embedding for semantic search"""
-    if not semantic_model or not text.strip():
-        return None
+def create_embeddings(texts: List[str], wait_for_model: bool = False) -> List[Optional["np.ndarray"]]:
+    """
+    Create embeddings for many texts, encoding in batches of EMBEDDING_BATCH_SIZE.
+
+    While the model is still loading, queries get no embeddings (and fall
+    back to keyword matching); ingestion passes `wait_for_model` so no
+    section is stored without one.
+    """
+    embeddings: List[Optional["np.ndarray"]] = [None] * len(texts)
+    model = semantic_model.get(MODEL_LOAD_TIMEOUT if wait_for_model else 0) if semantic_model else None
+    if model is None:
+        return embeddings
+    positions = [i for i, text in enumerate(texts) if text.strip()]
+    if not positions:
+        return embeddings
     try:
-        embedding = semantic_model.encode([text])[0]
-        return embedding.tolist()
+        vectors = model.encode(
+            [texts[i] for i in positions],
+            batch_size=EMBEDDING_BATCH_SIZE
+        )
+        for position, vector in zip(positions, vectors):
+            embeddings[position] = vector
     except Exception as e:
-        print(f"Embedding creation failed: {e}")
-        return None
+        print(f"Batch embedding creation failed: {e}")
+    return embeddings
+
+query_embedder = EmbeddingMicrobatcher(
+    create_embeddings,
+    max_batch_size=EMBEDDING_MICROBATCH_SIZE,
+    max_wait_ms=EMBEDDING_MICROBATCH_WAIT_MS
+)
+
+async def get_query_embedding(query_text: str) -> Optional["np.ndarray"]:
+    """Embedding for a search query: from the cache, else encoded together with concurrent queries"""
+    key = embedding_cache_key(EMBEDDING_MODEL, query_text)
+    embedding = embedding_cache.get(key)
+    if embedding is None:
+        embedding = await query_embedder.embed(query_text)
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32)
+            embedding_cache.put(key, embedding)
+    return embedding
+
+async def get_query_embeddings(query_texts: List[str]) -> List[Optional["np.ndarray"]]:
+    """Cached query embeddings; all misses are encoded in one batched model call off the event loop"""
+    keys = [embedding_cache_key(EMBEDDING_MODEL, text) for text in query_texts]
+    embeddings = [embedding_cache.get(key) for key in keys]
+    misses = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if misses:
+        encoded = await run_in_threadpool(create_embeddings, [query_texts[i] for i in misses])
+        for i, embedding in zip(misses, encoded):
+            if embedding is not None:
+                embedding = np.asarray(embedding, dtype=np.float32)
+                embedding_cache.put(keys[i], embedding)
+            embeddings[i] = embedding
+    return embeddings
+
+def result_cache_key(request: "ConnectDotsRequest") -> tuple:
+    """Result cache key: the normalized query, its options and the current library generation"""
+    return (
+        normalize_query_text(request.selected_text),
+        normalize_query_text(request.context),
+        request.max_results,
+        request.exact,
+        request.mode,
+        request.fusion,
+        request.semantic_weight,
+        tuple(request.document_ids) if request.document_ids is not None else None,
+        request.uploaded_after,
+        request.uploaded_before,
+        request.page_from,
+        request.page_to,
+        library_generation,
+        document_store.generation,
+        section_index.generation if section_index is not None else 0
+    )
+
+def invalidate_search_cache():
+    """Drop cached rankings once the searchable library changes"""
+    global library_generation
+    library_generation += 1
+    result_cache.clear()
 
 def calculate_similarity(query_embedding: List[float], section_embedding: List[float]) -> float:
     """Calculate cosine similarity between embeddings"""
     if not ML_AVAILABLE:
         return 0.0
     try:
-        query_vec = np.array(query_embedding).reshape(1, -1)
-        section_vec = np.array(section_embedding).reshape(1, -1)
-        similarity = cosine_similarity(query_vec, section_vec)[0][0]
-        return float(similarity)
+        query_vec = np.asarray(query_embedding, dtype=np.float32).ravel()
+        section_vec = np.asarray(section_embedding, dtype=np.float32).ravel()
+        norms = np.linalg.norm(query_vec) * np.linalg.norm(section_vec)
+        return float(np.dot(query_vec, section_vec) / norms) if norms else 0.0
     except Exception:
         return 0.0
 
@@ -287,75 +491,249 @@ def extract_snippet(section_content: str, max_sentences: int = 3) -> str:
     snippet = ' '.join(sentences[:max_sentences])
     return snippet.strip()
 
-async def process_document_async(document_id: str, file_path: str):
-    """Process document asynchronously with Challenge 1A logic"""
-    db = SessionLocal()
+class UploadTooLarge(Exception):
+    """Raised when a streamed upload exceeds its size limit"""
+
+async def save_upload_streaming(form: MultipartStream, filename: str, destination: Path, max_bytes: int) -> tuple:
+    """
+    Stream the current file part of an upload request to disk as it arrives.
+
+    Returns (size_in_bytes, sha256_hexdigest). Aborts as soon as max_bytes is
+    exceeded, removing the partial file.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(destination, "wb") as buffer:
+            while True:
+                chunk = await form.read()
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"{filename} exceeds {max_bytes} bytes")
+                hasher.update(chunk)
+                await buffer.write(chunk)
+    except BaseException:
+        destination.unlink(missing_ok=True)
+        raise
+    return size, hasher.hexdigest()
+
+def load_section_index():
+    """Restore the persisted vector index and reconcile it with the database, or rebuild it"""
+    if section_index is None:
+        return
+    try:
+        restored = False
+        try:
+            restored = section_index.restore(VECTOR_INDEX_PATH)
+        except Exception as e:
+            print(f"⚠️ Persisted vector index unreadable, rebuilding: {e}")
+
+        if restored:
+            # Catch up with sections written or deleted since the index was saved
+            expected = dict(document_store.indexed_sections())
+            indexed = set(section_index.section_ids())
+            stale = indexed - expected.keys()
+            missing = [section_id for section_id in expected if section_id not in indexed]
+            if stale:
+                section_index.remove_sections(stale)
+            rows = document_store.section_embeddings(missing) if missing else []
+            added = section_index.add(
+                [row[0] for row in rows], [row[1] for row in rows],
+                [decode_embedding(blob, dtype) for _, _, blob, dtype in rows]
+            ) if rows else 0
+            print(f"✅ Vector index restored with {len(section_index)} section embeddings "
+                  f"({added} added, {len(stale)} removed)")
+            return
+
+        loaded = section_index.load(
+            (section_id, document_id, decode_embedding(blob, dtype))
+            for section_id, document_id, blob, dtype in document_store.section_embeddings()
+        )
+        print(f"✅ Vector index loaded with {loaded} section embeddings")
+    except Exception as e:
+        print(f"⚠️ Vector index loading failed: {e}")
+
+def save_section_index():
+    """Persist the vector index so the next startup skips rebuilding it"""
+    if section_index is None:
+        return
+    try:
+        section_index.save(VECTOR_INDEX_PATH)
+        print(f"✅ Vector index saved to {VECTOR_INDEX_PATH}")
+    except Exception as e:
+        print(f"⚠️ Vector index save failed: {e}")
+
+# Startup steps that read the database or stored files run as background tasks, so the
+# server answers /health immediately; /health/ready reports their state
+startup_tasks: Dict[str, asyncio.Task] = {}
+startup_states: Dict[str, str] = {}
+
+def start_background_task(name: str, step):
+    """Run a startup coroutine in the background and track whether it finished"""
+    async def run():
+        startup_states[name] = "running"
+        try:
+            await step()
+            startup_states[name] = "done"
+        except asyncio.CancelledError:
+            startup_states[name] = "cancelled"
+            raise
+        except Exception as e:
+            startup_states[name] = "failed"
+            print(f"⚠️ Startup task {name} failed: {e}")
+    startup_tasks[name] = asyncio.create_task(run())
+    return startup_tasks[name]
+
+async def stop_background_tasks():
+    pending = [task for task in startup_tasks.values() if not task.done()]
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+@app.on_event("startup")
+async def startup_event():
+    if semantic_model is not None:
+        # Rankings cached during warm-up used keyword matching only
+        semantic_model.on_ready(invalidate_search_cache)
+        if MODEL_PRELOAD:
+            semantic_model.start()
+    await query_embedder.start()
+    start_background_task("section_index", lambda: run_in_threadpool(load_section_index))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await query_embedder.stop()
+    await stop_background_tasks()
+    # A partially loaded index would overwrite the complete one saved last time
+    if startup_states.get("section_index") == "done":
+        save_section_index()
+
+def backfill_content_hashes():
+    """Hash stored PDFs of documents created before deduplication existed"""
+    hashes = {}
+    for document_id, file_path in document_store.without_content_hash():
+        file_path = Path(file_path)
+        if not file_path.exists():
+            continue
+        hasher = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+                hasher.update(chunk)
+        hashes[document_id] = hasher.hexdigest()
+    document_store.set_content_hashes(hashes)
+    if hashes:
+        print(f"✅ Computed content hashes for {len(hashes)} existing documents")
+
+def index_document_sections(document_id: str, indexed_ids: List[str], indexed_vectors: list):
+    """Make a document's new sections searchable without reloading the whole index"""
+    if section_index is None:
+        return
+    section_index.remove_document(document_id)
+    if indexed_ids:
+        section_index.add(indexed_ids, [document_id] * len(indexed_ids), indexed_vectors)
+
+def clone_duplicate_document(source_id: str, document_id: str, lease=None):
+    """Copy a processed duplicate's title, outline and sections, and index the copies"""
+    embedded = document_store.clone_processed(source_id, document_id, lambda: str(uuid.uuid4()), lease=lease)
+    index_document_sections(
+        document_id, [section_id for section_id, _, _ in embedded],
+        [decode_embedding(blob, dtype) for _, blob, dtype in embedded]
+    )
+
+def store_processed_document(document_id: str, title: str, outline_json: str, section_rows: List[Dict[str, Any]],
+                             indexed_ids: List[str], indexed_vectors: list, lease=None):
+    """Save title, outline and all sections in one transaction, then index the new sections"""
+    document_store.save_processed(document_id, title, outline_json, section_rows, lease=lease)
+    index_document_sections(document_id, indexed_ids, indexed_vectors)
+
+async def process_document_async(document_id: str, file_path: str, lease=None):
+    """
+    Process document with Challenge 1A logic.
+
+    Parsing and embedding run in the ingestion pools; database writes and
+    vector index updates run in the threadpool, so the event loop keeps
+    serving requests throughout. Every document write confirms the job's
+    lease in its transaction (see ingestion.Lease).
+    """
     try:
         # Update status to processing
-        document = db.query(Document).filter(Document.id == document_id).first()
+        document = await run_in_threadpool(document_store.set_status, document_id, "processing", lease)
         if document:
-            document.processing_status = "processing"
-            db.commit()
             print(f"Starting processing for document: {document.original_filename}")
+
+        # Reuse an identical, already processed upload instead of parsing it again
+        source = await run_in_threadpool(document_store.find_processed_duplicate, document)
+        if source:
+            await run_in_threadpool(clone_duplicate_document, source.id, document_id, lease)
+            invalidate_search_cache()
+            print(f"✅ Document {document_id} reused processed duplicate {source.id}")
+            return
         
         # Process with Challenge 1A logic
         print(f"Processing PDF file: {file_path}")
-        result = process_single_pdf(Path(file_path))
+        result = await ingestion_scheduler.run_parse(process_single_pdf, Path(file_path), True, PARSE_PAGE_WORKERS)
         print(f"Processing result: {result}")
+
+        if not (result and result.get("success") and result.get("title")):
+            print(f"❌ PDF processing failed - no title returned from process_single_pdf")
+            print(f"❌ Result was: {result}")
+            await run_in_threadpool(document_store.set_status, document_id, "failed", lease)
+            invalidate_search_cache()
+            return
+
+        print(f"PDF processed successfully, title: {result.get('title')}")
+        outline_data = result.get("outline", [])
         
-        if result and result.get("success") and result.get("title"):
-            print(f"PDF processed successfully, title: {result.get('title')}")
-            # Update document with title and outline
-            document.title = result.get("title", "Untitled Document")
-            outline_data = result.get("outline", [])
-            document.outline = json.dumps(outline_data)
-            
-            # Convert outline to sections for semantic search
+        # Section passages (body text between outline entries) for semantic search
+        sections = result.get("sections")
+        if sections is None:
+            # Body extraction unavailable: fall back to headings only
             sections = []
             if isinstance(outline_data, list):
                 for item in outline_data:
                     if isinstance(item, dict):
                         sections.append({
                             "title": item.get("text", ""),
-                            "content": item.get("text", ""),  # Use text as content for now
+                            "content": item.get("text", ""),
                             "page": item.get("page", 0)
                         })
-            
-            document.total_sections = len(sections)
-            print(f"Created {len(sections)} sections from outline")
-            
-            # Process sections and create embeddings
-            for i, section in enumerate(sections):
-                section_title = section.get("title", f"Section {i+1}")
-                section_content = section.get("content", "")
-                page_number = section.get("page", None)
-                
-                # Create embedding for semantic search
-                full_text = f"{section_title} {section_content}"
-                embedding = create_embedding(full_text)
-                
-                # Extract snippet
-                snippet = extract_snippet(section_content)
-                
-                # Save section to database
-                db_section = DocumentSection(
-                    document_id=document_id,
-                    section_title=section_title,
-                    section_content=section_content,
-                    section_number=i + 1,
-                    page_number=page_number,
-                    embedding=json.dumps(embedding) if embedding else None,
-                    snippet=snippet
-                )
-                db.add(db_section)
-            
-            document.processing_status = "completed"
-        else:
-            print(f"❌ PDF processing failed - no title returned from process_single_pdf")
-            print(f"❌ Result was: {result}")
-            document.processing_status = "failed"
+        print(f"Created {len(sections)} section passages from outline")
         
-        db.commit()
+        # Create all section embeddings with batched model calls
+        section_titles = [section.get("title", f"Section {i+1}") for i, section in enumerate(sections)]
+        embeddings = await ingestion_scheduler.run_embed(create_embeddings, [
+            f"{title} {section.get('content', '')}"
+            for title, section in zip(section_titles, sections)
+        ], True)
+
+        storage_dtype = get_storage_dtype()
+        section_rows, indexed_ids, indexed_vectors = [], [], []
+        for i, section in enumerate(sections):
+            section_content = section.get("content", "")
+            embedding = embeddings[i]
+            section_id = str(uuid.uuid4())
+            if embedding is not None:
+                indexed_ids.append(section_id)
+                indexed_vectors.append(embedding)
+            section_rows.append({
+                "id": section_id,
+                "document_id": document_id,
+                "section_title": section_titles[i],
+                "section_content": section_content,
+                "section_number": i + 1,
+                "page_number": section.get("page", None),
+                "embedding_blob": encode_embedding(embedding, storage_dtype) if embedding is not None else None,
+                "embedding_dtype": storage_dtype if embedding is not None else None,
+                "snippet": extract_snippet(section_content)
+            })
+
+        await run_in_threadpool(
+            store_processed_document, document_id, result.get("title", "Untitled Document"),
+            json.dumps(outline_data), section_rows, indexed_ids, indexed_vectors, lease
+        )
+        invalidate_search_cache()
         print(f"✅ Document {document_id} processed successfully")
         
     except Exception as e:
@@ -363,41 +741,163 @@ async def process_document_async(document_id: str, file_path: str):
         print(f"❌ Exception type: {type(e).__name__}")
         import traceback
         print(f"❌ Traceback: {traceback.format_exc()}")
-        if document:
-            document.processing_status = "failed"
-            db.commit()
-    finally:
-        db.close()
+        # The document stays "processing" while the job queue retries; the queue
+        # marks it failed once attempts are exhausted
+        raise
+
+# Durable, bounded ingestion queue; PDF parsing and embedding run off the event loop
+ingestion_jobs = JobQueue(SessionLocal, IngestionJob, document_model=Document)
+ingestion_scheduler = IngestionScheduler(process_document_async, ingestion_jobs)
+# Parse processes extract pages themselves: a page pool inside each would multiply the process count
+PARSE_PAGE_WORKERS = 1 if ingestion_scheduler.parse_workers > 0 else None
+
+def recover_unfinished_documents():
+    """Queue jobs for documents left pending/processing without an open job (e.g. pre-queue uploads)"""
+    recovered = 0
+    for document_id, file_path in document_store.unfinished():
+        if not ingestion_jobs.has_open_job(document_id):
+            ingestion_jobs.enqueue(document_id, file_path)
+            recovered += 1
+    if recovered:
+        print(f"♻️ Re-queued {recovered} unfinished documents")
+
+async def start_ingestion_after_index_load():
+    # Workers add finished documents to the vector index, so they wait until it is loaded
+    section_index_task = startup_tasks.get("section_index")
+    if section_index_task is not None:
+        await asyncio.wait([section_index_task])
+    await run_in_threadpool(recover_unfinished_documents)
+    await ingestion_scheduler.start()
+
+@app.on_event("startup")
+async def start_ingestion_scheduler():
+    start_background_task("content_hashes", lambda: run_in_threadpool(backfill_content_hashes))
+    start_background_task("ingestion_scheduler", start_ingestion_after_index_load)
+
+@app.on_event("shutdown")
+async def stop_ingestion_scheduler():
+    await ingestion_scheduler.stop()
 
 # API Endpoints
 
+def readiness() -> Dict[str, Any]:
+    """Ready once the semantic model has settled and the vector index has been loaded"""
+    index_loaded = startup_states.get("section_index") in ("done", "failed")
+    if semantic_model is None:
+        model_settled, model_stats = True, {"state": "disabled"}
+    else:
+        model_settled, model_stats = semantic_model.settled, semantic_model.stats()
+    return {"ready": model_settled and index_loaded, "semantic_model": model_stats, "startup": dict(startup_states)}
+
+def llm_response_cache_stats() -> Optional[Dict[str, Any]]:
+    if not LLM_AVAILABLE:
+        return None
+    cache = get_response_cache()
+    return cache.stats() if cache is not None else None
+
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Liveness: answers as soon as the server is up; `ready` reports whether the model has loaded"""
+    status = readiness()
     return {
         "status": "healthy",
+        "ready": status["ready"],
         "service": "adobe-finale-connecting-dots",
         "version": "1.0.0",
+        "readiness": status,
         "features": {
             "challenge_1a_integrated": True,
             "challenge_1b_integrated": True,
-            "semantic_search": semantic_model is not None,
+            "semantic_search": semantic_model is not None and semantic_model.ready,
             "llm_integration": LLM_AVAILABLE,
             "tts_integration": TTS_AVAILABLE,
             "batch_upload": True
+        },
+        "query_embedding_batches": query_embedder.stats(),
+        "caches": {
+            "query_embeddings": embedding_cache.stats(),
+            "connect_dots_results": result_cache.stats()
         }
     }
 
-@app.post("/upload")
-async def upload_document(files: List[UploadFile] = File(...)):
-    """Upload single or multiple PDF documents"""
+def storage_stats() -> Dict[str, Any]:
+    """Vector index and LLM response cache figures; may query the database"""
+    return {
+        "vector_index": section_index.stats() if section_index is not None else None,
+        "llm_responses": llm_response_cache_stats()
+    }
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: 503 while the semantic model or the vector index is still loading"""
+    status = readiness()
+    status.update(await run_in_threadpool(storage_stats))
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@app.get("/jobs")
+async def list_jobs(
+    state: Optional[str] = Query(None, description="Filter by job state"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    """Ingestion job backlog, scheduler throughput and recent jobs"""
+    return {
+        "summary": ingestion_jobs.stats(),
+        "scheduler": ingestion_scheduler.stats(),
+        "jobs": ingestion_jobs.recent(limit=limit, state=state)
+    }
+
+# Multipart body of /upload and /batch-upload for the OpenAPI docs; the body is parsed by hand
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+            "required": ["files"]
+        }}}
+    }
+}
+
+def upload_request_limit_error() -> str:
+    return f"Upload request exceeds {MAX_UPLOAD_REQUEST_BYTES // (1024 * 1024)} MB limit"
+
+@app.post("/upload", openapi_extra=UPLOAD_OPENAPI)
+async def upload_document(request: Request):
+    """
+    Upload single or multiple PDF documents.
+
+    The multipart body is read incrementally and each file is streamed to
+    disk as it arrives; a request declaring more than MAX_UPLOAD_REQUEST_MB
+    is refused before any of it is read, and reading stops once the body
+    passes that limit.
+    """
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > MAX_UPLOAD_REQUEST_BYTES:
+        raise HTTPException(status_code=413, detail=upload_request_limit_error())
+    try:
+        form = MultipartStream(request, MAX_UPLOAD_REQUEST_BYTES)
+    except MultipartError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     results = []
+    total_files = 0
     
-    for file in files:
+    while True:
+        try:
+            part = await form.next_file()
+        except RequestBodyTooLarge:
+            results.append({"filename": None, "success": False, "error": upload_request_limit_error()})
+            break
+        except MultipartError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if part is None:
+            break
+        _, filename = part
+        total_files += 1
         try:
-            if not file.filename.lower().endswith('.pdf'):
+            if not filename.lower().endswith('.pdf'):
                 results.append({
-                    "filename": file.filename,
+                    "filename": filename,
                     "success": False,
                     "error": "Only PDF files are allowed"
                 })
@@ -409,162 +909,238 @@ async def upload_document(files: List[UploadFile] = File(...)):
             
             # Generate unique filename
             document_id = str(uuid.uuid4())
-            file_extension = Path(file.filename).suffix
+            file_extension = Path(filename).suffix
             unique_filename = f"{document_id}{file_extension}"
             file_path = uploads_dir / unique_filename
             
-            # Save file
-            with open(file_path, "wb") as buffer:
-                content = await file.read()
-                buffer.write(content)
+            # Stream file to disk as it arrives, sizing and hashing it in the same pass
+            try:
+                file_size, content_hash = await save_upload_streaming(
+                    form, filename, file_path, MAX_UPLOAD_FILE_BYTES
+                )
+            except UploadTooLarge:
+                results.append({
+                    "filename": filename,
+                    "success": False,
+                    "error": f"File exceeds {MAX_UPLOAD_FILE_BYTES // (1024 * 1024)} MB limit"
+                })
+                continue
+            except RequestBodyTooLarge:
+                results.append({
+                    "filename": filename,
+                    "success": False,
+                    "error": upload_request_limit_error()
+                })
+                break
             
+            # Point duplicates at the existing copy of the file
+            existing = document_store.find_by_content_hash(content_hash)
+            reused_file = bool(existing and Path(existing.file_path).exists())
+            if reused_file:
+                file_path.unlink(missing_ok=True)
+                unique_filename = existing.filename
+                file_path = Path(existing.file_path)
+
             # Create database record
-            db = SessionLocal()
+            document_store.add(
+                id=document_id,
+                filename=unique_filename,
+                original_filename=filename,
+                file_path=str(file_path),
+                file_size=file_size,
+                content_hash=content_hash,
+                processing_status="pending"
+            )
+            
+            # Queue for background processing (waits for space when the queue is full)
             try:
-                document = Document(
-                    id=document_id,
-                    filename=unique_filename,
-                    original_filename=file.filename,
-                    file_path=str(file_path),
-                    file_size=len(content),
-                    processing_status="pending"
-                )
-                db.add(document)
-                db.commit()
-                
-                # Start async processing
-                asyncio.create_task(process_document_async(document_id, str(file_path)))
-                
+                await ingestion_scheduler.submit(document_id, str(file_path))
+            except IngestionQueueFull as e:
+                document_store.remove(document_id)
+                if not reused_file:
+                    file_path.unlink(missing_ok=True)
                 results.append({
-                    "filename": file.filename,
-                    "document_id": document_id,
-                    "success": True,
-                    "status": "pending"
+                    "filename": filename,
+                    "success": False,
+                    "error": str(e)
                 })
-            finally:
-                db.close()
+                continue
+            
+            results.append({
+                "filename": filename,
+                "document_id": document_id,
+                "success": True,
+                "status": "pending",
+                "file_size": file_size,
+                "sha256": content_hash,
+                "duplicate_of": existing.id if reused_file else None
+            })
                 
+        except MultipartError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
             results.append({
-                "filename": file.filename,
+                "filename": filename,
                 "success": False,
                 "error": str(e)
             })
     
+    if total_files == 0 and not results:
+        raise HTTPException(status_code=422, detail="No files uploaded")
     successful_uploads = len([r for r in results if r.get('success')])
     
     return {
-        "total_files": len(files),
+        "total_files": total_files,
         "successful_uploads": successful_uploads,
         "results": results,
         "message": f"Upload completed. {successful_uploads} files uploaded successfully."
     }
 
-@app.post("/batch-upload")
-async def batch_upload_documents(files: List[UploadFile] = File(...)):
+@app.post("/batch-upload", openapi_extra=UPLOAD_OPENAPI)
+async def batch_upload_documents(request: Request):
     """Dedicated bulk upload endpoint for multiple PDFs"""
-    return await upload_document(files)
+    return await upload_document(request)
 
-@app.get("/documents")
-async def list_documents():
-    """List all documents in the library"""
-    db = SessionLocal()
+def encode_documents_cursor(document: Document) -> str:
+    """Opaque keyset cursor pointing just past `document` in upload-time order"""
+    payload = json.dumps([str(document.upload_time), document.id])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_documents_cursor(cursor: str) -> tuple:
     try:
-        documents = db.query(Document).order_by(Document.upload_time.desc()).all()
-        
-        result = []
-        for doc in documents:
+        upload_time, document_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        datetime.fromisoformat(upload_time)
+        return str(upload_time), str(document_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@app.get("/documents")
+async def list_documents(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; omit to list the whole library"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    include_outline: bool = Query(True, description="Include each document's outline")
+):
+    """List documents in the library, newest first; pages continue via the X-Next-Cursor header"""
+    # Keyset pagination on (upload_time, id)
+    after = decode_documents_cursor(cursor) if cursor else None
+    documents = document_store.list_documents(
+        limit=limit + 1 if limit else None, after=after, include_outline=include_outline
+    )
+    if limit and len(documents) > limit:
+        documents = documents[:limit]
+        response.headers["X-Next-Cursor"] = encode_documents_cursor(documents[-1])
+    
+    result = []
+    for doc in documents:
+        outline = None
+        if include_outline:
             outline = []
             try:
                 if doc.outline:
                     outline = json.loads(doc.outline)
             except:
                 outline = []
-                
-            result.append(DocumentInfo(
-                id=doc.id,
-                filename=doc.filename,
-                original_filename=doc.original_filename,
-                upload_time=doc.upload_time.isoformat(),
-                title=doc.title,
-                outline=outline,
-                total_sections=doc.total_sections,
-                file_size=doc.file_size,
-                processing_status=doc.processing_status
-            ))
-        
-        return result
-    finally:
-        db.close()
+            
+        result.append(DocumentInfo(
+            id=doc.id,
+            filename=doc.filename,
+            original_filename=doc.original_filename,
+            upload_time=doc.upload_time.isoformat(),
+            title=doc.title,
+            outline=outline,
+            total_sections=doc.total_sections,
+            file_size=doc.file_size,
+            processing_status=doc.processing_status
+        ))
+    
+    return result
 
 @app.get("/documents/{document_id}")
 async def get_document_details(document_id: str):
     """Get detailed information about a specific document"""
-    db = SessionLocal()
+    document = document_store.get(document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    # Get sections
+    sections = document_store.sections(document_id)
+    
+    outline = []
     try:
-        document = db.query(Document).filter(Document.id == document_id).first()
-        if not document:
-            raise HTTPException(status_code=404, detail="Document not found")
-        
-        # Get sections
-        sections = db.query(DocumentSection).filter(
-            DocumentSection.document_id == document_id
-        ).order_by(DocumentSection.section_number).all()
-        
+        if document.outline:
+            outline = json.loads(document.outline)
+    except:
         outline = []
-        try:
-            if document.outline:
-                outline = json.loads(document.outline)
-        except:
-            outline = []
-        
-        return {
-            "document": DocumentInfo(
-                id=document.id,
-                filename=document.filename,
-                original_filename=document.original_filename,
-                upload_time=document.upload_time.isoformat(),
-                title=document.title,
-                outline=outline,
-                total_sections=document.total_sections,
-                file_size=document.file_size,
-                processing_status=document.processing_status
-            ),
-            "sections": [
-                {
-                    "id": section.id,
-                    "title": section.section_title,
-                    "content": section.section_content,
-                    "section_number": section.section_number,
-                    "page_number": section.page_number,
-                    "snippet": section.snippet
-                }
-                for section in sections
-            ]
-        }
-    finally:
-        db.close()
+    
+    return {
+        "document": DocumentInfo(
+            id=document.id,
+            filename=document.filename,
+            original_filename=document.original_filename,
+            upload_time=document.upload_time.isoformat(),
+            title=document.title,
+            outline=outline,
+            total_sections=document.total_sections,
+            file_size=document.file_size,
+            processing_status=document.processing_status
+        ),
+        "sections": [
+            {
+                "id": section.id,
+                "title": section.section_title,
+                "content": section.section_content,
+                "section_number": section.section_number,
+                "page_number": section.page_number,
+                "snippet": section.snippet
+            }
+            for section in sections
+        ]
+    }
+
+@app.delete("/documents/{document_id}")
+async def delete_document(document_id: str):
+    """Remove a document, its sections and its vector index entries"""
+    if document_store.get(document_id) is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if ingestion_jobs.has_open_job(document_id):
+        raise HTTPException(status_code=409, detail="Document is still being processed")
+
+    removed = document_store.remove(document_id)
+    if removed is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    removed_sections, file_path, file_shared = removed
+
+    removed_vectors = section_index.remove_document(document_id) if section_index is not None else 0
+    invalidate_search_cache()
+
+    # Deduplicated uploads share one file on disk
+    if not file_shared:
+        Path(file_path).unlink(missing_ok=True)
+
+    return {
+        "success": True,
+        "document_id": document_id,
+        "sections_removed": removed_sections,
+        "vectors_removed": removed_vectors
+    }
 
 @app.get("/documents/{document_id}/pdf")
 async def serve_pdf(document_id: str):
     """Serve PDF file for Adobe Embed API"""
-    db = SessionLocal()
-    try:
-        document = db.query(Document).filter(Document.id == document_id).first()
-        if not document:
-            raise HTTPException(status_code=404, detail="Document not found")
-        
-        file_path = Path(document.file_path)
-        if not file_path.exists():
-            raise HTTPException(status_code=404, detail="PDF file not found")
-        
-        return FileResponse(
-            file_path,
-            media_type="application/pdf",
-            filename=document.original_filename
-        )
-    finally:
-        db.close()
+    document = document_store.get(document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    file_path = Path(document.file_path)
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="PDF file not found")
+    
+    return FileResponse(
+        file_path,
+        media_type="application/pdf",
+        filename=document.original_filename
+    )
         
 @app.get("/pdf-embed-api")
 async def get_pdf_embed_api_from_env():
@@ -572,6 +1148,189 @@ async def get_pdf_embed_api_from_env():
     
     return {"api_key": api_key}
 
+def search_filters(request: ConnectDotsRequest) -> Dict[str, Any]:
+    """The request's document/upload-time/page restrictions, upload times as naive UTC"""
+    filters: Dict[str, Any] = {}
+    if request.document_ids is not None:
+        filters["document_ids"] = request.document_ids
+    for name in ("uploaded_after", "uploaded_before"):
+        value = getattr(request, name)
+        if value is not None:
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            filters[name] = value
+    for name in ("page_from", "page_to"):
+        if getattr(request, name) is not None:
+            filters[name] = getattr(request, name)
+    return filters
+
+def search_section_index(request: ConnectDotsRequest, query_embedding, filters: Dict[str, Any]) -> List[tuple]:
+    """Semantic top-k from the vector index, scoring only sections that pass the filters"""
+    if not filters:
+        return section_index.search(
+            query_embedding, k=request.max_results, min_score=0.1, exact=request.exact
+        )
+    allowed = [section_id for section_id, _ in document_store.indexed_sections(filters)]
+    scores = section_index.score_sections(query_embedding, allowed)
+    best = heapq.nlargest(request.max_results, scores.items(), key=lambda item: item[1])
+    return [(section_id, score) for section_id, score in best if score > 0.1]
+
+def load_section_hits(hits: List[tuple]) -> List[Dict[str, Any]]:
+    """Resolve (section_id, score) hits to section/document rows, keeping hit order"""
+    if not hits:
+        return []
+    rows = document_store.sections_with_documents([section_id for section_id, _ in hits])
+    rows_by_id = {section.id: (section, document) for section, document in rows}
+    similarities = []
+    for section_id, similarity in hits:
+        if section_id in rows_by_id:
+            section, document = rows_by_id[section_id]
+            similarities.append({
+                "section": section,
+                "document": document,
+                "similarity": similarity
+            })
+    return similarities
+
+def load_fallback_sections(use_index: bool, has_query_embedding: bool, filters: Dict[str, Any]) -> list:
+    """Sections scored one by one outside the vector and keyword indexes"""
+    if KEYWORD_INDEX_AVAILABLE:
+        # Text matching goes through BM25; only unindexed embeddings are left to score here
+        if use_index or not has_query_embedding:
+            return []
+        return document_store.filtered_sections(filters, embedded=True)
+    return document_store.filtered_sections(filters, embedded=False if use_index else None)
+
+def keyword_similarities(request: ConnectDotsRequest, query_embedding, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """BM25 matches for sections not scored semantically"""
+    if not KEYWORD_INDEX_AVAILABLE:
+        return []
+    hits = document_store.keyword_search(
+        request.selected_text, limit=request.max_results,
+        unembedded_only=query_embedding is not None, **filters
+    )
+    return load_section_hits([(section_id, score) for section_id, score in hits if score > 0.1])
+
+def score_fallback_sections(sections: list, request: ConnectDotsRequest, query_embedding) -> List[Dict[str, Any]]:
+    """Score sections one by one with semantic or text similarity"""
+    similarities = []
+    for section, document in sections:
+        try:
+            if query_embedding is not None and section.embedding_blob:
+                # Use semantic similarity if available
+                section_embedding = decode_embedding(section.embedding_blob, section.embedding_dtype)
+                similarity = calculate_similarity(query_embedding, section_embedding)
+            else:
+                # Fall back to text similarity
+                similarity = calculate_text_similarity(
+                    request.selected_text,
+                    section.section_title,
+                    section.section_content
+                )
+            
+            if similarity > 0.1:  # Filter out very low similarities
+                similarities.append({
+                    "section": section,
+                    "document": document,
+                    "similarity": similarity
+                })
+        except Exception as e:
+            print(f"Error processing section {section.id}: {e}")
+            continue
+    return similarities
+
+def lexical_candidates(query: str, limit: int, filters: Dict[str, Any]) -> List[tuple]:
+    """Top keyword matches as (section_id, score), best first"""
+    if KEYWORD_INDEX_AVAILABLE:
+        return document_store.keyword_search(query, limit=limit, **filters)
+    scored = [
+        (section_id, calculate_text_similarity(query, title, content))
+        for section_id, title, content in document_store.section_texts(filters)
+    ]
+    scored = [item for item in scored if item[1] > 0]
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return scored[:limit]
+
+def fuse_rankings(
+    lexical: List[tuple], semantic: Dict[str, float], fusion: str, semantic_weight: float
+) -> List[tuple]:
+    """Combine lexical (section_id, score) and semantic {section_id: score} rankings, best first"""
+    fused: Dict[str, float] = {}
+    if fusion == "rrf":
+        semantic_ranked = sorted(semantic, key=semantic.get, reverse=True)
+        for ranking in ([section_id for section_id, _ in lexical], semantic_ranked):
+            for rank, section_id in enumerate(ranking):
+                fused[section_id] = fused.get(section_id, 0.0) + 1.0 / (HYBRID_RRF_K + rank + 1)
+        # Scale so a section ranked first by both lists scores 1.0
+        best_possible = 2.0 / (HYBRID_RRF_K + 1)
+        fused = {section_id: score / best_possible for section_id, score in fused.items()}
+    else:
+        top_lexical = lexical[0][1] if lexical and lexical[0][1] > 0 else 1.0
+        for section_id, lexical_score in lexical:
+            fused[section_id] = (
+                semantic_weight * semantic.get(section_id, 0.0)
+                + (1.0 - semantic_weight) * lexical_score / top_lexical
+            )
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+def hybrid_similarities(
+    request: ConnectDotsRequest, query_embedding, filters: Dict[str, Any]
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Hybrid ranking: a BM25 shortlist of HYBRID_CANDIDATES sections is
+    re-scored with embeddings and the two rankings fused. Returns None when
+    there is no embedding or no keyword match, so the caller ranks semantically.
+    """
+    if query_embedding is None or section_index is None or len(section_index) == 0:
+        return None
+    shortlist = lexical_candidates(request.selected_text, HYBRID_CANDIDATES, filters)
+    if not shortlist:
+        return None
+    semantic = section_index.score_sections(query_embedding, [section_id for section_id, _ in shortlist])
+    fused = fuse_rankings(shortlist, semantic, request.fusion, request.semantic_weight)
+    return load_section_hits(fused[:request.max_results])
+
+def rank_sections(request: ConnectDotsRequest, query_embedding) -> List[Dict[str, Any]]:
+    """Rank sections for one connect-dots query, applying its filters before any scoring"""
+    filters = search_filters(request)
+    if request.mode == "hybrid":
+        similarities = hybrid_similarities(request, query_embedding, filters)
+        if similarities is not None:
+            return similarities
+
+    similarities = []
+    use_index = query_embedding is not None and section_index is not None and len(section_index) > 0
+
+    if use_index:
+        # Semantic top-k straight from the resident embedding matrix
+        similarities.extend(load_section_hits(search_section_index(request, query_embedding, filters)))
+
+    # Sections without embeddings (or no query embedding at all) use keyword matching
+    similarities.extend(keyword_similarities(request, query_embedding, filters))
+    sections = load_fallback_sections(use_index, query_embedding is not None, filters)
+    similarities.extend(score_fallback_sections(sections, request, query_embedding))
+    return similarities
+
+def format_connect_dots_results(similarities: List[Dict[str, Any]], max_results: int) -> List[SectionSnippet]:
+    """Sort by similarity and format the top results"""
+    similarities.sort(key=lambda x: x["similarity"], reverse=True)
+    results = []
+    for item in similarities[:max_results]:
+        section = item["section"]
+        document = item["document"]
+        
+        results.append(SectionSnippet(
+            id=section.id,
+            document_id=document.id,
+            document_title=document.title or document.original_filename,
+            document_filename=document.original_filename,
+            section_title=section.section_title,
+            snippet=section.snippet,
+            page_number=section.page_number,
+            relevance_score=round(item["similarity"], 4)
+        ))
+    return results
+
 @app.post("/connect-dots", response_model=ConnectDotsResponse)
 async def connect_dots(request: ConnectDotsRequest):
     """
@@ -580,77 +1339,210 @@ async def connect_dots(request: ConnectDotsRequest):
     Step 1 - Reading & Selection: User selects text, system finds related sections
     """
     start_time = time.time()
+
+    # Re-renders and repeated selections are answered from the result cache
+    # (the key reads the library generation, which may query the database)
+    cache_key = await run_in_threadpool(result_cache_key, request)
+    cached_results = result_cache.get(cache_key)
+    if cached_results is not None:
+        return ConnectDotsResponse(
+            query=request.selected_text,
+            results=cached_results,
+            processing_time=round(time.time() - start_time, 3)
+        )
     
     # Create embedding for query
     query_text = f"{request.selected_text} {request.context or ''}"
-    query_embedding = create_embedding(query_text)
+    query_embedding = await get_query_embedding(query_text)
     
-    db = SessionLocal()
-    try:
-        # Get all processed document sections
-        sections = db.query(DocumentSection, Document).join(
-            Document, DocumentSection.document_id == Document.id
-        ).filter(
-            Document.processing_status == "completed"
-        ).all()
-        
-        # Calculate similarities
-        similarities = []
-        for section, document in sections:
-            try:
-                if query_embedding and section.embedding:
-                    # Use semantic similarity if available
-                    section_embedding = json.loads(section.embedding)
-                    similarity = calculate_similarity(query_embedding, section_embedding)
+    # Index search, section loads and keyword scoring block, so they run in the threadpool
+    similarities = await run_in_threadpool(rank_sections, request, query_embedding)
+    results = format_connect_dots_results(similarities, request.max_results)
+    result_cache.put(cache_key, results)
+    processing_time = time.time() - start_time
+    
+    return ConnectDotsResponse(
+        query=request.selected_text,
+        results=results,
+        processing_time=round(processing_time, 3)
+    )
+
+def rank_connect_dots_batch(
+    queries: List[ConnectDotsRequest],
+    cache_keys: List[tuple],
+    cached_results: List[Optional[list]],
+    query_embeddings: Dict[int, Any]
+) -> tuple:
+    """Rank every uncached query of a batch; returns (responses, search_time)"""
+    pending = list(query_embeddings)
+    search_start = time.time()
+    # Hybrid and filtered queries are ranked one by one; the rest share one index search
+    individual = {i for i in pending if queries[i].mode == "hybrid" or search_filters(queries[i])}
+    shared = [i for i in pending if i not in individual]
+
+    index_hits: List[List[tuple]] = [[] for _ in queries]
+    indexed = {
+        i for i in shared if query_embeddings[i] is not None
+    } if section_index is not None and len(section_index) > 0 else set()
+    # Exact and ANN queries are searched as two batches
+    for exact in (False, True):
+        positions = [i for i in sorted(indexed) if queries[i].exact == exact]
+        if not positions:
+            continue
+        hits = section_index.search_batch(
+            np.vstack([query_embeddings[i] for i in positions]),
+            k=max(queries[i].max_results for i in positions), min_score=0.1, exact=exact
+        )
+        for position, query_hits in zip(positions, hits):
+            index_hits[position] = query_hits[:queries[position].max_results]
+    search_time = time.time() - search_start
+
+    # Sections outside the index are loaded once for the whole batch
+    indexed_fallback = load_fallback_sections(True, True, {}) if indexed else []
+    unindexed_fallback = {
+        has_embedding: load_fallback_sections(False, has_embedding, {})
+        for has_embedding in {query_embeddings[i] is not None for i in shared if i not in indexed}
+    }
+
+    responses = []
+    for i, query in enumerate(queries):
+        query_start = time.time()
+        results = cached_results[i]
+        if results is None:
+            query_embedding = query_embeddings[i]
+            if i in individual:
+                similarities = rank_sections(query, query_embedding)
+            else:
+                if i in indexed:
+                    sections = indexed_fallback
                 else:
-                    # Fall back to text similarity
-                    similarity = calculate_text_similarity(
-                        request.selected_text,
-                        section.section_title,
-                        section.section_content
-                    )
-                
-                if similarity > 0.1:  # Filter out very low similarities
-                    similarities.append({
-                        "section": section,
-                        "document": document,
-                        "similarity": similarity
-                    })
-            except Exception as e:
-                print(f"Error processing section {section.id}: {e}")
-                continue
+                    sections = unindexed_fallback[query_embedding is not None]
+                similarities = load_section_hits(index_hits[i])
+                similarities.extend(keyword_similarities(query, query_embedding, {}))
+                similarities.extend(score_fallback_sections(sections, query, query_embedding))
+            results = format_connect_dots_results(similarities, query.max_results)
+            result_cache.put(cache_keys[i], results)
+        responses.append(ConnectDotsResponse(
+            query=query.selected_text,
+            results=results,
+            processing_time=round(time.time() - query_start, 3)
+        ))
+    return responses, search_time
+
+@app.post("/connect-dots/batch", response_model=BatchConnectDotsResponse)
+async def connect_dots_batch(request: BatchConnectDotsRequest):
+    """
+    Run many connect-dots queries in one pass: one embedding call, one
+    index search over the query matrix and shared fallback section loads
+    """
+    start_time = time.time()
+    queries = request.queries
+    cache_keys = await run_in_threadpool(lambda: [result_cache_key(query) for query in queries])
+    cached_results = [result_cache.get(key) for key in cache_keys]
+    pending = [i for i, results in enumerate(cached_results) if results is None]
+
+    query_embeddings = await get_query_embeddings([
+        f"{queries[i].selected_text} {queries[i].context or ''}" for i in pending
+    ])
+    query_embeddings = dict(zip(pending, query_embeddings))
+    encode_time = time.time() - start_time
+
+    # Search, section loads and scoring block for the whole batch, so they run in the threadpool
+    responses, search_time = await run_in_threadpool(
+        rank_connect_dots_batch, queries, cache_keys, cached_results, query_embeddings
+    )
+
+    return BatchConnectDotsResponse(
+        results=responses,
+        encode_time=round(encode_time, 3),
+        search_time=round(search_time, 3),
+        processing_time=round(time.time() - start_time, 3)
+    )
+
+def load_insight_context(request: InsightRequest) -> List[Dict[str, Any]]:
+    """Document, section title and leading content of each related section"""
+    if not request.related_sections:
+        raise HTTPException(status_code=400, detail="No related sections provided")
+    
+    # Get related sections content
+    sections = document_store.sections_with_documents(request.related_sections, completed_only=False)
+    
+    if not sections:
+        raise HTTPException(status_code=404, detail="No sections found")
+    
+    # Prepare context for LLM
+    context_sections = []
+    for section, document in sections:
+        context_sections.append({
+            "document": document.title or document.original_filename,
+            "section": section.section_title,
+            "content": section.section_content[:500]  # Limit content
+        })
+    return context_sections
+
+def build_insight_prompt(request: InsightRequest, context_sections: List[Dict[str, Any]]) -> str:
+    """LLM prompt for the requested insight type"""
+    # Create LLM prompt based on insight type
+    if request.insight_type == "contradictions":
+        prompt = f"""
+        Analyze the following selected text and related sections for contradictions or opposing viewpoints:
         
-        # Sort by similarity and get top results
-        similarities.sort(key=lambda x: x["similarity"], reverse=True)
-        top_results = similarities[:request.max_results]
+        Selected Text: "{request.selected_text}"
         
-        # Format response
-        results = []
-        for item in top_results:
-            section = item["section"]
-            document = item["document"]
-            
-            results.append(SectionSnippet(
-                id=section.id,
-                document_id=document.id,
-                document_title=document.title or document.original_filename,
-                document_filename=document.original_filename,
-                section_title=section.section_title,
-                snippet=section.snippet,
-                page_number=section.page_number,
-                relevance_score=round(item["similarity"], 4)
-            ))
+        Related Sections:
+        {json.dumps(context_sections, indent=2)}
         
-        processing_time = time.time() - start_time
+        Identify any contradictory viewpoints, opposing arguments, or conflicting information. 
+        Focus on differences in methodology, conclusions, or perspectives.
+        """
+    elif request.insight_type == "examples":
+        prompt = f"""
+        Based on the selected text and related sections, provide concrete examples and applications:
         
-        return ConnectDotsResponse(
-            query=request.selected_text,
-            results=results,
-            processing_time=round(processing_time, 3)
-        )
+        Selected Text: "{request.selected_text}"
         
-    finally:
-        db.close()
+        Related Sections:
+        {json.dumps(context_sections, indent=2)}
+        
+        Identify specific examples, case studies, or practical applications mentioned in the documents.
+        """
+    elif request.insight_type == "takeaways":
+        prompt = f"""
+        Extract key takeaways and important insights from the selected text and related sections:
+        
+        Selected Text: "{request.selected_text}"
+        
+        Related Sections:
+        {json.dumps(context_sections, indent=2)}
+        
+        Provide the most important insights, lessons learned, and key points that readers should remember.
+        """
+    else:  # comprehensive
+        prompt = f"""
+        Provide comprehensive insights about the selected text based on related sections from the user's document library:
+        
+        Selected Text: "{request.selected_text}"
+        
+        Related Sections:
+        {json.dumps(context_sections, indent=2)}
+        
+        Analyze for:
+        1. Key patterns and connections
+        2. Contradictory or supporting viewpoints
+        3. Practical examples and applications
+        4. Important takeaways
+        5. Cross-document insights
+        
+        Keep insights grounded in the provided documents only.
+        """
+    
+    return prompt
+
+def fallback_insights(context_sections: List[Dict[str, Any]], llm_failed: bool) -> str:
+    """Local summary used when the LLM is unavailable or its call fails"""
+    if llm_failed:
+        return f"LLM service unavailable. Using local analysis: The selected text relates to {len(context_sections)} sections across your documents, covering topics like {', '.join([s['section'] for s in context_sections[:3]])}."
+    return f"The selected text connects to {len(context_sections)} sections across your document library. Key themes include: {', '.join([s['section'] for s in context_sections[:3]])}."
 
 @app.post("/insights")
 async def generate_insights(request: InsightRequest):
@@ -659,105 +1551,75 @@ async def generate_insights(request: InsightRequest):
     
     Goes beyond finding related text to provide contextual insights
     """
-    if not request.related_sections:
-        raise HTTPException(status_code=400, detail="No related sections provided")
+    context_sections = load_insight_context(request)
+    prompt = build_insight_prompt(request, context_sections)
     
-    db = SessionLocal()
-    try:
-        # Get related sections content
-        sections = db.query(DocumentSection, Document).join(
-            Document, DocumentSection.document_id == Document.id
-        ).filter(
-            DocumentSection.id.in_(request.related_sections)
-        ).all()
-        
-        if not sections:
-            raise HTTPException(status_code=404, detail="No sections found")
-        
-        # Prepare context for LLM
-        context_sections = []
-        for section, document in sections:
-            context_sections.append({
-                "document": document.title or document.original_filename,
-                "section": section.section_title,
-                "content": section.section_content[:500]  # Limit content
-            })
-        
-        # Create LLM prompt based on insight type
-        if request.insight_type == "contradictions":
-            prompt = f"""
-            Analyze the following selected text and related sections for contradictions or opposing viewpoints:
-            
-            Selected Text: "{request.selected_text}"
-            
-            Related Sections:
-            {json.dumps(context_sections, indent=2)}
-            
-            Identify any contradictory viewpoints, opposing arguments, or conflicting information. 
-            Focus on differences in methodology, conclusions, or perspectives.
-            """
-        elif request.insight_type == "examples":
-            prompt = f"""
-            Based on the selected text and related sections, provide concrete examples and applications:
-            
-            Selected Text: "{request.selected_text}"
-            
-            Related Sections:
-            {json.dumps(context_sections, indent=2)}
-            
-            Identify specific examples, case studies, or practical applications mentioned in the documents.
-            """
-        elif request.insight_type == "takeaways":
-            prompt = f"""
-            Extract key takeaways and important insights from the selected text and related sections:
-            
-            Selected Text: "{request.selected_text}"
-            
-            Related Sections:
-            {json.dumps(context_sections, indent=2)}
-            
-            Provide the most important insights, lessons learned, and key points that readers should remember.
-            """
-        else:  # comprehensive
-            prompt = f"""
-            Provide comprehensive insights about the selected text based on related sections from the user's document library:
-            
-            Selected Text: "{request.selected_text}"
-            
-            Related Sections:
-            {json.dumps(context_sections, indent=2)}
-            
-            Analyze for:
-            1. Key patterns and connections
-            2. Contradictory or supporting viewpoints
-            3. Practical examples and applications
-            4. Important takeaways
-            5. Cross-document insights
-            
-            Keep insights grounded in the provided documents only.
-            """
-        
-        # Call LLM if available
-        if LLM_AVAILABLE:
-            try:
-                messages = [{"role": "user", "content": prompt}]
-                insights = get_llm_response(messages)
-            except Exception as e:
-                print(f"LLM call failed: {e}")
-                insights = f"LLM service unavailable. Using local analysis: The selected text relates to {len(context_sections)} sections across your documents, covering topics like {', '.join([s['section'] for s in context_sections[:3]])}."
-        else:
-            insights = f"The selected text connects to {len(context_sections)} sections across your document library. Key themes include: {', '.join([s['section'] for s in context_sections[:3]])}."
-        
-        return {
+    # Call LLM if available
+    if LLM_AVAILABLE:
+        try:
+            messages = [{"role": "user", "content": prompt}]
+            insights = await aget_llm_response(messages, use_cache=not request.bypass_cache)
+        except Exception as e:
+            print(f"LLM call failed: {e}")
+            insights = fallback_insights(context_sections, llm_failed=True)
+    else:
+        insights = fallback_insights(context_sections, llm_failed=False)
+    
+    return {
+        "selected_text": request.selected_text,
+        "insight_type": request.insight_type,
+        "insights": insights,
+        "related_sections_count": len(context_sections),
+        "grounded_in_documents": True
+    }
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/insights/stream")
+async def stream_insights(request: InsightRequest):
+    """
+    Streaming variant of /insights as Server-Sent Events: a `meta` event,
+    `token` events as the LLM generates, then `done` (or `error` if the
+    LLM fails mid-answer). Token generation runs in the threadpool.
+    """
+    context_sections = load_insight_context(request)
+    prompt = build_insight_prompt(request, context_sections)
+    
+    async def events():
+        yield sse_event("meta", {
             "selected_text": request.selected_text,
             "insight_type": request.insight_type,
-            "insights": insights,
             "related_sections_count": len(context_sections),
             "grounded_in_documents": True
-        }
+        })
+        streamed = False
+        if LLM_AVAILABLE:
+            tokens = astream_llm_response(
+                [{"role": "user", "content": prompt}], use_cache=not request.bypass_cache
+            )
+            try:
+                async for text in tokens:
+                    streamed = True
+                    yield sse_event("token", {"text": text})
+            except Exception as e:
+                print(f"LLM stream failed: {e}")
+                if streamed:
+                    yield sse_event("error", {"detail": "LLM stream interrupted"})
+                    return
+                yield sse_event("token", {"text": fallback_insights(context_sections, llm_failed=True)})
+            finally:
+                await tokens.aclose()
+        else:
+            yield sse_event("token", {"text": fallback_insights(context_sections, llm_failed=False)})
+        yield sse_event("done", {"llm_streamed": streamed})
     
-    finally:
-        db.close()
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.post("/audio-overview")
 async def generate_audio_overview(request: AudioRequest):
@@ -769,139 +1631,131 @@ async def generate_audio_overview(request: AudioRequest):
     if not request.related_sections:
         raise HTTPException(status_code=400, detail="No related sections provided")
     
-    db = SessionLocal()
-    try:
-        # Get related sections
-        sections = db.query(DocumentSection, Document).join(
-            Document, DocumentSection.document_id == Document.id
-        ).filter(
-            DocumentSection.id.in_(request.related_sections)
-        ).all()
+    # Get related sections
+    sections = document_store.sections_with_documents(request.related_sections, completed_only=False)
+    
+    if not sections:
+        raise HTTPException(status_code=404, detail="No sections found")
+    
+    # Prepare context for LLM-powered script generation
+    context_sections = []
+    for section, document in sections[:5]:  # Use more sections for richer content
+        context_sections.append({
+            "document": document.title or document.original_filename,
+            "section": section.section_title,
+            "content": section.section_content[:800],  # More content for better context
+            "snippet": section.snippet
+        })
+    
+    # Generate LLM-powered script
+    if request.audio_type == "podcast":
+        prompt = f"""
+        Create a natural-sounding podcast conversation script about this topic. This will be converted to AUDIO, so write it exactly like people actually SPEAK, not like formal text.
         
-        if not sections:
-            raise HTTPException(status_code=404, detail="No sections found")
+        Selected Topic: "{request.text_content}"
         
-        # Prepare context for LLM-powered script generation
-        context_sections = []
-        for section, document in sections[:5]:  # Use more sections for richer content
-            context_sections.append({
-                "document": document.title or document.original_filename,
-                "section": section.section_title,
-                "content": section.section_content[:800],  # More content for better context
-                "snippet": section.snippet
-            })
+        Related Content from Documents:
+        {json.dumps(context_sections, indent=2)}
         
-        # Generate LLM-powered script
-        if request.audio_type == "podcast":
-            prompt = f"""
-            Create a natural-sounding podcast conversation script about this topic. This will be converted to AUDIO, so write it exactly like people actually SPEAK, not like formal text.
-            
-            Selected Topic: "{request.text_content}"
-            
-            Related Content from Documents:
-            {json.dumps(context_sections, indent=2)}
-            
-            CRITICAL REQUIREMENTS for SPOKEN AUDIO:
-            1. Write like REAL CONVERSATION - use "um", "you know", "actually", "well", "so"
-            2. Use contractions: "it's", "you're", "that's", "we've", "I'm"
-            3. Break up long sentences with natural pauses
-            4. Reference documents like: "So in that document about... what was it... oh yeah, the engineering guide"
-            5. Make it sound spontaneous, not scripted
-            6. Use spoken transitions: "And here's the interesting part...", "But wait, there's more..."
-            7. Include thinking out loud: "Hmm, that's fascinating because..."
-            8. Natural speech patterns, NOT formal writing
-            9. Keep it 2-3 minutes (300-400 words max)
-            10. Make it sound like two friends having a genuine conversation
-            
-            Format: Write EXACTLY how people speak, with natural flow and pauses.
-            """
-        else:  # overview
-            prompt = f"""
-            Create a natural-sounding audio script. This will be SPOKEN OUT LOUD, so write exactly like a person naturally talks when they're excited to share something interesting they discovered.
-            
-            Selected Topic: "{request.text_content}"
+        CRITICAL REQUIREMENTS for SPOKEN AUDIO:
+        1. Write like REAL CONVERSATION - use "um", "you know", "actually", "well", "so"
+        2. Use contractions: "it's", "you're", "that's", "we've", "I'm"
+        3. Break up long sentences with natural pauses
+        4. Reference documents like: "So in that document about... what was it... oh yeah, the engineering guide"
+        5. Make it sound spontaneous, not scripted
+        6. Use spoken transitions: "And here's the interesting part...", "But wait, there's more..."
+        7. Include thinking out loud: "Hmm, that's fascinating because..."
+        8. Natural speech patterns, NOT formal writing
+        9. Keep it 2-3 minutes (300-400 words max)
+        10. Make it sound like two friends having a genuine conversation
+        
+        Format: Write EXACTLY how people speak, with natural flow and pauses.
+        """
+    else:  # overview
+        prompt = f"""
+        Create a natural-sounding audio script. This will be SPOKEN OUT LOUD, so write exactly like a person naturally talks when they're excited to share something interesting they discovered.
+        
+        Selected Topic: "{request.text_content}"
+        
+        Related Content from Documents:
+        {json.dumps(context_sections, indent=2)}
+        
+        CRITICAL REQUIREMENTS for SPOKEN AUDIO:
+        1. Start like a human would naturally begin: "So I was looking through...", "You know what's interesting?", "I found something cool..."
+        2. NEVER start with "Here's an audio overview" or anything robotic
+        3. Write like someone is ACTUALLY TALKING to you face-to-face
+        4. Use natural speech: "So here's what I found...", "You know what caught my attention..."
+        5. Use contractions: "I've", "you're", "that's", "there's", "it's"
+        6. Break up complex ideas into simple, conversational chunks
+        7. Use spoken transitions: "And get this...", "But here's the thing...", "So anyway..."
+        8. Reference documents casually: "In one of your docs about... let me think... oh yeah..."
+        9. Include natural pauses and thinking: "Hmm...", "Actually...", "Well..."
+        10. Sound like a smart friend explaining something they discovered
+        11. Keep it personal and conversational (2-3 minutes, 250-350 words)
+        12. End with something that sounds natural, not formal
+        13. Make it sound like you're genuinely excited to share this discovery
+        
+        Start with something natural like: "So I was digging through your documents..." or "You know what I noticed?" or "I found something pretty interesting..."
+        
+        Write as ONE PERSON speaking naturally and conversationally, like they just discovered something cool.
+        """
+    
+    # Generate script using LLM
+    print(f"🤖 Calling LLM to generate natural audio script...")
+    messages = [{"role": "user", "content": prompt}]
+    script = await aget_llm_response(messages, use_cache=not request.bypass_cache)
+    print(f"🤖 LLM SUCCESS! Generated natural script length: {len(script)}")
+    
+    print(f"🎵 SCRIPT GENERATED!")
+    print(f"🎵 Script length: {len(script)} characters")
+    print(f"🎵 Script preview: {script[:200]}...")
+    print(f"🎵 TTS_AVAILABLE: {TTS_AVAILABLE}")
+    
+    # Generate audio file if TTS is available
+    if TTS_AVAILABLE:
+        try:
+            audio_filename = f"audio_overview_{uuid.uuid4().hex[:8]}.mp3"
+            audio_path = Path("static") / audio_filename
+            audio_path.parent.mkdir(exist_ok=True)
             
-            Related Content from Documents:
-            {json.dumps(context_sections, indent=2)}
+            # Clean the script for TTS by removing markdown formatting
+            clean_script = clean_script_for_tts(script)
+            print(f"🧹 Script cleaned for TTS! Length: {len(clean_script)} chars")
+            print(f"🧹 Clean script preview: {clean_script[:200]}...")
             
-            CRITICAL REQUIREMENTS for SPOKEN AUDIO:
-            1. Start like a human would naturally begin: "So I was looking through...", "You know what's interesting?", "I found something cool..."
-            2. NEVER start with "Here's an audio overview" or anything robotic
-            3. Write like someone is ACTUALLY TALKING to you face-to-face
-            4. Use natural speech: "So here's what I found...", "You know what caught my attention..."
-            5. Use contractions: "I've", "you're", "that's", "there's", "it's"
-            6. Break up complex ideas into simple, conversational chunks
-            7. Use spoken transitions: "And get this...", "But here's the thing...", "So anyway..."
-            8. Reference documents casually: "In one of your docs about... let me think... oh yeah..."
-            9. Include natural pauses and thinking: "Hmm...", "Actually...", "Well..."
-            10. Sound like a smart friend explaining something they discovered
-            11. Keep it personal and conversational (2-3 minutes, 250-350 words)
-            12. End with something that sounds natural, not formal
-            13. Make it sound like you're genuinely excited to share this discovery
+            # TTS blocks on HTTP or espeak-ng; keep it off the event loop
+            await run_in_threadpool(generate_audio, clean_script, str(audio_path), voice=request.voice)
             
-            Start with something natural like: "So I was digging through your documents..." or "You know what I noticed?" or "I found something pretty interesting..."
+            return {
+                "success": True,
+                "audio_file": f"/static/{audio_filename}",
+                "script": script if request.audio_type == "overview" else "Podcast script generated",
+                "duration_estimate": f"{len(script.split()) // 150}-{len(script.split()) // 120} minutes",
+                "audio_type": request.audio_type,
+                "sections_included": len(sections)
+            }
             
-            Write as ONE PERSON speaking naturally and conversationally, like they just discovered something cool.
-            """
-        
-        # Generate script using LLM
-        print(f"🤖 Calling LLM to generate natural audio script...")
-        messages = [{"role": "user", "content": prompt}]
-        script = get_llm_response(messages)
-        print(f"🤖 LLM SUCCESS! Generated natural script length: {len(script)}")
-        
-        print(f"🎵 SCRIPT GENERATED!")
-        print(f"🎵 Script length: {len(script)} characters")
-        print(f"🎵 Script preview: {script[:200]}...")
-        print(f"🎵 TTS_AVAILABLE: {TTS_AVAILABLE}")
-        
-        # Generate audio file if TTS is available
-        if TTS_AVAILABLE:
-            try:
-                audio_filename = f"audio_overview_{uuid.uuid4().hex[:8]}.mp3"
-                audio_path = Path("static") / audio_filename
-                audio_path.parent.mkdir(exist_ok=True)
-                
-                # Clean the script for TTS by removing markdown formatting
-                clean_script = clean_script_for_tts(script)
-                print(f"🧹 Script cleaned for TTS! Length: {len(clean_script)} chars")
-                print(f"🧹 Clean script preview: {clean_script[:200]}...")
-                
-                generate_audio(clean_script, str(audio_path), voice=request.voice)
-                
-                return {
-                    "success": True,
-                    "audio_file": f"/static/{audio_filename}",
-                    "script": script if request.audio_type == "overview" else "Podcast script generated",
-                    "duration_estimate": f"{len(script.split()) // 150}-{len(script.split()) // 120} minutes",
-                    "audio_type": request.audio_type,
-                    "sections_included": len(sections)
-                }
-                
-            except Exception as e:
-                return {
-                    "success": False,
-                    "error": f"Audio generation failed: {str(e)}",
-                    "script": script,
-                    "fallback": True
-                }
-        else:
+        except Exception as e:
             return {
                 "success": False,
-                "error": "TTS service not available",
+                "error": f"Audio generation failed: {str(e)}",
                 "script": script,
                 "fallback": True
             }
-    
-    finally:
-        db.close()
+    else:
+        return {
+            "success": False,
+            "error": "TTS service not available",
+            "script": script,
+            "fallback": True
+        }
 
 # Catch-all route for frontend SPA routing (must be last!)
 @app.get("/{full_path:path}")
 async def serve_frontend_routes(full_path: str):
     """Serve frontend for all non-API routes"""
     # Don't intercept API routes or asset files
-    if full_path.startswith(("health", "documents", "connect-dots", "insights", "audio-overview", "batch-upload", "static", "assets")):
+    if full_path.startswith(("health", "jobs", "documents", "connect-dots", "insights", "audio-overview", "batch-upload", "static", "assets")):
         raise HTTPException(status_code=404, detail="API endpoint not found")
     
     # Serve index.html for all other routes (SPA routing)
@@ -0,0 +1,93 @@
+"""
+Background loading of the semantic search model
+
+Importing sentence-transformers (and torch behind it) and loading
+all-MiniLM-L6-v2 takes several seconds. The API should answer /health and
+serve keyword search while that happens, so the model is loaded on a
+daemon thread that starts with the server, and callers either take the
+model if it is ready or wait for it with a timeout.
+
+States: pending -> loading -> ready | failed
+
+Environment Variables:
+EMBEDDING_MODEL (default: "all-MiniLM-L6-v2")
+    - sentence-transformers model used for section and query embeddings
+MODEL_PRELOAD (default: "true")
+    - Start loading the model at startup; "false" defers it to the first request that needs it
+MODEL_LOAD_TIMEOUT (default: 300)
+    - Seconds ingestion waits for the model before storing sections without embeddings
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class BackgroundModel:
+    """A model loaded once on a background thread"""
+
+    def __init__(self, name: str, loader: Callable[[], Any]):
+        self.name = name
+        self._loader = loader
+        self._model = None
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    @property
+    def settled(self) -> bool:
+        """Loading has finished, successfully or not"""
+        return self._loaded.is_set()
+
+    def on_ready(self, callback: Callable[[], None]):
+        """Call `callback` (on the loader thread) once the model is ready"""
+        self._callbacks.append(callback)
+
+    def start(self):
+        """Start loading in the background; later calls are no-ops"""
+        with self._lock:
+            if self.state != "pending":
+                return
+            self.state = "loading"
+        threading.Thread(target=self._load, name=f"load-{self.name}", daemon=True).start()
+
+    def _load(self):
+        started = time.time()
+        try:
+            self._model = self._loader()
+            self.state = "ready"
+            print(f"✅ {self.name} model loaded in {time.time() - started:.1f}s")
+        except Exception as e:
+            self.error = str(e)
+            self.state = "failed"
+            print(f"⚠️ {self.name} model loading failed: {e}")
+        finally:
+            self.load_seconds = round(time.time() - started, 3)
+            self._loaded.set()
+        if self.ready:
+            for callback in self._callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    print(f"⚠️ {self.name} ready callback failed: {e}")
+
+    def get(self, timeout: float = 0.0) -> Optional[Any]:
+        """The model, waiting up to `timeout` seconds for it; None while loading or after a failure"""
+        self.start()
+        if timeout > 0:
+            self._loaded.wait(timeout)
+        return self._model
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "load_seconds": self.load_seconds,
+            "error": self.error
+        }
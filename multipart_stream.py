@@ -0,0 +1,136 @@
+"""
+Incremental multipart/form-data reader for uploads
+
+FastAPI's `File(...)` parameters make Starlette parse the whole request
+body into spooled temporary files before the handler runs, so a request
+far over the upload limits is still received and written out in full.
+`MultipartStream` instead pulls the body from `request.stream()` only as
+fast as the handler consumes file data, and stops reading as soon as the
+body exceeds its byte limit: the handler streams each file straight to its
+final location and never holds more than one network chunk in memory.
+
+Usage:
+    form = MultipartStream(request, max_bytes)
+    while (part := await form.next_file()) is not None:
+        while chunk := await form.read():
+            ...
+"""
+
+from collections import deque
+from typing import Any, Deque, Optional, Tuple
+
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+
+
+class MultipartError(Exception):
+    """Raised for a body that is not valid multipart/form-data"""
+
+
+class RequestBodyTooLarge(Exception):
+    """Raised when the request body exceeds the reader's byte limit"""
+
+
+class MultipartStream:
+    """Pull-based reader of the file parts of a multipart/form-data request"""
+
+    def __init__(self, request, max_bytes: int):
+        content_type, params = parse_options_header(request.headers.get("content-type", ""))
+        if content_type.lower() != b"multipart/form-data" or b"boundary" not in params:
+            raise MultipartError("Expected a multipart/form-data body")
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+        self._chunks = request.stream().__aiter__()
+        self._events: Deque[Tuple[str, Any]] = deque()
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._finished = False
+        self._in_file = False
+        self._parser = MultipartParser(params[b"boundary"], {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": lambda: self._events.append(("end", None)),
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished
+        })
+
+    # Parser callbacks, queued as events for the pulling coroutine
+
+    def _on_part_begin(self):
+        self._disposition = b""
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        self._events.append(("data", data[start:end]))
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        if b"name" not in options:
+            raise MultipartError('The Content-Disposition header field "name" must be provided')
+        filename = options.get(b"filename")
+        self._events.append(("part", (
+            options[b"name"].decode("utf-8", "replace"),
+            filename.decode("utf-8", "replace") if filename is not None else None
+        )))
+
+    async def _next_event(self) -> Optional[Tuple[str, Any]]:
+        while not self._events:
+            if self._finished:
+                return None
+            try:
+                chunk = await self._chunks.__anext__()
+            except StopAsyncIteration:
+                self._finished = True
+                self._parser.finalize()
+                continue
+            self.bytes_read += len(chunk)
+            if self.bytes_read > self.max_bytes:
+                self._finished = True
+                raise RequestBodyTooLarge(f"Request body exceeds {self.max_bytes} bytes")
+            try:
+                self._parser.write(chunk)
+            except MultipartParseError as e:
+                self._finished = True
+                raise MultipartError(f"Malformed multipart body: {e}")
+        return self._events.popleft()
+
+    async def next_file(self) -> Optional[Tuple[str, str]]:
+        """(field_name, filename) of the next file part; None at the end of the body"""
+        await self.skip()
+        while True:
+            event = await self._next_event()
+            if event is None:
+                return None
+            kind, value = event
+            if kind == "part" and value[1] is not None:
+                self._in_file = True
+                return value
+
+    async def read(self) -> bytes:
+        """Next chunk of the current file part; b"" once the part has ended"""
+        while self._in_file:
+            event = await self._next_event()
+            if event is None or event[0] == "end":
+                self._in_file = False
+            elif event[0] == "data" and event[1]:
+                return event[1]
+        return b""
+
+    async def skip(self):
+        """Discard the rest of the current file part"""
+        while await self.read():
+            pass
@@ -0,0 +1,235 @@
+"""
+Quantized ONNX embedding backend for CPU inference
+
+Runs all-MiniLM-L6-v2 exported to ONNX, with int8 dynamic quantization of
+its weights, through onnxruntime instead of PyTorch. Texts are tokenized in
+batches with the Rust `tokenizers` library, sorted by length so each batch
+pads to a similar width, then mean-pooled and L2-normalized exactly like
+the sentence-transformers pipeline.
+
+The exported model must pass a parity check against the PyTorch model
+before it is used: per-text cosine between the two embeddings and the
+pairwise cosine scores of a sample set have to agree. `export` runs the
+check and records it in the model directory's manifest; the backend
+refuses to load a model whose manifest does not record a pass.
+
+Export (needs torch, transformers, onnxruntime):
+    python onnx_embedder.py export --output ./models/all-MiniLM-L6-v2-onnx
+
+Environment Variables:
+EMBEDDING_BACKEND (default: "torch")
+    - "onnx" uses this backend, falling back to sentence-transformers if it cannot load
+ONNX_MODEL_DIR (default: "./models/all-MiniLM-L6-v2-onnx")
+    - Directory written by `export` (model.int8.onnx, tokenizer.json, manifest.json)
+ONNX_THREADS (default: 0)
+    - onnxruntime intra-op threads; 0 lets onnxruntime use all cores
+ONNX_MAX_SEQ_LENGTH (default: 256)
+    - Token limit per text (all-MiniLM-L6-v2 was trained with 256)
+ONNX_VERIFY_ON_START (default: "false")
+    - Re-run the parity check against sentence-transformers when loading
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+MODEL_FILE = "model.int8.onnx"
+FP32_MODEL_FILE = "model.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+MANIFEST_FILE = "manifest.json"
+
+# Parity thresholds: every text's ONNX embedding must point the same way as
+# the PyTorch one, and no pairwise similarity score may move noticeably
+MIN_EMBEDDING_COSINE = 0.99
+MAX_SCORE_DELTA = 0.02
+
+PARITY_TEXTS = [
+    "Summary of findings and recommendations for the next funding round.",
+    "The committee reviewed the budget timeline for phase two.",
+    "Membership criteria are described in Appendix A.",
+    "Transformer models encode sentences into dense vectors.",
+    "Quarterly revenue grew by twelve percent year over year.",
+    "Patients were randomized into treatment and control groups.",
+    "Install the package and set the environment variables before starting the server.",
+    "The river flooded the valley after three days of heavy rain.",
+    "Design criteria: latency under 100 ms at the 99th percentile.",
+    "Introduction",
+    "Figure 3 shows the results for each term of the study.",
+    "A short note."
+]
+
+
+class OnnxEmbedder:
+    """sentence-transformers compatible `encode` on an onnxruntime session"""
+
+    def __init__(self, model_dir: str, threads: Optional[int] = None, max_seq_length: Optional[int] = None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_dir = Path(model_dir)
+        self.threads = int(os.getenv("ONNX_THREADS", "0")) if threads is None else threads
+        self.max_seq_length = max_seq_length or int(os.getenv("ONNX_MAX_SEQ_LENGTH", "256"))
+
+        self.tokenizer = Tokenizer.from_file(str(self.model_dir / TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        pad_id = self.tokenizer.token_to_id("[PAD]") or 0
+        self.tokenizer.enable_padding(pad_id=pad_id, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = self.threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            str(self.model_dir / MODEL_FILE), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def _encode_batch(self, texts: Sequence[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(list(texts))
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+        token_embeddings = self.session.run(None, {name: value for name, value in feeds.items() if name in self.input_names})[0]
+
+        # Mean pooling over real tokens, then L2 normalization (sentence-transformers' Pooling + Normalize)
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs) -> np.ndarray:
+        """Embed texts in batches; returns a (len(texts), dim) float32 array in input order"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        # Length-sorted batches pad less
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+        for start in range(0, len(order), batch_size):
+            positions = order[start:start + batch_size]
+            for position, vector in zip(positions, self._encode_batch([texts[i] for i in positions])):
+                embeddings[position] = vector
+        result = np.vstack(embeddings)
+        return result[0] if single else result
+
+
+def parity_check(reference, candidate, texts: Sequence[str] = PARITY_TEXTS) -> Dict[str, Any]:
+    """Compare a candidate embedder's vectors and cosine scores with the reference model's"""
+    expected = np.asarray(reference.encode(list(texts)), dtype=np.float32)
+    actual = np.asarray(candidate.encode(list(texts)), dtype=np.float32)
+    expected /= np.clip(np.linalg.norm(expected, axis=1, keepdims=True), 1e-12, None)
+    actual /= np.clip(np.linalg.norm(actual, axis=1, keepdims=True), 1e-12, None)
+
+    embedding_cosines = (expected * actual).sum(axis=1)
+    score_delta = np.abs(expected @ expected.T - actual @ actual.T)
+    report = {
+        "texts": len(texts),
+        "min_embedding_cosine": round(float(embedding_cosines.min()), 5),
+        "max_score_delta": round(float(score_delta.max()), 5),
+        "min_embedding_cosine_required": MIN_EMBEDDING_COSINE,
+        "max_score_delta_allowed": MAX_SCORE_DELTA
+    }
+    report["passed"] = (
+        report["min_embedding_cosine"] >= MIN_EMBEDDING_COSINE
+        and report["max_score_delta"] <= MAX_SCORE_DELTA
+    )
+    return report
+
+
+def read_manifest(model_dir: str) -> Dict[str, Any]:
+    path = Path(model_dir) / MANIFEST_FILE
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_onnx_embedder(model_name: str, model_dir: Optional[str] = None, reference=None) -> OnnxEmbedder:
+    """
+    Load the exported model if its manifest records a parity pass for
+    `model_name`. With ONNX_VERIFY_ON_START (or an explicit `reference`
+    model) the check is re-run now. Raises RuntimeError when gated out.
+    """
+    model_dir = model_dir or os.getenv("ONNX_MODEL_DIR", "./models/all-MiniLM-L6-v2-onnx")
+    manifest = read_manifest(model_dir)
+    if manifest.get("source_model") != model_name:
+        raise RuntimeError(f"{model_dir} was not exported from {model_name}; run `python onnx_embedder.py export`")
+    if not manifest.get("parity", {}).get("passed"):
+        raise RuntimeError(f"{model_dir} has no passing parity check: {manifest.get('parity')}")
+
+    embedder = OnnxEmbedder(model_dir)
+    if reference is None and os.getenv("ONNX_VERIFY_ON_START", "false").lower() in ("1", "true", "yes"):
+        from sentence_transformers import SentenceTransformer
+        reference = SentenceTransformer(model_name)
+    if reference is not None:
+        report = parity_check(reference, embedder)
+        if not report["passed"]:
+            raise RuntimeError(f"ONNX embeddings diverge from {model_name}: {report}")
+    return embedder
+
+
+def export_onnx_model(model_name: str, output_dir: str, opset: int = 14) -> Dict[str, Any]:
+    """Export `model_name` to ONNX, quantize it to int8 and record a parity check against PyTorch"""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+    from transformers import AutoModel, AutoTokenizer
+
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    hub_name = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+    tokenizer = AutoTokenizer.from_pretrained(hub_name)
+    tokenizer.save_pretrained(str(output))  # Writes tokenizer.json for the fast tokenizer
+    model = AutoModel.from_pretrained(hub_name).eval()
+
+    sample = tokenizer(["warm up export"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(sample[name] for name in input_names), str(output / FP32_MODEL_FILE),
+            input_names=input_names, output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes, opset_version=opset
+        )
+    quantize_dynamic(str(output / FP32_MODEL_FILE), str(output / MODEL_FILE), weight_type=QuantType.QInt8)
+
+    report = parity_check(SentenceTransformer(model_name), OnnxEmbedder(str(output)))
+    manifest = {"source_model": model_name, "quantization": "dynamic int8", "opset": opset, "parity": report}
+    with open(output / MANIFEST_FILE, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Export and check the quantized ONNX embedding model")
+    parser.add_argument("command", choices=["export", "check"])
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"))
+    parser.add_argument("--output", default=os.getenv("ONNX_MODEL_DIR", "./models/all-MiniLM-L6-v2-onnx"))
+    args = parser.parse_args()
+
+    if args.command == "export":
+        manifest = export_onnx_model(args.model, args.output)
+        print(json.dumps(manifest["parity"], indent=2))
+        print(("✅ Parity check passed" if manifest["parity"]["passed"] else "❌ Parity check failed") + f": {args.output}")
+    else:
+        from sentence_transformers import SentenceTransformer
+
+        reference = SentenceTransformer(args.model)
+        embedder = OnnxEmbedder(args.output)
+        print(json.dumps(parity_check(reference, embedder), indent=2))
+        texts = PARITY_TEXTS * 50
+        for name, model in (("torch", reference), ("onnx int8", embedder)):
+            started = time.time()
+            model.encode(texts, batch_size=64)
+            print(f"{name}: {len(texts) / (time.time() - started):.0f} texts/s")
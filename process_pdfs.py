@@ -1,11 +1,181 @@
+"""
+PDF title, outline and section extraction (Challenge 1A)
+
+Page-level parallelism: documents of at least PDF_PARALLEL_PAGE_THRESHOLD
+pages are extracted by a pool of PDF_PAGE_WORKERS processes created for
+that document. The API's ingestion scheduler already parses each document
+in a pool of INGEST_PARSE_WORKERS processes, so it calls process_single_pdf
+with page_workers=1: nesting a page pool inside every parse process would
+spawn up to INGEST_PARSE_WORKERS x PDF_PAGE_WORKERS processes. Page pools
+are used by the standalone batch run (process_pdfs) and when ingestion
+parses in a thread (INGEST_PARSE_WORKERS=0).
+
+Environment Variables:
+PDF_PARALLEL_PAGE_THRESHOLD (default: 200)
+    - Page count from which extraction is split across processes
+PDF_PAGE_WORKERS (default: up to 4 CPUs)
+    - Processes used for parallel page extraction
+SECTION_PASSAGE_CHARS (default: 1000)
+    - Maximum characters per section passage
+"""
+
 import os
 import json
 import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import fitz  # PyMuPDF
-from typing import List, Dict, Any
+import numpy as np
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+
+# Text extraction flags: the default "dict" flags also decode every image into the result
+SPAN_TEXT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+MIN_SPAN_CHARS = 3  # Spans shorter than this are ignored everywhere
+
+NON_TITLE_RE = re.compile(r'^\d+$|^page \d+|^chapter \d+')
+
+# Documents with at least this many pages are extracted by a pool of processes
+PARALLEL_PAGE_THRESHOLD = int(os.getenv("PDF_PARALLEL_PAGE_THRESHOLD", "200"))
+PAGE_WORKERS = int(os.getenv("PDF_PAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Upper bound on the size of one indexed section passage
+PASSAGE_MAX_CHARS = int(os.getenv("SECTION_PASSAGE_CHARS", "1000"))
+
+class SpanTable:
+    """
+    Compact, columnar table of the text spans in a document.
+
+    Built from a single get_text("dict") pass per page. Span texts live in one
+    string addressed by start/end offsets; size, flags, page (1-based) and
+    bbox are parallel NumPy arrays. Title detection, font statistics and
+    header scoring all read from this table instead of re-walking pages.
+
+    The same pass also records every non-empty text line (all of its spans,
+    however short) with its page, which section passages are built from.
+    """
+
+    def __init__(self, text: str, starts, ends, size, flags, page, bbox,
+                 line_text: str = "", line_ends=None, line_page=None):
+        self.text = text
+        self.starts = starts
+        self.ends = ends
+        self.size = size
+        self.flags = flags
+        self.page = page
+        self.bbox = bbox
+        self.line_text = line_text
+        self.line_ends = np.zeros(0, dtype=np.int64) if line_ends is None else line_ends
+        self.line_page = np.zeros(0, dtype=np.int32) if line_page is None else line_page
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def span_text(self, i: int) -> str:
+        return self.text[self.starts[i]:self.ends[i]]
+
+    def rows_for_page(self, page_number: int) -> np.ndarray:
+        """Row indices of the spans on a 1-based page number, in reading order"""
+        return np.flatnonzero(self.page == page_number)
+
+    def pages_with_text(self) -> List[int]:
+        """Sorted 1-based page numbers that contain at least one span"""
+        return np.unique(self.page).tolist()
+
+    def page_lines(self, page_number: int) -> List[str]:
+        """Non-empty text lines of a 1-based page number, in reading order"""
+        first, last = np.searchsorted(self.line_page, [page_number, page_number + 1])
+        line_starts = np.concatenate(([0], self.line_ends[:-1])) if len(self.line_ends) else self.line_ends
+        return [self.line_text[line_starts[i]:self.line_ends[i]] for i in range(first, last)]
+
+def build_span_table(doc, pages: Optional[Iterable[int]] = None) -> SpanTable:
+    """Extract every span of the given 0-based pages (default: all) in one pass"""
+    pieces = []
+    lengths = array("q")
+    sizes = array("d")
+    flags = array("i")
+    page_numbers = array("i")
+    bboxes = array("d")
+    line_pieces = []
+    line_lengths = array("q")
+    line_pages = array("i")
+
+    for page_num in (range(len(doc)) if pages is None else pages):
+        text_dict = doc[page_num].get_text("dict", flags=SPAN_TEXT_FLAGS)
+        for block in text_dict.get("blocks", []):
+            if "lines" in block:
+                for line in block["lines"]:
+                    line_text = "".join(span.get("text", "") for span in line.get("spans", [])).strip()
+                    if line_text:
+                        line_pieces.append(line_text)
+                        line_lengths.append(len(line_text))
+                        line_pages.append(page_num + 1)
+                    for span in line.get("spans", []):
+                        text = span.get("text", "").strip()
+                        if len(text) < MIN_SPAN_CHARS:
+                            continue
+                        pieces.append(text)
+                        lengths.append(len(text))
+                        sizes.append(span.get("size", 0))
+                        flags.append(span.get("flags", 0))
+                        page_numbers.append(page_num + 1)
+                        bboxes.extend(span.get("bbox", (0, 0, 0, 0)))
+        del text_dict
+
+    ends = np.cumsum(np.frombuffer(lengths, dtype=np.int64)) if lengths else np.zeros(0, dtype=np.int64)
+    starts = ends - np.frombuffer(lengths, dtype=np.int64) if lengths else np.zeros(0, dtype=np.int64)
+    return SpanTable(
+        text="".join(pieces),
+        starts=starts,
+        ends=ends,
+        size=np.frombuffer(sizes, dtype=np.float64),
+        flags=np.frombuffer(flags, dtype=np.int32),
+        page=np.frombuffer(page_numbers, dtype=np.int32),
+        bbox=np.frombuffer(bboxes, dtype=np.float64).reshape(-1, 4),
+        line_text="".join(line_pieces),
+        line_ends=np.cumsum(np.frombuffer(line_lengths, dtype=np.int64)) if line_lengths else None,
+        line_page=np.frombuffer(line_pages, dtype=np.int32)
+    )
+
+def merge_span_tables(tables: List[SpanTable]) -> SpanTable:
+    """Concatenate span tables of consecutive page ranges, keeping page order"""
+    offsets = np.cumsum([0] + [len(table.text) for table in tables[:-1]])
+    line_offsets = np.cumsum([0] + [len(table.line_text) for table in tables[:-1]])
+    return SpanTable(
+        text="".join(table.text for table in tables),
+        starts=np.concatenate([table.starts + offset for table, offset in zip(tables, offsets)]),
+        ends=np.concatenate([table.ends + offset for table, offset in zip(tables, offsets)]),
+        size=np.concatenate([table.size for table in tables]),
+        flags=np.concatenate([table.flags for table in tables]),
+        page=np.concatenate([table.page for table in tables]),
+        bbox=np.concatenate([table.bbox for table in tables]),
+        line_text="".join(table.line_text for table in tables),
+        line_ends=np.concatenate([table.line_ends + offset for table, offset in zip(tables, line_offsets)]),
+        line_page=np.concatenate([table.line_page for table in tables])
+    )
+
+def _extract_page_range(pdf_path: str, start: int, stop: int) -> SpanTable:
+    """Worker: open a private fitz document and extract pages [start, stop)"""
+    doc = fitz.open(pdf_path)
+    try:
+        return build_span_table(doc, pages=range(start, stop))
+    finally:
+        doc.close()
+
+def build_span_table_parallel(pdf_path: Path, page_count: int, workers: int = PAGE_WORKERS) -> SpanTable:
+    """Split the pages into contiguous ranges, extract them in a process pool and merge"""
+    chunk = -(-page_count // workers)  # Ceiling division
+    ranges = [(start, min(start + chunk, page_count)) for start in range(0, page_count, chunk)]
+    with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+        tables = list(pool.map(
+            _extract_page_range,
+            [str(pdf_path)] * len(ranges),
+            [start for start, _ in ranges],
+            [stop for _, stop in ranges]
+        ))
+    return merge_span_tables(tables)
 
-def extract_title(doc) -> str:
+def extract_title(doc, spans: Optional[SpanTable] = None) -> str:
     """Extract title from PDF metadata or first page, with trailing space"""
     # Try metadata first
     metadata = doc.metadata
@@ -14,26 +184,23 @@ def extract_title(doc) -> str:
     
     # Fall back to first page text analysis for comprehensive title
     if len(doc) > 0:
-        first_page = doc[0]
-        text_dict = first_page.get_text("dict")
+        if spans is None:
+            spans = build_span_table(doc, pages=[0])
         
         # Collect potential title components with font info
         title_candidates = []
         
-        for block in text_dict.get("blocks", []):
-            if "lines" in block:
-                for line in block["lines"]:
-                    for span in line.get("spans", []):
-                        text = span.get("text", "").strip()
-                        font_size = span.get("size", 0)
-                        if (len(text) > 5 and len(text) < 150 and 
-                            font_size > 10 and
-                            not re.match(r'^\d+$|^page \d+|^chapter \d+', text.lower())):
-                            title_candidates.append({
-                                "text": text,
-                                "font_size": font_size,
-                                "bbox": span.get("bbox", [0, 0, 0, 0])
-                            })
+        for i in spans.rows_for_page(1):
+            text = spans.span_text(i)
+            font_size = spans.size[i]
+            if (len(text) > 5 and len(text) < 150 and 
+                font_size > 10 and
+                not NON_TITLE_RE.match(text.lower())):
+                title_candidates.append({
+                    "text": text,
+                    "font_size": float(font_size),
+                    "bbox": spans.bbox[i]
+                })
         
         if title_candidates:
             # Sort by font size and position (top of page first)
@@ -50,7 +217,181 @@ def extract_title(doc) -> str:
     
     return ""
 
-def detect_outline_structure(doc) -> List[Dict[str, Any]]:
+# Precompiled header heuristics used by detect_outline_structure
+LEVEL_PATTERNS = [
+    (re.compile(r'^\d+\.\s+[A-Z]'), "H1"),  # "1. Introduction"
+    (re.compile(r'^\d+\.\d+\s+[A-Z]'), "H2"),  # "1.1 Overview"
+    (re.compile(r'^\d+\.\d+\.\d+\s+'), "H3"),  # "1.1.1 Details"
+    (re.compile(r'^Chapter\s+\d+', re.IGNORECASE), "H1"),
+    (re.compile(r'^Section\s+\d+', re.IGNORECASE), "H2"),
+    (re.compile(r'^Appendix\s+[A-Z]', re.IGNORECASE), "H2"),
+]
+NUMBERED_SECTION_RE = re.compile(r'^\d+[\.\)]\s+\w')
+TITLE_CASE_RE = re.compile(r'^[A-Z][a-z]+(\s+[A-Z][a-z]+)*$')
+NUMBERED_PREFIX_RE = re.compile(r'^\d+\.')
+
+KEYWORD_CLASSES = {
+    # Text containing these is not a header
+    "exclude": ['the following', 'as shown', 'figure', 'table'],
+    # Common header words bonus
+    "header": ['introduction', 'conclusion', 'summary', 'overview', 'background',
+               'methodology', 'results', 'discussion', 'abstract', 'references',
+               'contents', 'index', 'glossary', 'acknowledgments', 'preface'],
+    # Keyword-based level assignment
+    "h1": ['introduction', 'conclusion', 'summary', 'overview', 'acknowledgement',
+           'table of contents', 'references', 'bibliography', 'abstract'],
+    "h2": ['background', 'methodology', 'approach', 'evaluation', 'milestones',
+           'business outcomes', 'content', 'timeline', 'funding', 'requirements'],
+    "h3": ['access', 'guidance', 'training', 'support', 'phase', 'preamble',
+           'membership', 'term', 'chair', 'meetings', 'criteria', 'process'],
+}
+
+def _build_keyword_automaton(keyword_classes: Dict[str, List[str]]):
+    """
+    Compile every keyword of every class into one scanner.
+
+    The scanner is a zero-width lookahead over a longest-first alternation, so
+    findall reports the longest keyword starting at each position. Any other
+    keyword starting there is a prefix of it, so each keyword maps to the
+    classes of all its keyword prefixes - together this finds every
+    (overlapping) keyword occurrence, like an Aho-Corasick automaton.
+    """
+    keywords = sorted({word for words in keyword_classes.values() for word in words}, key=len, reverse=True)
+    alternation = "|".join(re.escape(word) for word in keywords)
+    class_map = {
+        keyword: frozenset(
+            name
+            for name, words in keyword_classes.items()
+            for word in words
+            if keyword.startswith(word)
+        )
+        for keyword in keywords
+    }
+    return re.compile(alternation), re.compile(f"(?=({alternation}))"), class_map
+
+KEYWORD_PRESENT_RE, KEYWORD_SCAN_RE, KEYWORD_CLASS_MAP = _build_keyword_automaton(KEYWORD_CLASSES)
+
+def keyword_classes(text_lower: str) -> frozenset:
+    """Names of the KEYWORD_CLASSES with at least one keyword in the lowercased text"""
+    if not KEYWORD_PRESENT_RE.search(text_lower):
+        return frozenset()
+    found = set()
+    for keyword in KEYWORD_SCAN_RE.findall(text_lower):
+        found |= KEYWORD_CLASS_MAP[keyword]
+    return frozenset(found)
+
+FONT_LEVELS = np.array(["H1", "H2", "H3", "H4"])
+
+def score_header_candidates(spans: SpanTable, avg_font_size: float, max_font_size: float) -> List[Dict[str, Any]]:
+    """
+    Score every span as a potential header.
+
+    Font-size bonuses and font-based levels are computed for all spans at
+    once with NumPy; the remaining text heuristics only run on spans whose
+    length can be a header. Returns candidates with score >= 3, in span order.
+    """
+    sizes = spans.size
+    bold = (spans.flags & 2**4) != 0  # Bold flag
+    lengths = spans.ends - spans.starts
+
+    # Font size bonus
+    size_bonus = np.where(sizes > avg_font_size * 1.1, 3, np.where(sizes > avg_font_size, 1, 0))
+
+    # Font-based level assignment (more conservative), as an index into FONT_LEVELS
+    font_level = np.select(
+        [
+            sizes >= max_font_size * 0.95,
+            sizes >= avg_font_size * 1.4,
+            sizes >= avg_font_size * 1.2,
+            sizes >= avg_font_size * 1.0,
+        ],
+        [0, np.where(bold, 0, 1), np.where(bold, 1, 2), 2],
+        default=3
+    )
+
+    base_score = size_bonus + np.where(bold, 2, 0)
+
+    # Per-span space/comma counts and trailing periods from the code points of all span text
+    codepoints = np.frombuffer(spans.text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    space_prefix = np.concatenate(([0], np.cumsum(codepoints == ord(' '))))
+    comma_prefix = np.concatenate(([0], np.cumsum(codepoints == ord(','))))
+    space_counts = space_prefix[spans.ends] - space_prefix[spans.starts]
+    comma_counts = comma_prefix[spans.ends] - comma_prefix[spans.starts]
+    ends_with_period = np.zeros(len(spans), dtype=bool)
+    if len(spans):
+        ends_with_period = codepoints[spans.ends - 1] == ord('.')
+
+    # Skip if clearly not a header
+    likely_header = (
+        (lengths >= 4) & (lengths <= 80)  # Too short / too long for a header
+        & (space_counts <= 12)  # Too many words (likely paragraph)
+        & ~(ends_with_period & (lengths > 30))  # Long sentences
+        & (comma_counts <= 3)  # Too many commas (likely sentence)
+    )
+
+    potential_headers = []
+    for i in np.flatnonzero(likely_header).tolist():
+        text = spans.span_text(i)
+        spaces = int(space_counts[i])
+
+        score = int(base_score[i])
+
+        # Structural patterns bonus
+        if NUMBERED_SECTION_RE.match(text):  # Numbered sections
+            score += 5
+        elif TITLE_CASE_RE.match(text):  # Title Case
+            score += 2
+        elif text.isupper() and len(text) > 6:  # ALL CAPS
+            score += 2
+
+        # Penalties for unlikely headers
+        if spaces > 8:  # Too many words
+            score -= 2
+        if len(text) > 60:  # Too long
+            score -= 3
+        if ends_with_period[i] and not NUMBERED_PREFIX_RE.match(text):  # Sentences (except numbered)
+            score -= 2
+
+        # Even the keyword bonus cannot lift this span to a header score
+        if score + 2 < 3:
+            continue
+
+        keywords = keyword_classes(text.lower())
+        if "exclude" in keywords:
+            continue
+        if "header" in keywords:  # Common header words bonus
+            score += 2
+
+        # Only consider items with decent scores
+        if score < 3:
+            continue
+
+        level = None
+        for pattern, pattern_level in LEVEL_PATTERNS:
+            if pattern.match(text):
+                level = pattern_level
+                break
+        if level is None:
+            if "h1" in keywords:
+                level = "H1"
+            elif "h2" in keywords:
+                level = "H2"
+            elif "h3" in keywords:
+                level = "H3"
+            else:
+                level = FONT_LEVELS[font_level[i]].item()
+
+        potential_headers.append({
+            "text": text,
+            "level": level,
+            "page": int(spans.page[i]),
+            "score": score,
+            "font_size": float(sizes[i])
+        })
+
+    return potential_headers
+
+def detect_outline_structure(doc, spans: Optional[SpanTable] = None) -> List[Dict[str, Any]]:
     """Extract document outline/structure from PDF using smart header detection"""
     outline = []
     
@@ -67,165 +408,22 @@ def detect_outline_structure(doc) -> List[Dict[str, Any]]:
         return outline
     
     # Strategy 2: Collect all text with font information for analysis
-    all_text_info = []
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        text_dict = page.get_text("dict")
-        
-        for block in text_dict.get("blocks", []):
-            if "lines" in block:
-                for line in block["lines"]:
-                    for span in line.get("spans", []):
-                        text = span.get("text", "").strip()
-                        if text and len(text) > 2:  # Ignore very short text
-                            all_text_info.append({
-                                "text": text,
-                                "font_size": span.get("size", 0),
-                                "flags": span.get("flags", 0),
-                                "page": page_num + 1,
-                                "font": span.get("font", ""),
-                                "bbox": span.get("bbox", [0, 0, 0, 0])  # For position analysis
-                            })
+    if spans is None:
+        spans = build_span_table(doc)
     
-    if not all_text_info:
+    if len(spans) == 0:
         return []
     
     # Calculate font size statistics
-    font_sizes = [item["font_size"] for item in all_text_info if item["font_size"] > 0]
+    font_sizes = spans.size[spans.size > 0].tolist()
     if not font_sizes:
         return []
     
     avg_font_size = sum(font_sizes) / len(font_sizes)
     max_font_size = max(font_sizes)
     
-    # Helper function to check if text looks like a header
-    def is_likely_header(text: str) -> bool:
-        """Check if text has characteristics of a header"""
-        # Exclude obvious non-headers
-        if len(text) > 80:  # Too long for a header
-            return False
-        if len(text) < 4:  # Too short
-            return False
-        if text.count(' ') > 12:  # Too many words (likely paragraph)
-            return False
-        if text.endswith('.') and len(text) > 30:  # Long sentences
-            return False
-        if any(word in text.lower() for word in ['the following', 'as shown', 'figure', 'table']):
-            return False
-        if text.count(',') > 3:  # Too many commas (likely sentence)
-            return False
-        return True
-    
-    # Helper function to determine header level
-    def get_header_level(text: str, font_size: float, is_bold: bool) -> str:
-        """Determine appropriate header level based on text characteristics"""
-        import re
-        
-        # Pattern-based level assignment (highest priority)
-        if re.match(r'^\d+\.\s+[A-Z]', text):  # "1. Introduction"
-            return "H1"
-        if re.match(r'^\d+\.\d+\s+[A-Z]', text):  # "1.1 Overview"
-            return "H2"
-        if re.match(r'^\d+\.\d+\.\d+\s+', text):  # "1.1.1 Details"
-            return "H3"
-        if re.match(r'^Chapter\s+\d+', text, re.IGNORECASE):
-            return "H1"
-        if re.match(r'^Section\s+\d+', text, re.IGNORECASE):
-            return "H2"
-        if re.match(r'^Appendix\s+[A-Z]', text, re.IGNORECASE):
-            return "H2"
-        
-        # Check for common H1 patterns
-        h1_patterns = ['introduction', 'conclusion', 'summary', 'overview', 'acknowledgement', 
-                      'table of contents', 'references', 'bibliography', 'abstract']
-        if any(pattern in text.lower() for pattern in h1_patterns):
-            return "H1"
-        
-        # Check for common H2 patterns  
-        h2_patterns = ['background', 'methodology', 'approach', 'evaluation', 'milestones',
-                      'business outcomes', 'content', 'timeline', 'funding', 'requirements']
-        if any(pattern in text.lower() for pattern in h2_patterns):
-            return "H2"
-        
-        # Check for common H3 patterns
-        h3_patterns = ['access', 'guidance', 'training', 'support', 'phase', 'preamble',
-                      'membership', 'term', 'chair', 'meetings', 'criteria', 'process']
-        if any(pattern in text.lower() for pattern in h3_patterns):
-            return "H3"
-        
-        # Font-based level assignment (more conservative)
-        if font_size >= max_font_size * 0.95:
-            return "H1"
-        elif font_size >= avg_font_size * 1.4:
-            return "H1" if is_bold else "H2"
-        elif font_size >= avg_font_size * 1.2:
-            return "H2" if is_bold else "H3"
-        elif font_size >= avg_font_size * 1.0:
-            return "H3"
-        else:
-            return "H4"
-    
     # Strategy 3: Smart header detection
-    potential_headers = []
-    
-    for item in all_text_info:
-        text = item["text"]
-        font_size = item["font_size"]
-        font_flags = item["flags"]
-        page = item["page"]
-        is_bold = bool(font_flags & 2**4)  # Bold flag
-        
-        # Skip if clearly not a header
-        if not is_likely_header(text):
-            continue
-        
-        # Calculate header score
-        score = 0
-        
-        # Font size bonus
-        if font_size > avg_font_size * 1.1:
-            score += 3
-        elif font_size > avg_font_size:
-            score += 1
-        
-        # Bold text bonus
-        if is_bold:
-            score += 2
-        
-        # Structural patterns bonus
-        import re
-        if re.match(r'^\d+[\.\)]\s+\w', text):  # Numbered sections
-            score += 5
-        elif re.match(r'^[A-Z][a-z]+(\s+[A-Z][a-z]+)*$', text):  # Title Case
-            score += 2
-        elif text.isupper() and len(text) > 6:  # ALL CAPS
-            score += 2
-        
-        # Common header words bonus
-        header_words = ['introduction', 'conclusion', 'summary', 'overview', 'background',
-                       'methodology', 'results', 'discussion', 'abstract', 'references',
-                       'contents', 'index', 'glossary', 'acknowledgments', 'preface']
-        if any(word in text.lower() for word in header_words):
-            score += 2
-        
-        # Penalties for unlikely headers
-        if text.count(' ') > 8:  # Too many words
-            score -= 2
-        if len(text) > 60:  # Too long
-            score -= 3
-        if text.endswith('.') and not re.match(r'^\d+\.', text):  # Sentences (except numbered)
-            score -= 2
-        
-        # Only consider items with decent scores
-        if score >= 3:
-            level = get_header_level(text, font_size, is_bold)
-            potential_headers.append({
-                "text": text,
-                "level": level,
-                "page": page,
-                "score": score,
-                "font_size": font_size
-            })
+    potential_headers = score_header_candidates(spans, avg_font_size, max_font_size)
     
     # Sort by score and font size, then select best headers
     potential_headers.sort(key=lambda x: (-x["score"], -x["font_size"]))
@@ -279,8 +477,147 @@ def detect_outline_structure(doc) -> List[Dict[str, Any]]:
     # Sort final outline by page and hierarchy
     return sorted(outline, key=lambda x: (x["page"], x["text"]))
 
-def process_single_pdf(pdf_path: Path) -> Dict[str, Any]:
-    """Process a single PDF file and extract structured data"""
+def split_passages(text: str, max_chars: int = PASSAGE_MAX_CHARS) -> List[str]:
+    """Split text into passages of at most max_chars, preferring sentence then word breaks"""
+    passages = []
+    text = text.strip()
+    while len(text) > max_chars:
+        cut = text.rfind('. ', 0, max_chars)
+        if cut < max_chars // 2:
+            cut = text.rfind(' ', 0, max_chars)
+        if cut <= 0:
+            cut = max_chars - 1
+        passages.append(text[:cut + 1].strip())
+        text = text[cut + 1:].lstrip()
+    if text:
+        passages.append(text)
+    return passages
+
+def normalize_line(text: str) -> str:
+    """Lowercased text with runs of whitespace collapsed, for comparing headings with lines"""
+    return " ".join(text.split()).lower()
+
+def find_heading_line(heading: str, lines: List[str], used_lines: set) -> int:
+    """
+    Index of the unused line holding a heading, or -1.
+
+    A line equal to the heading (after normalize_line) wins; otherwise a line
+    that starts with it at a word boundary, for headings set in several spans
+    of one line. A bare substring never matches, so a short heading such as
+    "Index" does not claim an unrelated body line.
+    """
+    target = normalize_line(heading)
+    if not target:
+        return -1
+    normalized = [(i, normalize_line(line)) for i, line in enumerate(lines) if i not in used_lines]
+    for line_index, line in normalized:
+        if line == target:
+            return line_index
+    for line_index, line in normalized:
+        if line.startswith(target) and not line[len(target)].isalnum():
+            return line_index
+    return -1
+
+def iter_section_passages(
+    doc,
+    outline: List[Dict[str, Any]],
+    one_based_pages: bool = False,
+    leading_title: str = "",
+    max_chars: int = PASSAGE_MAX_CHARS,
+    spans: Optional[SpanTable] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the body text under each outline entry as bounded-size passages.
+
+    Lines come from the SpanTable already extracted for title and outline
+    detection (or, without one, from a span table built one page at a time).
+    Each outline heading is located on its page (see find_heading_line) and
+    every line up to the next heading belongs to its section. Bodies are
+    flushed in passages of at most max_chars as they grow. Text before the
+    first heading is emitted under leading_title. Yields {"title", "page",
+    "content"} dicts whose "page" uses the same numbering as the outline.
+    """
+    page_offset = 1 if one_based_pages else 0
+    last_page = len(doc) - 1
+
+    # Outline entries grouped by the 0-based page they start on
+    entries_by_page: Dict[int, List[Dict[str, Any]]] = {}
+    for item in outline:
+        if not isinstance(item, dict):
+            continue
+        page_value = item.get("page", 0) or 0
+        page_index = min(max(page_value - page_offset, 0), last_page)
+        entries_by_page.setdefault(page_index, []).append(item)
+
+    current = {"title": leading_title, "page": page_offset, "heading": None}
+    buffer: List[str] = []
+    buffer_len = 0
+    buffer_page = 0
+
+    def flush(final: bool):
+        """Emit full passages from the buffer; on final, emit the remainder too"""
+        nonlocal buffer, buffer_len
+        body = " ".join(buffer)
+        passages = split_passages(body, max_chars) if body else []
+        keep = "" if final or not passages else passages.pop()
+        for passage in passages:
+            yield {"title": current["title"], "page": buffer_page + page_offset, "content": passage}
+        buffer = [keep] if keep else []
+        buffer_len = len(keep)
+
+    def close_section():
+        """Flush the current section; headings with no body keep their own text"""
+        emitted = False
+        for passage in flush(final=True):
+            emitted = True
+            yield passage
+        if not emitted and current["heading"] is not None:
+            yield {"title": current["title"], "page": current["page"], "content": current["heading"]}
+
+    for page_index in range(len(doc)):
+        if spans is not None:
+            lines = spans.page_lines(page_index + 1)
+        else:
+            lines = build_span_table(doc, pages=[page_index]).page_lines(page_index + 1)
+
+        # Locate this page's headings; one not found on its page starts at the page start
+        starts: Dict[int, List[Dict[str, Any]]] = {}
+        used_lines = set()
+        for item in entries_by_page.get(page_index, []):
+            position = find_heading_line(str(item.get("text", "")), lines, used_lines)
+            if position >= 0:
+                used_lines.add(position)
+            starts.setdefault(position, []).append(item)
+
+        for line_index in [-1] + list(range(len(lines))):
+            for item in starts.get(line_index, []):
+                yield from close_section()
+                heading = str(item.get("text", "")).strip()
+                current = {"title": item.get("text", ""), "page": item.get("page", 0), "heading": heading}
+                buffer, buffer_len, buffer_page = [], 0, page_index
+            if line_index < 0 or line_index in used_lines:
+                continue  # Heading lines are the section title, not its body
+
+            if not buffer:
+                buffer_page = page_index
+            buffer.append(lines[line_index])
+            buffer_len += len(lines[line_index]) + 1
+            if buffer_len > max_chars * 2:
+                yield from flush(final=False)
+                buffer_page = page_index
+
+    yield from close_section()
+
+def process_single_pdf(pdf_path: Path, with_sections: bool = False, page_workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Process a single PDF file and extract structured data.
+
+    With with_sections=True the result also carries "sections": the body text
+    under each outline entry, split into passages (see iter_section_passages).
+    page_workers overrides PDF_PAGE_WORKERS; callers already running in a
+    process pool pass 1 (see the module docstring).
+    """
+    page_workers = PAGE_WORKERS if page_workers is None else page_workers
     try:
         print(f"🔄 Opening PDF: {pdf_path}")
         doc = fitz.open(pdf_path)
@@ -296,10 +633,25 @@ def process_single_pdf(pdf_path: Path) -> Dict[str, Any]:
                 "outline": []
             }
         
+        # Single extraction pass shared by title, outline and section detection
+        # (a bookmarked PDF only needs its first page for the title)
+        spans = None
+        has_toc = bool(doc.get_toc())
+        try:
+            if has_toc and not with_sections:
+                spans = build_span_table(doc, pages=[0])
+            elif len(doc) >= PARALLEL_PAGE_THRESHOLD and page_workers > 1:
+                print(f"📄 Extracting {len(doc)} pages with {page_workers} workers...")
+                spans = build_span_table_parallel(pdf_path, len(doc), page_workers)
+            else:
+                spans = build_span_table(doc)
+        except Exception as e:
+            print(f"⚠️ Span extraction failed: {e}")
+        
         # Extract title with fallback
-        print(f"📝 Extracting title...")
+        print("📝 Extracting title...")
         try:
-            title = extract_title(doc)
+            title = extract_title(doc, spans)
             if not title or title.strip() == "":
                 title = pdf_path.stem + "  "  # Use filename as fallback with trailing spaces
             print(f"📝 Extracted title: '{title}'")
@@ -308,39 +660,64 @@ def process_single_pdf(pdf_path: Path) -> Dict[str, Any]:
             title = pdf_path.stem + "  "
         
         # Extract outline with fallback
-        print(f"📊 Detecting outline structure...")
+        print("📊 Detecting outline structure...")
         try:
-            outline = detect_outline_structure(doc)
+            outline = detect_outline_structure(doc, spans)
             print(f"📊 Found {len(outline)} outline items")
         except Exception as e:
             print(f"⚠️ Outline extraction failed, creating basic structure: {e}")
             # Create basic outline from page count
             outline = []
-            for i in range(min(len(doc), 10)):  # Max 10 pages for basic outline
-                try:
-                    page = doc[i]
-                    page_text = page.get_text()[:100]  # First 100 chars
-                    if page_text.strip():
+            if spans is not None:
+                for page_number in spans.pages_with_text():
+                    if page_number <= 10:  # Max 10 pages for basic outline
                         outline.append({
-                            "text": f"Page {i+1}",
-                            "page": i
+                            "text": f"Page {page_number}",
+                            "page": page_number - 1
                         })
-                except:
-                    continue
-        
-        doc.close()
+            else:
+                for i in range(min(len(doc), 10)):  # Max 10 pages for basic outline
+                    try:
+                        page = doc[i]
+                        page_text = page.get_text()[:100]  # First 100 chars
+                        if page_text.strip():
+                            outline.append({
+                                "text": f"Page {i+1}",
+                                "page": i
+                            })
+                    except:
+                        continue
         
         # Ensure we have at least some content
         if not outline and title:
             outline = [{"text": title.strip(), "page": 0}]
         
+        # Gather section bodies between outline entries
+        sections = None
+        if with_sections:
+            print("📚 Building section passages...")
+            try:
+                sections = list(iter_section_passages(
+                    doc, outline,
+                    one_based_pages=has_toc,
+                    leading_title=title.strip(),
+                    spans=spans
+                ))
+                print(f"📚 Built {len(sections)} passages")
+            except Exception as e:
+                print(f"⚠️ Section body extraction failed, using headings only: {e}")
+        
+        doc.close()
+        
         # Return success result with explicit success flag
         result = {
             "success": True,
             "title": title,
             "outline": outline
         }
-        print(f"✅ PDF processing completed successfully")
+        if sections is not None:
+            result["sections"] = sections
+        print("✅ PDF processing completed successfully")
         return result
     
     except Exception as e:
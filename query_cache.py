@@ -0,0 +1,116 @@
+"""
+Bounded in-memory LRU caches for /connect-dots
+
+Two caches sit in front of the search path:
+
+- query embeddings, keyed on the embedding model and the
+  whitespace-normalized selected text + context, so a repeated selection
+  skips the model forward pass
+- ranked results, keyed on the normalized query, its options and the
+  library generation, so a re-render skips ranking entirely
+
+Normalization only collapses whitespace: EMBEDDING_MODEL is configurable
+and a cased model embeds "US" and "us" differently, so case is kept.
+
+Both are bounded by entry count and by approximate payload bytes, and
+count hits, misses and evictions.
+
+Environment Variables:
+QUERY_CACHE_ENTRIES (default: 2048), QUERY_CACHE_MB (default: 16)
+    - Query embedding cache bounds
+RESULT_CACHE_ENTRIES (default: 1024), RESULT_CACHE_MB (default: 32)
+    - Ranked result cache bounds
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+def normalize_query_text(text: Optional[str]) -> str:
+    """Collapse whitespace so trivially different selections share an entry"""
+    return " ".join((text or "").split())
+
+
+def embedding_cache_key(model_name: str, text: Optional[str]) -> tuple:
+    """Embedding cache key: the model that computes the vector plus the normalized text"""
+    return (model_name, normalize_query_text(text))
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate payload bytes of a cached value"""
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is not None:
+        return int(nbytes)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value.values())
+    if hasattr(value, "__dict__"):
+        return estimate_size(vars(value))
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by entry count and approximate size in bytes"""
+
+    def __init__(self, name: str, max_entries: int, max_bytes: int, sizeof: Callable[[Any], int] = estimate_size):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_entries <= 0:
+            return
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return  # Never let one oversized value flush the whole cache
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
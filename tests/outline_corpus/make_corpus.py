@@ -0,0 +1,108 @@
+"""
+Regenerate the outline regression corpus
+
+Writes small synthetic PDFs (docN.pdf) that exercise the header heuristics
+of process_pdfs.py: numbering schemes, title case, ALL CAPS, overlapping
+keywords, exclusion words, trailing periods, comma-heavy lines, bold and
+large fonts, an embedded TOC and a metadata title.
+
+    python tests/outline_corpus/make_corpus.py            # PDFs only
+    python tests/outline_corpus/make_corpus.py --baseline  # also rewrite docN.json
+
+--baseline records the current process_single_pdf output as the expected
+outlines. Only use it for an intentional change to outline detection; the
+committed baselines were produced by the scorer that predates
+score_header_candidates.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+from pathlib import Path
+
+import fitz
+
+CORPUS_DIR = Path(__file__).resolve().parent
+
+WORDS = (
+    "the data system model analysis results method approach process training support "
+    "overview phase criteria access term chair review design content determine guidance"
+).split()
+
+HEADINGS = [
+    "1. Introduction", "1.1 Overview", "1.1.1 Details here", "2) Evaluation plan", "3. results",
+    "Chapter 3 Methods", "Section 2 Scope", "Appendix A Forms", "Appendix b notes",
+    "BACKGROUND AND CONTEXT", "SCOPE", "Results Discussion", "Summary Of Findings",
+    "Funding Timeline", "Membership Criteria", "Table 4 shows things", "As shown below",
+    "Preface", "Glossary Terms", "Final Remarks.", "Table of Contents", "Contents",
+    "Business Outcomes", "Acknowledgements", "Meetings Of The Chair", "Training Support",
+    "Résumé Overview", "Über Methodology", "Preamble", "Requirements And Milestones",
+    "The following is a long sentence, with, many, commas, here",
+    "A heading that keeps going with far too many words to be a real header at all",
+    "Abstract", "References", "Bibliography", "Index",
+]
+
+
+def body_line(rng: random.Random) -> str:
+    words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 14)))
+    return words.capitalize() + rng.choice([".", "", ","])
+
+
+def make_document(n: int, rng: random.Random) -> fitz.Document:
+    doc = fitz.open()
+    for _ in range(rng.randint(1, 4)):
+        page = doc.new_page()
+        y = 60
+        if rng.random() < 0.5:
+            page.insert_text((50, y), rng.choice(HEADINGS), fontsize=rng.choice([20, 24, 28]), fontname="hebo")
+            y += 36
+        for _ in range(rng.randint(6, 24)):
+            if rng.random() < 0.35:
+                text = rng.choice(HEADINGS)
+                size = rng.choice([12, 14, 16, 18, 24])
+                font = rng.choice(["helv", "hebo", "tibo"])
+            else:
+                text = body_line(rng)
+                size = rng.choice([9, 10, 10, 11])
+                font = rng.choice(["helv", "tiro"])
+            page.insert_text((50, y), text, fontsize=size, fontname=font)
+            y += size + 8
+            if y > 780:
+                break
+    if n == 3:
+        doc.set_toc([[1, "Intro", 1], [2, "Sub", 1]])
+    if n == 5:
+        doc.set_metadata({"title": "Meta Title"})
+    return doc
+
+
+def expected_outline(pdf_path: Path) -> str:
+    """process_single_pdf's title and outline, serialized as stored in docN.json"""
+    sys.path.insert(0, str(CORPUS_DIR.parent.parent))
+    import process_pdfs
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = process_pdfs.process_single_pdf(pdf_path)
+    return json.dumps({"title": result["title"], "outline": result["outline"]}, indent=2, ensure_ascii=False) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate the outline regression corpus")
+    parser.add_argument("--documents", type=int, default=8)
+    parser.add_argument("--baseline", action="store_true", help="Rewrite the expected outlines from the current code")
+    args = parser.parse_args()
+
+    rng = random.Random(2025)
+    for n in range(args.documents):
+        path = CORPUS_DIR / f"doc{n}.pdf"
+        make_document(n, rng).save(path, garbage=4, deflate=True)
+        if args.baseline:
+            path.with_suffix(".json").write_text(expected_outline(path), encoding="utf-8")
+        print(f"✅ {path.name}")
+
+
+if __name__ == "__main__":
+    main()
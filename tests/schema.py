@@ -0,0 +1,54 @@
+"""Test copies of the tables defined in main.py (importing main starts the whole app)"""
+
+from sqlalchemy import Column, DateTime, Float, Integer, LargeBinary, String, Text
+from sqlalchemy.orm import declarative_base
+
+Base = declarative_base()
+
+
+class Document(Base):
+    __tablename__ = "documents"
+
+    id = Column(String, primary_key=True)
+    filename = Column(String, nullable=False)
+    original_filename = Column(String, nullable=False)
+    file_path = Column(String, nullable=False)
+    upload_time = Column(DateTime, index=True)
+    title = Column(String)
+    outline = Column(Text)
+    total_sections = Column(Integer, default=0)
+    file_size = Column(Integer)
+    processing_status = Column(String, default="pending", index=True)
+    content_hash = Column(String, index=True)
+
+
+class DocumentSection(Base):
+    __tablename__ = "document_sections"
+
+    id = Column(String, primary_key=True)
+    document_id = Column(String, nullable=False, index=True)
+    section_title = Column(String, nullable=False)
+    section_content = Column(Text, nullable=False)
+    section_number = Column(Integer)
+    page_number = Column(Integer)
+    embedding = Column(Text)
+    embedding_blob = Column(LargeBinary)
+    embedding_dtype = Column(String)
+    snippet = Column(Text)
+    search_rowid = Column(Integer, index=True, unique=True)
+
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(String, primary_key=True)
+    document_id = Column(String, nullable=False, index=True)
+    file_path = Column(String, nullable=False)
+    state = Column(String, default="queued", index=True)
+    attempts = Column(Integer, default=0)
+    lease_owner = Column(String)
+    lease_expires_at = Column(Float)
+    last_error = Column(Text)
+    created_at = Column(Float)
+    started_at = Column(Float)
+    finished_at = Column(Float)
@@ -0,0 +1,132 @@
+"""JobQueue lease ownership and lease expiry, on SQLite"""
+
+import time
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from db_engine import create_database_engine
+from document_store import DocumentStore
+from ingestion import JobQueue, Lease, LeaseLost
+from schema import Base, Document, DocumentSection, IngestionJob
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+def add_document(session_factory, document_id, status="pending"):
+    db = session_factory()
+    try:
+        db.add(Document(
+            id=document_id, filename=f"{document_id}.pdf", original_filename=f"{document_id}.pdf",
+            file_path=f"uploads/{document_id}.pdf", processing_status=status
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def job_row(session_factory, job_id):
+    db = session_factory()
+    try:
+        return db.query(IngestionJob).filter(IngestionJob.id == job_id).one()
+    finally:
+        db.close()
+
+
+def document_status(session_factory, document_id):
+    db = session_factory()
+    try:
+        return db.query(Document.processing_status).filter(Document.id == document_id).scalar()
+    finally:
+        db.close()
+
+
+def expire_lease(session_factory, job_id):
+    db = session_factory()
+    try:
+        db.query(IngestionJob).filter(IngestionJob.id == job_id).update({"lease_expires_at": time.time() - 1})
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_only_the_lease_holder_can_record_results(session_factory):
+    queue = JobQueue(session_factory, IngestionJob, lease_seconds=60, max_attempts=3, document_model=Document)
+    job_id = queue.enqueue("doc", "uploads/doc.pdf")
+
+    claimed_id, document_id, file_path, first_token = queue.claim()
+    assert (claimed_id, document_id, file_path) == (job_id, "doc", "uploads/doc.pdf")
+
+    # The first worker stalls past its lease and a second worker takes the job over
+    expire_lease(session_factory, job_id)
+    _, _, _, second_token = queue.claim()
+    assert second_token != first_token
+
+    assert not queue.renew(job_id, first_token)
+    assert not queue.complete(job_id, first_token)
+    assert queue.fail(job_id, first_token, "stale worker") is None
+    job = job_row(session_factory, job_id)
+    assert (job.state, job.lease_owner, job.attempts) == ("running", second_token, 2)
+
+    assert queue.renew(job_id, second_token)
+    assert queue.complete(job_id, second_token)
+    assert job_row(session_factory, job_id).state == "completed"
+
+
+def test_failed_attempts_are_retried_until_exhausted(session_factory):
+    queue = JobQueue(session_factory, IngestionJob, lease_seconds=60, max_attempts=2, document_model=Document)
+    add_document(session_factory, "doc", status="processing")
+    job_id = queue.enqueue("doc", "uploads/doc.pdf")
+
+    *_, token = queue.claim()
+    assert queue.fail(job_id, token, "first") == "queued"
+    # Still being worked on: not reported failed, and still found by duplicate lookup
+    assert document_status(session_factory, "doc") == "processing"
+    *_, token = queue.claim()
+    assert queue.fail(job_id, token, "second") == "failed"
+    assert document_status(session_factory, "doc") == "failed"
+    assert queue.claim() is None
+
+
+def test_document_writes_are_fenced_by_the_lease(session_factory):
+    queue = JobQueue(session_factory, IngestionJob, lease_seconds=60, max_attempts=3, document_model=Document)
+    store = DocumentStore(session_factory, Document, DocumentSection)
+    store.prepare()
+    add_document(session_factory, "doc", status="processing")
+    job_id = queue.enqueue("doc", "uploads/doc.pdf")
+    *_, first_token = queue.claim()
+    stale = Lease(queue, job_id, first_token)
+
+    expire_lease(session_factory, job_id)
+    *_, second_token = queue.claim()
+    store.save_processed("doc", "New owner", "[]", [], lease=Lease(queue, job_id, second_token))
+
+    with pytest.raises(LeaseLost):
+        store.save_processed("doc", "Stale worker", "[]", [], lease=stale)
+    with pytest.raises(LeaseLost):
+        store.set_status("doc", "failed", lease=stale)
+    assert store.get("doc").title == "New owner"
+    assert document_status(session_factory, "doc") == "completed"
+
+
+def test_final_lease_expiry_fails_job_and_document(session_factory):
+    queue = JobQueue(session_factory, IngestionJob, lease_seconds=60, max_attempts=1, document_model=Document)
+    add_document(session_factory, "doc", status="processing")
+    add_document(session_factory, "other", status="processing")
+    job_id = queue.enqueue("doc", "uploads/doc.pdf")
+    queue.claim()
+
+    expire_lease(session_factory, job_id)
+    assert queue.claim() is None
+
+    job = job_row(session_factory, job_id)
+    assert (job.state, job.last_error) == ("failed", "Lease expired on final attempt")
+    assert document_status(session_factory, "doc") == "failed"
+    assert document_status(session_factory, "other") == "processing"
+    assert not queue.has_open_job("doc")
@@ -0,0 +1,75 @@
+"""SQLite FTS5 keyword index: hits must keep pointing at their sections across VACUUM"""
+
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from db_engine import create_database_engine
+from document_store import DocumentStore
+from keyword_index import FTS_TABLE, TRIGGERS, ensure_keyword_index
+from schema import Base, Document, DocumentSection
+
+
+def make_store(path):
+    engine = create_database_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    assert ensure_keyword_index(engine)
+    store = DocumentStore(sessionmaker(autocommit=False, autoflush=False, bind=engine), Document, DocumentSection)
+    store.prepare()
+    return engine, store
+
+
+def add_document(store, document_id, sections):
+    store.add(
+        id=document_id, filename=f"{document_id}.pdf", original_filename=f"{document_id}.pdf",
+        file_path=f"uploads/{document_id}.pdf", upload_time=datetime(2024, 1, 1),
+        content_hash=document_id, processing_status="processing"
+    )
+    store.save_processed(document_id, document_id, "[]", [{
+        "id": section_id, "document_id": document_id, "section_title": title,
+        "section_content": content, "section_number": number, "page_number": 1
+    } for number, (section_id, title, content) in enumerate(sections, start=1)])
+
+
+def hits(store, query):
+    return [section_id for section_id, _ in store.keyword_search(query, limit=10)]
+
+
+def test_hits_survive_vacuum(tmp_path):
+    engine, store = make_store(tmp_path / "fts.db")
+    for i in range(20):
+        add_document(store, f"doc{i}", [(f"s{i}-{j}", f"Heading {i}", f"filler{i} body{j} text") for j in range(3)])
+    for i in range(0, 20, 2):
+        store.remove(f"doc{i}")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM"))
+        # VACUUM may renumber the implicit rowid of a table without an INTEGER PRIMARY KEY
+        conn.execute(text("UPDATE document_sections SET rowid = rowid + 1000"))
+    add_document(store, "late", [("late-0", "Late", "zebra crossing")])
+
+    assert set(hits(store, "filler7")) == {"s7-0", "s7-1", "s7-2"}
+    assert hits(store, "filler4") == []
+    assert hits(store, "zebra") == ["late-0"]
+    engine.dispose()
+
+
+def test_index_on_implicit_rowid_is_rebuilt(tmp_path):
+    engine, store = make_store(tmp_path / "old.db")
+    add_document(store, "doc", [("s1", "Alpha", "apples"), ("s2", "Beta", "bananas")])
+    with engine.begin() as conn:
+        # Recreate the index the way earlier versions did, keyed on the implicit rowid
+        for trigger_name in TRIGGERS:
+            conn.execute(text(f"DROP TRIGGER {trigger_name}"))
+        conn.execute(text(f"DROP TABLE {FTS_TABLE}"))
+        conn.execute(text("UPDATE document_sections SET search_rowid = NULL"))
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(section_title, section_content, "
+            "content='document_sections', content_rowid='rowid')"
+        ))
+
+    assert ensure_keyword_index(engine)
+    assert hits(store, "bananas") == ["s2"]
+    add_document(store, "more", [("s3", "Gamma", "cherries")])
+    assert hits(store, "cherries") == ["s3"]
+    engine.dispose()
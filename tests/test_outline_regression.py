@@ -0,0 +1,46 @@
+"""
+Outline regression tests for process_pdfs.py
+
+tests/outline_corpus holds small synthetic PDFs and, next to each, the
+title and outline produced by the header scorer that predates the
+precompiled score_header_candidates / keyword automaton. The current code
+must reproduce them byte for byte. Regenerate the corpus with
+tests/outline_corpus/make_corpus.py.
+"""
+
+import contextlib
+import io
+import json
+import random
+from pathlib import Path
+
+import pytest
+
+from process_pdfs import KEYWORD_CLASSES, keyword_classes, process_single_pdf
+
+CORPUS_DIR = Path(__file__).resolve().parent / "outline_corpus"
+CORPUS = sorted(CORPUS_DIR.glob("doc*.pdf"))
+
+
+def test_corpus_present():
+    assert CORPUS and all(pdf.with_suffix(".json").exists() for pdf in CORPUS)
+
+
+@pytest.mark.parametrize("pdf_path", CORPUS, ids=[pdf.stem for pdf in CORPUS])
+def test_outline_matches_baseline(pdf_path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = process_single_pdf(pdf_path)
+    actual = json.dumps({"title": result["title"], "outline": result["outline"]}, indent=2, ensure_ascii=False) + "\n"
+    assert actual == pdf_path.with_suffix(".json").read_text(encoding="utf-8")
+
+
+def test_keyword_automaton_matches_substring_scans():
+    # The previous scorer ran `any(word in text.lower() for word in words)` per class
+    keywords = [word for words in KEYWORD_CLASSES.values() for word in words]
+    fragments = keywords + ["", " ", "s", "de", "x", "tables", "contents", "determine", "phased", "é"]
+    rng = random.Random(0)
+    texts = [word for word in keywords]
+    texts += ["".join(rng.choice(fragments) for _ in range(rng.randint(1, 6))) for _ in range(3000)]
+    for text in texts:
+        expected = {name for name, words in KEYWORD_CLASSES.items() if any(word in text for word in words)}
+        assert keyword_classes(text) == expected, text
@@ -0,0 +1,198 @@
+"""
+PostgreSQL backend tests: pgvector search, tsvector keyword search,
+SKIP LOCKED job claims and the document store.
+
+Runs against TEST_DATABASE_URL when it is set (any disposable PostgreSQL
+with the pgvector extension), otherwise against a throwaway server started
+with pgserver (pip install pgserver psycopg2-binary). Skipped when neither
+is available.
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from db_engine import create_database_engine
+from document_store import DocumentStore
+from ingestion import JobQueue
+from keyword_index import ensure_keyword_index
+from schema import Base, Document, DocumentSection, IngestionJob
+from storage import PgVectorIndex, pgvector_available
+
+DIM = 8
+
+
+@pytest.fixture(scope="module")
+def database_url(tmp_path_factory):
+    url = os.getenv("TEST_DATABASE_URL")
+    if url:
+        yield url
+        return
+    pgserver = pytest.importorskip("pgserver")
+    pytest.importorskip("psycopg2")
+    server = pgserver.get_server(str(tmp_path_factory.mktemp("pgdata")), cleanup_mode="stop")
+    uri = server.get_uri()
+    yield uri.replace("postgresql://", "postgresql+psycopg2://", 1)
+    server.cleanup()
+
+
+@pytest.fixture(scope="module")
+def engine(database_url):
+    engine = create_database_engine(database_url)
+    if not pgvector_available(engine):
+        pytest.skip("pgvector extension not installed")
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS documents, document_sections, ingestion_jobs, library_changes"))
+    Base.metadata.create_all(bind=engine)
+    assert ensure_keyword_index(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    with engine.begin() as conn:
+        conn.execute(text("TRUNCATE documents, document_sections, ingestion_jobs"))
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def store(session_factory):
+    store = DocumentStore(session_factory, Document, DocumentSection, generation_ttl=0)
+    store.prepare()
+    return store
+
+
+@pytest.fixture
+def index(engine):
+    index = PgVectorIndex(engine, dim=DIM)
+    index.prepare()
+    return index
+
+
+def add_document(store, document_id, upload_time, sections, status="completed", file_path=None):
+    store.add(
+        id=document_id, filename=f"{document_id}.pdf", original_filename=f"{document_id}.pdf",
+        file_path=file_path or f"uploads/{document_id}.pdf", upload_time=upload_time,
+        content_hash=document_id, processing_status="processing"
+    )
+    rows = [{
+        "id": section_id,
+        "document_id": document_id,
+        "section_title": title,
+        "section_content": content,
+        "section_number": number,
+        "page_number": page,
+        "embedding_blob": b"\0" * 4 * DIM,
+        "embedding_dtype": "float32",
+        "snippet": content[:40]
+    } for number, (section_id, title, content, page) in enumerate(sections, start=1)]
+    store.save_processed(document_id, document_id.upper(), "[]", rows)
+    if status != "completed":
+        store.set_status(document_id, status)
+
+
+def test_document_store_pages_and_generation(store, session_factory):
+    other_node = DocumentStore(session_factory, Document, DocumentSection, generation_ttl=0)
+    start = other_node.generation
+    base = datetime(2024, 1, 1)
+    for i in range(5):
+        add_document(store, f"doc{i}", base + timedelta(minutes=i), [(f"s{i}", "Title", "Body text", 1)])
+    assert other_node.generation == start + 5
+
+    seen, after = [], None
+    while True:
+        page = store.list_documents(limit=2, after=after, include_outline=False)
+        if not page:
+            break
+        seen.extend(document.id for document in page)
+        last = page[-1]
+        after = (str(last.upload_time), last.id)
+    assert seen == [f"doc{i}" for i in reversed(range(5))]
+
+    assert [section.id for section in store.sections("doc3")] == ["s3"]
+    removed, file_path, file_shared = store.remove("doc3")
+    assert (removed, file_path, file_shared) == (1, "uploads/doc3.pdf", False)
+    assert store.get("doc3") is None
+    assert other_node.generation == start + 6
+
+
+def test_pgvector_search_matches_exact_scores(store, index):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, DIM)).astype(np.float32)
+    section_ids = [f"v{i}" for i in range(len(vectors))]
+    add_document(store, "vectors", datetime(2024, 1, 1), [(section_id, "T", "C", 1) for section_id in section_ids])
+    add_document(store, "pending", datetime(2024, 1, 2), [("p0", "T", "C", 1)], status="processing")
+
+    generation = index.generation
+    assert index.add(section_ids, ["vectors"] * len(section_ids), vectors) == 200
+    index.add(["p0"], ["pending"], vectors[:1])
+    assert index.generation > generation
+    assert len(index) == 201
+
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    query = rng.normal(size=DIM).astype(np.float32)
+    expected = normalized @ (query / np.linalg.norm(query))
+    top = np.argsort(-expected)[:5]
+
+    hits = index.search(query, k=5, exact=True)
+    assert [section_id for section_id, _ in hits] == [section_ids[i] for i in top]
+    assert np.allclose([score for _, score in hits], expected[top], atol=1e-5)
+    assert "p0" not in {section_id for section_id, _ in index.search(vectors[0], k=5)}
+
+    batch = index.search_batch(np.vstack([query, vectors[7]]), k=3, exact=True)
+    assert batch[0] == hits[:3]
+    assert batch[1][0][0] == "v7"
+
+    scores = index.score_sections(query, ["v1", "v2", "missing"])
+    assert set(scores) == {"v1", "v2"}
+    assert scores["v1"] == pytest.approx(float(expected[1]), abs=1e-5)
+
+    assert index.remove_sections(["v1"]) == 1
+    assert index.remove_document("vectors") == 199
+    assert len(index) == 1
+    assert index.search(query, k=5, exact=True) == []
+
+
+def test_keyword_search_on_postgres(store):
+    add_document(store, "budget", datetime(2024, 1, 1), [
+        ("b1", "Budget timeline", "Funding for phase two of the budget", 1),
+        ("b2", "Appendix", "Membership forms", 4)
+    ])
+    add_document(store, "other", datetime(2024, 2, 1), [("o1", "Budget notes", "Unrelated text", 2)])
+
+    hits = store.keyword_search("budget phase", limit=5)
+    assert [section_id for section_id, _ in hits][:2] == ["b1", "o1"]
+    assert all(score > 0 for _, score in hits)
+    assert [section_id for section_id, _ in store.keyword_search("budget", limit=5, document_ids=["other"])] == ["o1"]
+    assert [section_id for section_id, _ in store.keyword_search("membership", limit=5, page_from=2)] == ["b2"]
+    assert store.keyword_search("budget", limit=5, uploaded_before=datetime(2023, 1, 1)) == []
+
+
+def test_job_queue_claims_with_skip_locked(session_factory):
+    queue = JobQueue(session_factory, IngestionJob, lease_seconds=60, max_attempts=3)
+    job_ids = {queue.enqueue(f"doc{i}", f"uploads/doc{i}.pdf") for i in range(8)}
+
+    claimed, barrier = [], threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        job = queue.claim()
+        if job is not None:
+            claimed.append(job[0])
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Concurrent workers never claim the same job
+    assert len(claimed) == len(set(claimed)) == 8
+    assert set(claimed) <= job_ids
+    assert queue.backlog() == 8
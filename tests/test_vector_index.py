@@ -0,0 +1,51 @@
+"""
+IVF training in vector_index.py
+
+Training runs on a background thread over a snapshot of the rows; the
+index keeps answering searches from its previous state until the new lists
+are swapped in.
+"""
+
+import numpy as np
+
+from vector_index import IVFIndex
+
+
+def make_index(rows: int, seed: int = 0, **kwargs) -> IVFIndex:
+    index = IVFIndex(nprobe=4, nlist=16, min_train_size=200, **kwargs)
+    vectors = np.random.default_rng(seed).normal(size=(rows, 16))
+    index.add([f"s{i}" for i in range(rows)], [f"d{i % 5}" for i in range(rows)], vectors)
+    return index
+
+
+def test_trains_in_background_and_swaps_lists_in():
+    index = make_index(300)
+    assert index.wait_for_training(timeout=30)
+    assert index.trained and index.stats()["trained_size"] == 300
+    assert index.search(index._matrix[7], k=1)[0][0] == "s7"
+
+
+def test_rows_added_during_training_are_assigned_after_the_swap():
+    index = make_index(300)
+    index.add([f"t{i}" for i in range(50)], ["late"] * 50, np.random.default_rng(1).normal(size=(50, 16)))
+    assert index.wait_for_training(timeout=30)
+    assert index._assign[:len(index)].shape[0] == 350
+    assert index.search(index._matrix[320], k=1)[0][0] == "t20"
+
+
+def test_retrains_after_growth():
+    index = make_index(300, retrain_growth=2.0)
+    assert index.wait_for_training(timeout=30)
+    index.add([f"t{i}" for i in range(400)], ["new"] * 400, np.random.default_rng(2).normal(size=(400, 16)))
+    assert index.wait_for_training(timeout=30)
+    assert index.stats()["trained_size"] >= 600
+
+
+def test_training_snapshot_discarded_after_removal():
+    index = make_index(100)  # Below min_train_size: no training yet
+    snapshot, layout = index._matrix[:len(index)], index._layout
+    index.remove_document("d0")
+    index.min_train_size = 50
+    index._train(snapshot, layout)  # Stale row numbers: retrains over the current rows instead
+    assert index.wait_for_training(timeout=30)
+    assert index.trained and index.stats()["trained_size"] == len(index) == 80
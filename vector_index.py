@@ -0,0 +1,675 @@
+"""
+In-memory vector indexes for the "Connecting the Dots" semantic search
+
+Every index keeps the section embeddings resident as one pre-normalized
+float32 matrix with parallel arrays of section and document IDs. Three
+search backends share that storage:
+
+- "exact": a single matrix-vector product plus an argpartition top-k
+- "ivf":   pure-NumPy inverted file (spherical k-means coarse quantizer);
+           only the rows of the ANN_NPROBE closest lists are scored. Until
+           the library reaches IVF_MIN_TRAIN_SIZE rows it searches exactly,
+           and the lists are retrained whenever the library has grown by
+           IVF_RETRAIN_GROWTH since the last training. Training runs on a
+           background thread over a snapshot of the rows; searches keep
+           using the previous lists (or exact scans) until the new ones are
+           swapped in.
+- "hnsw":  optional hnswlib graph (pip install hnswlib)
+
+All backends support incremental insert and per-document delete, and can be
+persisted next to the database and reconciled with it on startup.
+
+Environment Variables:
+VECTOR_INDEX_MODE (default: "exact")
+    - "exact", "ivf" or "hnsw"; the ANN backends trade recall for speed
+ANN_NPROBE (default: 8)
+    - IVF lists scanned per query; higher is slower with better recall
+IVF_NLIST (default: 0 = about 4 * sqrt(rows))
+    - Number of IVF lists built at training time
+IVF_MIN_TRAIN_SIZE (default: 20000)
+    - Library size from which IVF trains and stops scanning exactly
+IVF_RETRAIN_GROWTH (default: 2.0)
+    - Growth factor of the library since the last training that retrains IVF
+HNSW_EF_SEARCH (default: 64)
+    - hnswlib search breadth; higher is slower with better recall
+HNSW_M (default: 16), HNSW_EF_CONSTRUCTION (default: 200)
+    - hnswlib graph build parameters
+
+Usage:
+    index = create_vector_index()
+    index.add(["section-1", "section-2"], ["doc-1", "doc-1"], [vec1, vec2])
+    hits = index.search(query_vec, k=5, min_score=0.1)  # [(section_id, score), ...]
+    batch_hits = index.search_batch(query_matrix, k=5)  # one hit list per query row
+    index.remove_document("doc-1")
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize each row; all-zero rows are left as zeros"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k largest scores, best first"""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(scores.shape[0])
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class VectorIndex:
+    """Resident, append-friendly exact cosine-similarity index over section embeddings"""
+
+    kind = "exact"
+
+    def __init__(self, initial_capacity: int = 1024):
+        self._lock = threading.Lock()
+        self._initial_capacity = initial_capacity
+        self._matrix: Optional[np.ndarray] = None  # (capacity, dim) float32, rows [:size] in use
+        self._section_ids = np.empty(0, dtype=object)
+        self._document_ids = np.empty(0, dtype=object)
+        self._size = 0
+        self._rows: Dict[str, int] = {}  # section_id -> row
+        self.generation = 0  # Bumped on every mutation
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def dim(self) -> Optional[int]:
+        return None if self._matrix is None else self._matrix.shape[1]
+
+    # Storage -----------------------------------------------------------
+
+    def _ensure_capacity(self, needed: int, dim: int):
+        if self._matrix is None:
+            capacity = max(self._initial_capacity, needed)
+            self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+            self._section_ids = np.empty(capacity, dtype=object)
+            self._document_ids = np.empty(capacity, dtype=object)
+            return
+        if dim != self._matrix.shape[1]:
+            raise ValueError(f"Embedding dimension mismatch: index has {self._matrix.shape[1]}, got {dim}")
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        # Grow into fresh arrays so views handed out to readers stay valid
+        matrix = np.zeros((capacity, dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        section_ids = np.empty(capacity, dtype=object)
+        section_ids[:self._size] = self._section_ids[:self._size]
+        document_ids = np.empty(capacity, dtype=object)
+        document_ids[:self._size] = self._document_ids[:self._size]
+        self._matrix, self._section_ids, self._document_ids = matrix, section_ids, document_ids
+
+    def _reset(self):
+        self._matrix = None
+        self._section_ids = np.empty(0, dtype=object)
+        self._document_ids = np.empty(0, dtype=object)
+        self._size = 0
+        self._rows = {}
+
+    def add(self, section_ids: Sequence[str], document_ids: Sequence[str], vectors) -> int:
+        """Append embeddings for the given sections; returns the number of rows added"""
+        if len(section_ids) == 0:
+            return 0
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        if len(section_ids) != vectors.shape[0] or len(document_ids) != vectors.shape[0]:
+            raise ValueError("section_ids, document_ids and vectors must have the same length")
+
+        with self._lock:
+            start = self._size
+            end = start + vectors.shape[0]
+            self._ensure_capacity(end, vectors.shape[1])
+            self._matrix[start:end] = vectors
+            self._section_ids[start:end] = list(section_ids)
+            self._document_ids[start:end] = list(document_ids)
+            self._size = end
+            self._rows.update(zip(section_ids, range(start, end)))
+            self._rows_added(start, end)
+            self.generation += 1
+        return vectors.shape[0]
+
+    def load(self, rows: Iterable[Tuple[str, str, Sequence[float]]]) -> int:
+        """Replace the index contents with (section_id, document_id, vector) rows"""
+        section_ids, document_ids, vectors = [], [], []
+        for section_id, document_id, vector in rows:
+            section_ids.append(section_id)
+            document_ids.append(document_id)
+            vectors.append(vector)
+
+        with self._lock:
+            self._reset()
+            self._index_reset()
+            self.generation += 1
+
+        if vectors:
+            self.add(section_ids, document_ids, np.vstack(vectors))
+        return len(section_ids)
+
+    def _remove_where(self, remove_mask: np.ndarray) -> int:
+        """Compact away rows flagged in remove_mask (caller holds the lock)"""
+        removed = int(remove_mask.sum())
+        if removed == 0:
+            return 0
+        keep = np.flatnonzero(~remove_mask)
+        size = keep.shape[0]
+        dim = self._matrix.shape[1]
+        capacity = max(self._initial_capacity, size)
+        matrix = np.zeros((capacity, dim), dtype=np.float32)
+        matrix[:size] = self._matrix[keep]
+        section_ids = np.empty(capacity, dtype=object)
+        section_ids[:size] = self._section_ids[keep]
+        document_ids = np.empty(capacity, dtype=object)
+        document_ids[:size] = self._document_ids[keep]
+        self._rows_removed(keep, remove_mask)
+        self._matrix, self._section_ids, self._document_ids = matrix, section_ids, document_ids
+        self._size = size
+        self._rows = {section_id: row for row, section_id in enumerate(section_ids[:size])}
+        self.generation += 1
+        return removed
+
+    def remove_document(self, document_id: str) -> int:
+        """Drop every row of a document; returns the number of rows removed"""
+        with self._lock:
+            if self._size == 0:
+                return 0
+            return self._remove_where(self._document_ids[:self._size] == document_id)
+
+    def remove_sections(self, section_ids: Iterable[str]) -> int:
+        """Drop the given sections; returns the number of rows removed"""
+        with self._lock:
+            if self._size == 0:
+                return 0
+            targets = set(section_ids)
+            mask = np.fromiter(
+                (section_id in targets for section_id in self._section_ids[:self._size]),
+                dtype=bool, count=self._size
+            )
+            return self._remove_where(mask)
+
+    def section_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._section_ids[:self._size])
+
+    # Backend hooks -----------------------------------------------------
+
+    def _rows_added(self, start: int, end: int):
+        """Called under the lock after rows [start, end) were written"""
+
+    def _rows_removed(self, keep: np.ndarray, remove_mask: np.ndarray):
+        """Called under the lock before rows outside `keep` are compacted away"""
+
+    def _index_reset(self):
+        """Called under the lock when the index is emptied"""
+
+    def _state(self) -> Dict[str, Any]:
+        """Consistent views for lock-free readers (caller holds the lock)"""
+        size = self._size
+        if self._matrix is None or size == 0:
+            return {"matrix": np.empty((0, 0), dtype=np.float32), "section_ids": np.empty(0, dtype=object)}
+        return {"matrix": self._matrix[:size], "section_ids": self._section_ids[:size]}
+
+    def _candidates(self, state: Dict[str, Any], queries: np.ndarray, k: int) -> List[Optional[np.ndarray]]:
+        """Row indices worth scoring for each query; None means every row"""
+        return [None] * queries.shape[0]
+
+    # Search ------------------------------------------------------------
+
+    def search(self, query_vector, k: int = 5, min_score: float = 0.0, exact: bool = False) -> List[Tuple[str, float]]:
+        """Return up to k (section_id, cosine_score) pairs, best first"""
+        return self.search_batch(query_vector, k=k, min_score=min_score, exact=exact)[0]
+
+    def search_batch(
+        self, query_vectors, k: int = 5, min_score: float = 0.0, exact: bool = False
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Search many queries at once; returns one hit list per query row.
+
+        Queries that scan every row are scored together with a single
+        matrix-matrix product; ANN queries score only their candidate rows.
+        """
+        queries = normalize_rows(query_vectors)
+        with self._lock:
+            state = self._state()
+        matrix, section_ids = state["matrix"], state["section_ids"]
+        if matrix.shape[0] == 0 or k <= 0:
+            return [[] for _ in range(queries.shape[0])]
+        if queries.shape[1] != matrix.shape[1]:
+            raise ValueError(f"Query dimension {queries.shape[1]} does not match index dimension {matrix.shape[1]}")
+
+        candidates = [None] * queries.shape[0] if exact else self._candidates(state, queries, k)
+        results: List[List[Tuple[str, float]]] = [[] for _ in range(queries.shape[0])]
+
+        def collect(position: int, rows: np.ndarray, scores: np.ndarray):
+            best = top_k(scores, k)
+            results[position] = [
+                (section_ids[row], float(score))
+                for row, score in zip(rows[best], scores[best])
+                if score > min_score
+            ]
+
+        full_scan = [i for i, rows in enumerate(candidates) if rows is None]
+        if full_scan:
+            all_rows = np.arange(matrix.shape[0])
+            scores = matrix @ queries[full_scan].T  # (rows, queries)
+            for column, position in enumerate(full_scan):
+                collect(position, all_rows, scores[:, column])
+        for position, rows in enumerate(candidates):
+            if rows is not None:
+                collect(position, rows, matrix[rows] @ queries[position])
+        return results
+
+    def score_sections(self, query_vector, section_ids: Iterable[str]) -> Dict[str, float]:
+        """Cosine scores of the given sections only (those present in the index)"""
+        with self._lock:
+            state = self._state()
+            found = [(section_id, self._rows[section_id]) for section_id in section_ids if section_id in self._rows]
+        if not found:
+            return {}
+        query = normalize_rows(query_vector)[0]
+        rows = np.fromiter((row for _, row in found), dtype=np.int64, count=len(found))
+        scores = state["matrix"][rows] @ query
+        return {section_id: float(score) for (section_id, _), score in zip(found, scores)}
+
+    # Persistence -------------------------------------------------------
+
+    def _extra_arrays(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    def _restore_extra(self, arrays: Dict[str, np.ndarray]):
+        pass
+
+    def _write_files(self, path: Path):
+        """Write the .npz snapshot atomically (caller holds the lock)"""
+        size = self._size
+        matrix = self._matrix[:size] if self._matrix is not None else np.zeros((0, 0), dtype=np.float32)
+        arrays = {
+            "kind": np.array(self.kind),
+            "matrix": matrix,
+            "section_ids": np.array(list(self._section_ids[:size]), dtype=str),
+            "document_ids": np.array(list(self._document_ids[:size]), dtype=str),
+            **self._extra_arrays()
+        }
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    def save(self, path: Path):
+        """Write the index to `path` (.npz) atomically"""
+        with self._lock:
+            self._write_files(Path(path))
+
+    def restore(self, path: Path) -> bool:
+        """Load a saved index of the same kind; returns False if missing or incompatible"""
+        path = Path(path)
+        if not path.exists():
+            return False
+        with np.load(path, allow_pickle=False) as data:
+            if str(data["kind"]) != self.kind:
+                return False
+            arrays = {name: data[name] for name in data.files}
+
+        with self._lock:
+            self._reset()
+            self._index_reset()
+            size = arrays["matrix"].shape[0]
+            if size:
+                self._ensure_capacity(size, arrays["matrix"].shape[1])
+                self._matrix[:size] = arrays["matrix"]
+                self._section_ids[:size] = arrays["section_ids"].tolist()
+                self._document_ids[:size] = arrays["document_ids"].tolist()
+                self._size = size
+                self._rows = {section_id: row for row, section_id in enumerate(self._section_ids[:size])}
+                self._restore_extra(arrays)
+            self.generation += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "size": self._size, "dim": self.dim, "generation": self.generation}
+
+
+class IVFIndex(VectorIndex):
+    """Inverted-file ANN index: spherical k-means lists, ANN_NPROBE lists scanned per query"""
+
+    kind = "ivf"
+
+    def __init__(
+        self,
+        nprobe: Optional[int] = None,
+        nlist: Optional[int] = None,
+        min_train_size: Optional[int] = None,
+        retrain_growth: Optional[float] = None,
+        initial_capacity: int = 1024
+    ):
+        super().__init__(initial_capacity=initial_capacity)
+        self.nprobe = nprobe or int(os.getenv("ANN_NPROBE", "8"))
+        self.nlist = nlist if nlist is not None else int(os.getenv("IVF_NLIST", "0"))
+        self.min_train_size = min_train_size or int(os.getenv("IVF_MIN_TRAIN_SIZE", "20000"))
+        self.retrain_growth = max(retrain_growth or float(os.getenv("IVF_RETRAIN_GROWTH", "2.0")), 1.0)
+        self._centroids: Optional[np.ndarray] = None
+        self._assign = np.empty(0, dtype=np.int32)
+        self._trained_size = 0  # Rows the current lists were trained on
+        self._layout = 0  # Bumped when rows are removed or reset, invalidating row numbers
+        self._train_thread: Optional[threading.Thread] = None
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    @property
+    def training(self) -> bool:
+        return self._train_thread is not None
+
+    def _assign_rows(self, vectors: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+        assignments = np.empty(vectors.shape[0], dtype=np.int32)
+        for start in range(0, vectors.shape[0], chunk):
+            block = vectors[start:start + chunk]
+            assignments[start:start + chunk] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    def _schedule_training(self):
+        """Train on a snapshot of the current rows in a background thread (caller holds the lock)"""
+        if self._train_thread is not None:
+            return
+        # Rows [:size] are never written in place (growth and removal build new arrays),
+        # so the view stays a consistent snapshot while the lock is released
+        self._train_thread = threading.Thread(
+            target=self._train, args=(self._matrix[:self._size], self._layout),
+            name="ivf-train", daemon=True
+        )
+        self._train_thread.start()
+
+    def _train(self, matrix: np.ndarray, layout: int, iterations: int = 10, seed: int = 0):
+        """Spherical k-means over (a sample of) a row snapshot, then swap the lists in under the lock"""
+        size = matrix.shape[0]
+        try:
+            nlist = self.nlist or int(4 * np.sqrt(size))
+            nlist = int(min(max(nlist, 16), 4096, size))
+            rng = np.random.default_rng(seed)
+            sample_size = min(size, nlist * 64)
+            sample = matrix[rng.choice(size, size=sample_size, replace=False)]
+
+            centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                empty = np.bincount(labels, minlength=nlist) == 0
+                sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()))]
+                centroids = normalize_rows(sums)
+            assignments = self._assign_rows(matrix, centroids)
+        except Exception as e:
+            print(f"⚠️ IVF training failed, keeping the current lists: {e}")
+            with self._lock:
+                self._train_thread = None
+            return
+
+        with self._lock:
+            self._train_thread = None
+            if layout != self._layout:
+                # Rows were removed or reloaded meanwhile, so the snapshot's row numbers are stale
+                if self._size >= self.min_train_size:
+                    self._schedule_training()
+                return
+            # Rows appended during training are assigned to the new lists before the swap
+            assign = np.empty(max(self._matrix.shape[0], 1), dtype=np.int32)
+            assign[:size] = assignments
+            assign[size:self._size] = self._assign_rows(self._matrix[size:self._size], centroids)
+            self._centroids = centroids
+            self._assign = assign
+            self._trained_size = size
+        print(f"✅ IVF index trained: {nlist} lists over {size} vectors")
+
+    def wait_for_training(self, timeout: Optional[float] = None) -> bool:
+        """Block until background training has finished; returns False on timeout"""
+        while True:
+            thread = self._train_thread
+            if thread is None:
+                return True
+            thread.join(timeout)
+            if thread.is_alive():
+                return False
+
+    def _rows_added(self, start: int, end: int):
+        if not self.trained:
+            if end >= self.min_train_size:
+                self._schedule_training()
+            return
+        if end >= self._trained_size * self.retrain_growth:
+            # Lists fitted to a much smaller library go stale and recall drops
+            self._schedule_training()
+        if self._assign.shape[0] < self._matrix.shape[0]:
+            assign = np.empty(self._matrix.shape[0], dtype=np.int32)
+            assign[:start] = self._assign[:start]
+            self._assign = assign
+        self._assign[start:end] = self._assign_rows(self._matrix[start:end], self._centroids)
+
+    def _rows_removed(self, keep: np.ndarray, remove_mask: np.ndarray):
+        self._layout += 1
+        if self.trained:
+            assign = np.empty(max(self._initial_capacity, keep.shape[0]), dtype=np.int32)
+            assign[:keep.shape[0]] = self._assign[keep]
+            self._assign = assign
+
+    def _index_reset(self):
+        self._centroids = None
+        self._assign = np.empty(0, dtype=np.int32)
+        self._trained_size = 0
+        self._layout += 1
+
+    def _state(self) -> Dict[str, Any]:
+        state = super()._state()
+        state["centroids"] = self._centroids
+        state["assign"] = self._assign[:self._size] if self.trained else None
+        return state
+
+    def _candidates(self, state: Dict[str, Any], queries: np.ndarray, k: int) -> List[Optional[np.ndarray]]:
+        centroids = state["centroids"]
+        if centroids is None:
+            return [None] * queries.shape[0]  # Untrained: small library, scan exactly
+        centroid_scores = queries @ centroids.T
+        candidates = []
+        for scores in centroid_scores:
+            rows = np.flatnonzero(np.isin(state["assign"], top_k(scores, self.nprobe)))
+            candidates.append(rows if rows.shape[0] >= k else None)
+        return candidates
+
+    def _extra_arrays(self) -> Dict[str, np.ndarray]:
+        if not self.trained:
+            return {}
+        return {
+            "centroids": self._centroids,
+            "assign": self._assign[:self._size],
+            "trained_size": np.array(self._trained_size)
+        }
+
+    def _restore_extra(self, arrays: Dict[str, np.ndarray]):
+        if "centroids" in arrays:
+            self._centroids = arrays["centroids"]
+            self._trained_size = int(arrays["trained_size"]) if "trained_size" in arrays else self._size
+            self._assign = np.empty(self._matrix.shape[0], dtype=np.int32)
+            self._assign[:self._size] = arrays["assign"]
+            if self._size >= self._trained_size * self.retrain_growth:
+                self._schedule_training()
+        elif self._size >= self.min_train_size:
+            self._schedule_training()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats.update({
+            "trained": self.trained,
+            "training": self.training,
+            "nlist": None if self._centroids is None else int(self._centroids.shape[0]),
+            "nprobe": self.nprobe,
+            "min_train_size": self.min_train_size,
+            "trained_size": self._trained_size
+        })
+        return stats
+
+
+class HNSWIndex(VectorIndex):
+    """Graph ANN index backed by hnswlib; the resident matrix is kept for persistence and exact mode"""
+
+    kind = "hnsw"
+
+    def __init__(
+        self,
+        ef_search: Optional[int] = None,
+        m: Optional[int] = None,
+        ef_construction: Optional[int] = None,
+        initial_capacity: int = 1024
+    ):
+        if not HNSWLIB_AVAILABLE:
+            raise ImportError("hnswlib is not installed (pip install hnswlib)")
+        super().__init__(initial_capacity=initial_capacity)
+        self.ef_search = ef_search or int(os.getenv("HNSW_EF_SEARCH", "64"))
+        self.m = m or int(os.getenv("HNSW_M", "16"))
+        self.ef_construction = ef_construction or int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+        self._graph = None
+        self._labels = np.empty(0, dtype=np.int64)  # Graph label per row; increasing, so searchable
+        self._next_label = 0
+        self._live = 0
+        self._restore_path: Optional[Path] = None
+
+    def _new_graph(self, dim: int, capacity: int):
+        graph = hnswlib.Index(space="ip", dim=dim)
+        graph.init_index(max_elements=capacity, ef_construction=self.ef_construction, M=self.m)
+        graph.set_ef(self.ef_search)
+        return graph
+
+    def _rows_added(self, start: int, end: int):
+        count = end - start
+        if self._graph is None:
+            self._graph = self._new_graph(self._matrix.shape[1], max(self._matrix.shape[0], end))
+        elif self._next_label + count > self._graph.get_max_elements():
+            self._graph.resize_index(max(self._graph.get_max_elements() * 2, self._next_label + count))
+        labels = np.arange(self._next_label, self._next_label + count, dtype=np.int64)
+        self._graph.add_items(self._matrix[start:end], labels)
+        self._next_label += count
+        self._live += count
+        if self._labels.shape[0] < self._matrix.shape[0]:
+            grown = np.empty(self._matrix.shape[0], dtype=np.int64)
+            grown[:start] = self._labels[:start]
+            self._labels = grown
+        self._labels[start:end] = labels
+
+    def _rows_removed(self, keep: np.ndarray, remove_mask: np.ndarray):
+        for label in self._labels[:self._size][remove_mask]:
+            self._graph.mark_deleted(int(label))
+        self._live -= int(remove_mask.sum())
+        labels = np.empty(max(self._initial_capacity, keep.shape[0]), dtype=np.int64)
+        labels[:keep.shape[0]] = self._labels[keep]
+        self._labels = labels
+
+    def _index_reset(self):
+        self._graph = None
+        self._labels = np.empty(0, dtype=np.int64)
+        self._next_label = 0
+        self._live = 0
+
+    def _state(self) -> Dict[str, Any]:
+        state = super()._state()
+        state["graph"] = self._graph
+        state["labels"] = self._labels[:self._size]
+        return state
+
+    def _candidates(self, state: Dict[str, Any], queries: np.ndarray, k: int) -> List[Optional[np.ndarray]]:
+        graph, labels = state["graph"], state["labels"]
+        if graph is None or labels.shape[0] == 0:
+            return [None] * queries.shape[0]
+        found_batch, _ = graph.knn_query(queries, k=min(max(k, 1), labels.shape[0]))
+        candidates = []
+        for found in found_batch.astype(np.int64):
+            # Labels grow with row order, so rows are recovered by binary search
+            rows = np.searchsorted(labels, found)
+            valid = rows < labels.shape[0]
+            rows, found = rows[valid], found[valid]
+            candidates.append(rows[labels[rows] == found])
+        return candidates
+
+    def _graph_path(self, path: Path) -> Path:
+        return Path(path).with_suffix(".hnsw.bin")
+
+    def _extra_arrays(self) -> Dict[str, np.ndarray]:
+        return {"labels": self._labels[:self._size], "next_label": np.array(self._next_label)}
+
+    def _restore_extra(self, arrays: Dict[str, np.ndarray]):
+        graph_path = self._restore_path
+        if graph_path is not None and graph_path.exists() and "labels" in arrays:
+            graph = hnswlib.Index(space="ip", dim=self._matrix.shape[1])
+            graph.load_index(str(graph_path), max_elements=max(int(arrays["next_label"]), self._matrix.shape[0]))
+            graph.set_ef(self.ef_search)
+            self._graph = graph
+            self._next_label = int(arrays["next_label"])
+            self._labels = np.empty(self._matrix.shape[0], dtype=np.int64)
+            self._labels[:self._size] = arrays["labels"]
+            self._live = self._size
+        else:
+            self._rows_added(0, self._size)  # No saved graph: rebuild from the matrix
+
+    def _write_files(self, path: Path):
+        """Write the hnswlib graph (.hnsw.bin) and the .npz under the same lock, so labels match the graph"""
+        if self._graph is not None:
+            graph_path = self._graph_path(path)
+            tmp_path = graph_path.with_name(graph_path.name + ".tmp")
+            self._graph.save_index(str(tmp_path))
+            os.replace(tmp_path, graph_path)
+        super()._write_files(path)
+
+    def restore(self, path: Path) -> bool:
+        self._restore_path = self._graph_path(path)
+        try:
+            return super().restore(path)
+        finally:
+            self._restore_path = None
+
+    def set_ef(self, ef_search: int):
+        self.ef_search = ef_search
+        if self._graph is not None:
+            self._graph.set_ef(ef_search)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats.update({"ef_search": self.ef_search, "m": self.m, "ef_construction": self.ef_construction})
+        return stats
+
+
+def create_vector_index(mode: Optional[str] = None) -> VectorIndex:
+    """Build the index selected by VECTOR_INDEX_MODE, falling back to exact search"""
+    mode = (mode or os.getenv("VECTOR_INDEX_MODE", "exact")).lower()
+    if mode == "hnsw":
+        if HNSWLIB_AVAILABLE:
+            return HNSWIndex()
+        print("⚠️ hnswlib not installed, falling back to exact vector search")
+        return VectorIndex()
+    if mode == "ivf":
+        return IVFIndex()
+    if mode != "exact":
+        print(f"⚠️ Unknown VECTOR_INDEX_MODE '{mode}', using exact search")
+    return VectorIndex()